@@ -1,22 +1,90 @@
+import functools
+import importlib
+
 import dash
-from dash import html, dcc, Input, Output
+from dash import html, dcc, Input, Output, State
+from dash.exceptions import PreventUpdate
 
-import radar_chart_def_pos
-import bar_chart_shooting
-import violin
-import bar_chart_off_def
-import heatmap
+import config
+import figures
+import background
+import instrumentation
+import http_cache
+import payload
+import reloader
+import result_cache
 import template
 
 app = dash.Dash(__name__)
 app.title = 'Project | INF8808E'
 server = app.server
 
-template.create_custom_theme()
-template.set_default_theme()
+if config.METRICS:
+    instrumentation.init_app(app)
+    instrumentation.add_collector(result_cache.render_metrics)
+# Registered after the instrumentation, so the recorded sizes are the compressed ones
+if config.HTTP_CACHE:
+    http_cache.init_app(app)
+# The figures are sent without their template, which is sent once per page
+if config.PAYLOAD_OPTIMIZER:
+    payload.init_app(app)
+
+# Graphs whose figure is fetched by its own callback in lazy mode, with the name of their figure
+LAZY_GRAPHS = {}
+EMPTY_FIGURE = dict(data=[], layout={})
+# Figure of each view of the shooting bar chart
+SHOOTING_FIGURES = {"Overall": 'shooting_overall', "Per Match": 'shooting_per_match'}
+
+def get_teams():
+    '''
+        Lists the teams which can be displayed on both radar charts, read from
+        their cached figures so building the layout does not load their stats.
+
+        Returns:
+            The list of the teams, in the order of the defense radar chart.
+    '''
+    possession = {trace['name'] for trace in figures.get_figure('radar_possession')['data']}
+    return [trace['name'] for trace in figures.get_figure('radar_defense')['data'] if trace['name'] in possession]
+
+
+def add_team_selector(id):
+    '''
+        Adds a dcc.Dropdown to select the teams displayed on a radar chart.
+
+        Args:
+            id: id of the dcc.Dropdown
+        Returns:
+            A html.Div(dcc.Dropdown) with every team selected.
+    '''
+    teams = get_teams()
+    return html.Div([dcc.Dropdown(
+                id=id,
+                options=[{"label": team, "value": team} for team in teams],
+                value=teams,
+                multi=True,
+                style={'backgroundColor': '#4F7942'},
+            )], style={'width': '50%', 'backgroundColor': '#4F7942'})
+
+
+def add_player_selector(id):
+    '''
+        Adds a dcc.Dropdown to select the player whose percentile ranks are displayed.
+        Listing the players needs their ranks, so only the default player is an option
+        until the callback of the dropdown sends the others, on its first use.
+
+        Args:
+            id: id of the dcc.Dropdown
+        Returns:
+            A html.Div(dcc.Dropdown) with the default player selected.
+    '''
+    return html.Div([dcc.Dropdown(
+                id=id,
+                options=[{"label": config.PLAYER_RANK_DEFAULT.partition('/')[2], "value": config.PLAYER_RANK_DEFAULT}],
+                value=config.PLAYER_RANK_DEFAULT,
+                clearable=False,
+                style={'backgroundColor': '#4F7942'},
+            )], style={'width': '35%', 'backgroundColor': '#4F7942'})
 
-fig_offense, fig_defense = bar_chart_off_def.get_fig()
-fig_defense_actions, fig_poss=radar_chart_def_pos.get_fig()
 
 def add_graph(id, figure):
     '''
@@ -43,177 +111,495 @@ def add_graph(id, figure):
     return graph
 
 
+def add_figure(id, name, progress=False):
+    '''
+        Adds a dcc.Graph displaying one of the figures of figures.py, which come
+        from the on-disk cache and are only rebuilt when their inputs changed.
+        In lazy mode, the graph is empty until it scrolls into view: the script
+        assets/lazy_figures.js then clicks its hidden trigger, whose callback
+        sends the figure.
+
+        Args:
+            id: id of the dcc.Graph
+            name: name of the figure in figures.FIGURES
+            progress: True if the graph is updated by a background callback,
+                whose progress bar is shown below it in background mode
+        Returns:
+            A html.Div with the graph, empty until loaded in lazy mode.
+    '''
+    if not config.LAZY_FIGURES:
+        graph = add_graph(id, figures.get_figure(name))
+    else:
+        LAZY_GRAPHS[id] = name
+        graph = add_lazy_graph(id)
+
+    if progress and config.BACKGROUND_CALLBACKS:
+        return html.Div([graph, background.add_progress(id)])
+    return graph
+
+
+def add_lazy_graph(id):
+    '''
+        Adds an empty dcc.Graph with the hidden trigger clicked by
+        assets/lazy_figures.js when the graph scrolls into view.
+
+        Args:
+            id: id of the dcc.Graph, the trigger has the id f'{id}-load'
+        Returns:
+            A html.Div with the empty graph and its trigger.
+    '''
+    return html.Div([
+        add_graph(id, EMPTY_FIGURE),
+        html.Button(id=f'{id}-load', className='lazy-figure-trigger', style={'display': 'none'})
+    ], className='lazy-figure')
+
+
+def get_shooting_views():
+    '''
+        Gets both views of the shooting bar chart, for the clientside callback.
+
+        Returns:
+            A dictionary with the mask values as keys and the figures as values.
+    '''
+    return {mask: figures.get_figure(name) for mask, name in SHOOTING_FIGURES.items()}
+
+
 image_url = "https://wallpapercave.com/wp/wp11803334.jpg" 
 
-app.layout = html.Div(
-    style={
-        'font-family': 'Arial',
-        'color': '#333333',
-        'backgroundColor': 'rgb(235, 59, 59)'
-    },
-    className='content',
-    children=[
-    html.Header(style={'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center','backgroundColor': '#4F7942','margin':'0px','borderRadius': '5px'}, children=[
-        html.H1("Morocco's Unexpected Triumph: A Deep Dive into the 2022 World Cup Journey", 
-                style={'font-size': '3em', 'marginBottom': '5px', 'font-weight': 'bold', 'color': 'white'}),
-        html.Img(src=image_url, style={'height': '500px', 'marginLeft': '20px', 'borderRadius': '8px'}),
-        html.P("In this analysis, we're using FIFA's data to highlight Morocco's surprising and exciting journey in the 2022 World Cup. \
+
+def build_layout():
+    '''
+        Builds the layout of the page from the current figures. It is built again,
+        and swapped in, by the reloader when the data of some figures changed.
+
+        Returns:
+            The root html.Div of the page.
+    '''
+    # The squads and their number of players, stored with the cached heatmap
+    heatmap_meta = figures.get_figure('heatmap')['layout']['meta']
+    return html.Div(
+        style={
+            'font-family': 'Arial',
+            'color': '#333333',
+            'backgroundColor': 'rgb(235, 59, 59)'
+        },
+        className='content',
+        children=[
+        html.Header(style={'display': 'flex', 'justifyContent': 'center', 'alignItems': 'center','backgroundColor': '#4F7942','margin':'0px','borderRadius': '5px'}, children=[
+            html.H1("Morocco's Unexpected Triumph: A Deep Dive into the 2022 World Cup Journey", 
+                    style={'font-size': '3em', 'marginBottom': '5px', 'font-weight': 'bold', 'color': 'white'}),
+            html.Img(src=image_url, style={'height': '500px', 'marginLeft': '20px', 'borderRadius': '8px'}),
+            html.P("In this analysis, we're using FIFA's data to highlight Morocco's surprising and exciting journey in the 2022 World Cup. \
                Morocco wasn't seen as a top competitor at the beginning, but they fought their way into the final stages of this world-renowned tournament. \
                Our goal is to show how Morocco's great performance wasn't just luck. \
                We're looking at strategy, teamwork, and determination that helped them exceed everyone's expectations and make a lasting impact on soccer fans everywhere.", 
-               style={'font-size': '1.3em', 'marginBottom': '20px', 'marginLeft': '30px', 'text-align': 'center', 'color': 'white'})
-    ]),
-
-    html.Div(style={'padding': '0 30px', 'backgroundColor': 'rgb(235, 59, 59)'}, children=[
-        html.Div(style={'backgroundColor': '#4F7942','font-size': '1.5em','borderRadius': '5px'}, children=[
-            html.H2('Defense'),
+                   style={'font-size': '1.3em', 'marginBottom': '20px', 'marginLeft': '30px', 'text-align': 'center', 'color': 'white'})
         ]),
-        html.Div(style={'marginBottom': '60px'}, children=[
-            html.H2('Breaking Down the Defense'),
-            html.P("Let's dive into how Morocco's defense stacked up. We're using a radar chart, which is a pretty cool tool that lets us visualize their overall performance. \
+
+        html.Div(style={'padding': '0 30px', 'backgroundColor': 'rgb(235, 59, 59)'}, children=[
+            html.Div(style={'backgroundColor': '#4F7942','font-size': '1.5em','borderRadius': '5px'}, children=[
+                html.H2('Defense'),
+            ]),
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('Breaking Down the Defense'),
+                html.P("Let's dive into how Morocco's defense stacked up. We're using a radar chart, which is a pretty cool tool that lets us visualize their overall performance. \
                    The bigger the area on the chart, the better the team did. \
                    We're looking at a bunch of different aspects of defense, like interceptions, tackles, and who won in aerial duels. \
                    We also highlighted the number of fouls committed, to get an idea of their discipline level."),
-            add_graph(id='radar-chart_defense', figure=fig_defense_actions),
-        ]),
+                add_team_selector(id='radar-teams_defense'),
+                add_figure(id='radar-chart_defense', name='radar_defense', progress=True),
+            ]),
         
-        html.Div(style={'marginBottom': '60px'}, children=[
-            html.H2('Defense vs Offense'),
-            html.P("Defense vs Offense! We're using stacked bar charts to get a clear view of how players perform in both areas. \
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('Defense vs Offense'),
+                html.P("Defense vs Offense! We're using stacked bar charts to get a clear view of how players perform in both areas. \
                    On the defensive side, we're looking at tackles, blocks, and interceptions. \
                    On the offense, we're focusing on passes. As any fan knows, good passing is what sets up those spectacular goals. \
                    The stacked bar charts let us easily compare each player's performance, and see where their strengths lie."),
-            add_graph(id='barchart-defense', figure=fig_defense),
-            add_graph(id='barchart-offense', figure=fig_offense),
+                add_figure(id='barchart-defense', name='defense'),
+                add_figure(id='barchart-offense', name='offense'),
             
-        ]),
+            ]),
         
-        html.Div(style={'backgroundColor': '#4F7942','font-size': '1.5em','borderRadius': '5px'}, children=[
-            html.H2('Offense'),
-        ]),
-        html.Div(style={'marginBottom': '60px'}, children=[
-            html.H2('The Art of Possession'),
-            html.P("Next up, let's check out how Morocco controlled the ball. We're using another radar chart here to give you an idea of their possession style and performance. \
+            html.Div(style={'backgroundColor': '#4F7942','font-size': '1.5em','borderRadius': '5px'}, children=[
+                html.H2('Offense'),
+            ]),
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('The Art of Possession'),
+                html.P("Next up, let's check out how Morocco controlled the ball. We're using another radar chart here to give you an idea of their possession style and performance. \
                    We're comparing general ball possession and how effectively the team moved forward with it. \
                    We used a logarithmic scale to make the differences in percentages clearer. \
                    As before, Morocco's area is filled in, so you can easily see how they did compared to the other teams."),
-            html.Div(style={'width': '100%', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'flexDirection' : 'row'}, children=[
-                html.Div(style={'width': '60%', 'padding': '10px'}, children=[
-                    add_graph(id='radar-chart_possession', figure=fig_poss)
-                ]),
-                html.Div(style={'width': '35%', 'padding': '10px'}, children=[
-                    html.Table(children=[
-                        html.Thead(children=html.Tr(children=[
-                            html.Th('Name'),
-                            html.Th('Description')
-                        ])
-                        ),
-                        html.Tbody(children=[
-                            html.Tr(children=[
-                                html.Td('Possession (%)'),
-                                html.Td('Possession average during the World Cup ')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('Touches in defensive 1/3 (%)'),
-                                html.Td('Touches made in the defensive 1/3 of the field / Total number of touches')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('Progressive Passes (%)'),
-                                html.Td('Distance Covered by Forward Passes / Total Distance Covered by Passes')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('Progressive Carries (%)'),
-                                html.Td('Distance Covered by Forward Carries / Total Distance Covered by Carries')
-                            ]),
+                html.Div(style={'width': '100%', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'flexDirection' : 'row'}, children=[
+                    html.Div(style={'width': '60%', 'padding': '10px'}, children=[
+                        add_team_selector(id='radar-teams_possession'),
+                        add_figure(id='radar-chart_possession', name='radar_possession', progress=True)
+                    ]),
+                    html.Div(style={'width': '35%', 'padding': '10px'}, children=[
+                        html.Table(children=[
+                            html.Thead(children=html.Tr(children=[
+                                html.Th('Name'),
+                                html.Th('Description')
+                            ])
+                            ),
+                            html.Tbody(children=[
+                                html.Tr(children=[
+                                    html.Td('Possession (%)'),
+                                    html.Td('Possession average during the World Cup ')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('Touches in defensive 1/3 (%)'),
+                                    html.Td('Touches made in the defensive 1/3 of the field / Total number of touches')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('Progressive Passes (%)'),
+                                    html.Td('Distance Covered by Forward Passes / Total Distance Covered by Passes')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('Progressive Carries (%)'),
+                                    html.Td('Distance Covered by Forward Carries / Total Distance Covered by Carries')
+                                ]),
+                            ])
                         ])
                     ])
                 ])
-            ])
-        ]),
+            ]),
 
-        html.Div(style={'marginBottom': '60px'}, children=[
-            html.H2('Shots to Goals'),
-            html.P("Next up, we're going to dive into one of the most thrilling aspects of the game – turning shots into goals. For this, we're using a stacked bar chart, which will really help us to see the ratio of shots taken, shots on target, and goals scored. We're going to lay it all out there, so we can see how successful each team was in making those precious shots count."),
-            html.Div(
-            [dcc.Dropdown(
-                id="dropdown",
-                options=[{"label": s, "value": s} for s in ["Overall", "Per Match"]],
-                value="Overall",
-                clearable=False,
-                style={'backgroundColor': '#4F7942'},
-            )],style={'width': '20%','backgroundColor': '#4F7942'}),
-            add_graph(id='barchart-shooting', 
-                      figure=bar_chart_shooting.get_figure(df=bar_chart_shooting.mask_data(mask="Overall")[0], 
-                                                           mask_title=bar_chart_shooting.mask_data(mask="Overall")[1])),
-        ]),
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('Shots to Goals'),
+                html.P("Next up, we're going to dive into one of the most thrilling aspects of the game – turning shots into goals. For this, we're using a stacked bar chart, which will really help us to see the ratio of shots taken, shots on target, and goals scored. We're going to lay it all out there, so we can see how successful each team was in making those precious shots count."),
+                html.Div(
+                [dcc.Dropdown(
+                    id="dropdown",
+                    options=[{"label": s, "value": s} for s in ["Overall", "Per Match"]],
+                    value="Overall",
+                    clearable=False,
+                    style={'backgroundColor': '#4F7942'},
+                )],style={'width': '20%','backgroundColor': '#4F7942'}),
+                # In clientside mode both views are shipped once and the callback fills the graph on load
+                dcc.Store(id='shooting-views', data=get_shooting_views()
+                          if config.CLIENTSIDE_VIEWS and not config.LAZY_FIGURES else None),
+                add_lazy_graph(id='barchart-shooting') if config.LAZY_FIGURES
+                else add_graph(id='barchart-shooting', figure=EMPTY_FIGURE) if config.CLIENTSIDE_VIEWS
+                else add_figure(id='barchart-shooting', name='shooting_overall'),
+            ]),
         
-        html.Div(style={'backgroundColor': '#4F7942','font-size': '1.5em','borderRadius': '5px'}, children=[
-            html.H2('Collectively'),
-        ]),
+            html.Div(style={'backgroundColor': '#4F7942','font-size': '1.5em','borderRadius': '5px'}, children=[
+                html.H2('Collectively'),
+            ]),
         
-        html.Div(style={'marginBottom': '60px'}, children=[
-            html.H2('Player Performance Heatmap'),
-            html.P("We've cooked up a heatmap to give us a clear view of which players turned up the heat and who might've been left out in the cold. \
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('Player Performance Heatmap'),
+                html.P("We've cooked up a heatmap to give us a clear view of which players turned up the heat and who might've been left out in the cold. \
                 Our focus here is on their contribution to the offensive side of the game, and ultimately, the team's success. \
                 We're not just talking about goals and assists, but the impact they've had overall."),
-            html.Div(style={'width': '100%', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'flexDirection' : 'row'}, children=[
-                html.Div(style={'width': '60%', 'padding': '10px'}, children=[
-                    add_graph(id='heatmap-performance', figure=heatmap.get_figure(heatmap.prep_data()))
-                ]),
-                html.Div(style={'width': '35%', 'padding': '10px'}, children=[
-                    html.Table(children=[
-                        html.Thead(children=html.Tr(children=[
-                                html.Th('Name'),
-                                html.Th('Description')
-                            ])
+                html.Div(style={'width': '100%', 'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center', 'flexDirection' : 'row'}, children=[
+                    html.Div(style={'width': '60%', 'padding': '10px'}, children=[
+                        html.Div([dcc.Dropdown(
+                            id='heatmap-squad',
+                            options=[{"label": squad, "value": squad} for squad in heatmap_meta['squads']],
+                            value='Morocco',
+                            clearable=False,
+                            style={'backgroundColor': '#4F7942'},
+                        )], style={'width': '35%', 'backgroundColor': '#4F7942'}),
+                        dcc.Slider(
+                            id='heatmap-top-n',
+                            min=1,
+                            max=heatmap_meta['max_players'],
+                            step=1,
+                            value=10,
+                            marks=None,
+                            tooltip={'placement': 'bottom', 'always_visible': True},
                         ),
-                        html.Tbody(children=[
-                            html.Tr(children=[
-                                html.Td('G'),
-                                html.Td('Goals')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('AG'),
-                                html.Td('Assisted Goals')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('onG'),
-                                html.Td('Goals scored by team while on pitch')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('onGA'),
-                                html.Td('Goals allowed by team while on pitch')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('PlusMinus'),
-                                html.Td('Goals scored minus goals allowed while the player was on the pitch')
-                            ]),
-                            html.Tr(children=[
-                                html.Td('On-Off'),
-                                html.Td('Net goals by the team while the player was on the pitch minus net goals allowed by the team while the player was off the pitch')
+                        add_figure(id='heatmap-performance', name='heatmap', progress=True)
+                    ]),
+                    html.Div(style={'width': '35%', 'padding': '10px'}, children=[
+                        html.Table(children=[
+                            html.Thead(children=html.Tr(children=[
+                                    html.Th('Name'),
+                                    html.Th('Description')
+                                ])
+                            ),
+                            html.Tbody(children=[
+                                html.Tr(children=[
+                                    html.Td('G'),
+                                    html.Td('Goals')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('AG'),
+                                    html.Td('Assisted Goals')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('onG'),
+                                    html.Td('Goals scored by team while on pitch')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('onGA'),
+                                    html.Td('Goals allowed by team while on pitch')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('PlusMinus'),
+                                    html.Td('Goals scored minus goals allowed while the player was on the pitch')
+                                ]),
+                                html.Tr(children=[
+                                    html.Td('On-Off'),
+                                    html.Td('Net goals by the team while the player was on the pitch minus net goals allowed by the team while the player was off the pitch')
+                                ])
                             ])
                         ])
                     ])
-                ])
+                ]),
             ]),
-        ]),
         
-        html.Div(style={'marginBottom': '60px'}, children=[
-            html.H2('Playing Time & Age Analysis'),
-            html.P("We're turning to the trusty violin plot to shed some light on two key factors: how much time each player spent on the pitch, \
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('Playing Time & Age Analysis'),
+                html.P("We're turning to the trusty violin plot to shed some light on two key factors: how much time each player spent on the pitch, \
                    and the age distribution within the squads."),
-            add_graph(id='violin-min', figure=violin.draw_figure(df=violin.prep_data_violin(), column="Min")),
-            add_graph(id='violin-age', figure=violin.draw_figure(df=violin.prep_data_violin(), column="Age")),
+                add_figure(id='violin-min', name='violin_min'),
+                add_figure(id='violin-age', name='violin_age'),
+            ]),
+
+            html.Div(style={'marginBottom': '60px'}, children=[
+                html.H2('How Does a Player Rank?'),
+                html.P("Pick any player of the tournament to see how they rank, per 90 minutes played, \
+                   against every other player, against the players of their position, \
+                   and how their team ranks against the other squads. \
+                   A percentile of 80 means the player ranks above about 80% of the players, tied players sharing the middle of their ranks."),
+                add_player_selector(id='player-rank-player'),
+                add_figure(id='player-rank', name='player_rank'),
+            ]),
         ]),
-    ]),
-])
+    ])
+
+
+def warm_up_callbacks():
+    '''
+        Computes the memoized data of the callbacks, which would
+        otherwise be computed by the first request after a data change.
+    '''
+    # The data modules are only imported here, so a start-up from cached figures does not load pandas
+    import bar_chart_shooting  # pylint: disable=import-outside-toplevel
+    import heatmap  # pylint: disable=import-outside-toplevel
+    import percentiles  # pylint: disable=import-outside-toplevel
+    import radar_chart_def_pos  # pylint: disable=import-outside-toplevel
+    for type in ['defense', 'possession']:
+        radar_chart_def_pos.get_team_stats(type)
+    heatmap.get_squad_tensors()
+    percentiles.get_ranks()
+    # The figures of the callbacks are built as dictionaries embedding the serialized template
+    template.get_template_json()
+    # Dash serializes the responses with plotly.io.json, which imports plotly.offline and IPython
+    importlib.import_module('plotly.io.json')
+    # The views are only patched by the server fallback of the shooting bar chart
+    if not config.CLIENTSIDE_VIEWS:
+        for mask in bar_chart_shooting.VIEWS:
+            bar_chart_shooting.get_patch(mask)
+
+
+def reload_layout(names):
+    '''
+        Called by the reloader once the figures depending on a changed data file
+        are rebuilt: the data of the callbacks is refreshed, then the layout
+        is rebuilt and swapped in with a single assignment.
+
+        Args:
+            names: names of the rebuilt figures
+    '''
+    warm_up_callbacks()
+    app.layout = build_layout()
+
+
+def draw_radar(type, teams):
+    '''
+        Draws a radar chart for a selection of teams.
+
+        Args:
+            type: defense or possession
+            teams: list of the teams to display
+        Returns:
+            The radar chart figure, as a dictionary.
+    '''
+    import radar_chart_def_pos  # pylint: disable=import-outside-toplevel
+    return radar_chart_def_pos.get_figure(type, teams)
+
+
+def draw_heatmap(squad, n):
+    '''
+        Draws the heatmap of the n first players of a squad.
+
+        Args:
+            squad: The squad of the players
+            n: The number of players
+        Returns:
+            The heatmap figure, as a dictionary.
+    '''
+    import heatmap  # pylint: disable=import-outside-toplevel
+    return heatmap.get_squad_figure(squad, n)
+
+
+# The figures inlined in the layout are built concurrently beforehand
+if not config.LAZY_FIGURES:
+    figures.build_figures()
+app.layout = build_layout()
+
+@app.callback(
+    Output("radar-chart_defense", "figure"),
+    Input("radar-teams_defense", "value"),
+    prevent_initial_call=True,
+    **background.get_options("radar-chart_defense"))
+@background.queued
+@instrumentation.timed_callback
+@result_cache.cached(['DefensiveActions', 'MiscellaneousStats'], modules=['radar_chart_def_pos', 'payload'])
+@payload.optimized
+def update_radar_defense(teams):
+    # The stats of every team are precomputed, only the selected rows are drawn
+    return draw_radar('defense', teams)
+
+
+@app.callback(
+    Output("radar-chart_possession", "figure"),
+    Input("radar-teams_possession", "value"),
+    prevent_initial_call=True,
+    **background.get_options("radar-chart_possession"))
+@background.queued
+@instrumentation.timed_callback
+@result_cache.cached(['Passing', 'Possession', 'ScoresFixtures'], modules=['radar_chart_def_pos', 'payload'])
+@payload.optimized
+def update_radar_possession(teams):
+    return draw_radar('possession', teams)
+
+
+@app.callback(
+    Output("heatmap-performance", "figure"),
+    Input("heatmap-squad", "value"),
+    Input("heatmap-top-n", "value"),
+    prevent_initial_call=True,
+    **background.get_options("heatmap-performance"))
+@background.queued
+@instrumentation.timed_callback
+@result_cache.cached(['Roster', 'PlayingTime', 'StandardStats'], modules=['heatmap', 'payload'])
+@payload.optimized
+def update_heatmap(squad, n):
+    # The arrays of every squad are precomputed, a selection only slices them
+    return draw_heatmap(squad, n)
+
 
 @app.callback(
-    Output("barchart-shooting", "figure"), 
-    Input("dropdown", "value"))
+    Output("player-rank", "figure"),
+    Input("player-rank-player", "value"),
+    prevent_initial_call=True)
+@instrumentation.timed_callback
+@payload.optimized
+def update_player_rank(player):
+    # The percentiles of every player are computed once, a selection only reads its rows
+    import bar_chart_player_rank  # pylint: disable=import-outside-toplevel
+    try:
+        return bar_chart_player_rank.get_figure(player)
+    except KeyError:
+        # Not a player of the dropdown, the figure is kept
+        raise PreventUpdate from None
+
+
+@app.callback(
+    Output("player-rank-player", "options"),
+    # Sent with the figure in lazy mode, on page load otherwise
+    Input("player-rank-load", "n_clicks") if config.LAZY_FIGURES else Input("player-rank-player", "id"),
+    prevent_initial_call=config.LAZY_FIGURES)
+@instrumentation.timed_callback
+def load_player_options(_):
+    import bar_chart_player_rank  # pylint: disable=import-outside-toplevel
+    return bar_chart_player_rank.get_player_options()
+
+
 def update_bar_chart_shooting(mask):
-    df, mask_title = bar_chart_shooting.mask_data(mask)
-    fig = bar_chart_shooting.get_figure(df, mask_title)
-    return fig
+    # Only the values which change between the memoized views are sent to the browser
+    import bar_chart_shooting  # pylint: disable=import-outside-toplevel
+    return bar_chart_shooting.get_patch(mask)
+
+
+if config.CLIENTSIDE_VIEWS:
+    # Switches between the precomputed views in the browser, without any request to the server
+    app.clientside_callback(
+        '''
+        function(mask, views) {
+            if (!views) {
+                return window.dash_clientside.no_update;
+            }
+            return views[mask];
+        }
+        ''',
+        Output("barchart-shooting", "figure"),
+        Input("dropdown", "value"),
+        Input("shooting-views", "data"))
+else:
+    # Server fallback: the Flask worker sends the figure of the chosen view
+    app.callback(
+        Output("barchart-shooting", "figure"),
+        Input("dropdown", "value"),
+        prevent_initial_call=True)(instrumentation.timed_callback(update_bar_chart_shooting))
+
+
+# Selectors of the lazy graphs, with the function drawing the figure of a selection
+LAZY_SELECTORS = {
+    "radar-chart_defense": (["radar-teams_defense"],
+                            payload.optimized(functools.partial(draw_radar, 'defense'))),
+    "radar-chart_possession": (["radar-teams_possession"],
+                               payload.optimized(functools.partial(draw_radar, 'possession'))),
+    "heatmap-performance": (["heatmap-squad", "heatmap-top-n"], payload.optimized(draw_heatmap)),
+    "player-rank": (["player-rank-player"], update_player_rank),
+}
+
+
+def add_lazy_loader(id, name):
+    '''
+        Registers the callback sending a figure when its graph scrolls into view.
+        The figure of the default selection comes from figures.py; if a selector
+        was changed before the graph scrolled into view, the figure of that
+        selection is drawn instead, so the loader never overwrites it.
+
+        Args:
+            id: id of the lazy dcc.Graph
+            name: name of the figure in figures.FIGURES
+    '''
+    selectors, select = LAZY_SELECTORS.get(id, ([], None))
+
+    def load_figure(_, *values):
+        if list(values) != [app.layout[selector].value for selector in selectors]:
+            return select(*values)
+        return figures.get_figure(name)
+    load_figure.__name__ = f'load_{name}'
+
+    # The figure can also be updated by the callback of its selectors
+    app.callback(
+        Output(id, "figure", allow_duplicate=True),
+        Input(f'{id}-load', "n_clicks"),
+        *[State(selector, "value") for selector in selectors],
+        prevent_initial_call=True)(instrumentation.timed_callback(load_figure))
+
+
+if config.LAZY_FIGURES:
+    for graph_id, figure_name in LAZY_GRAPHS.items():
+        add_lazy_loader(graph_id, figure_name)
+
+    if config.CLIENTSIDE_VIEWS:
+        @app.callback(
+            Output("shooting-views", "data"),
+            Input("barchart-shooting-load", "n_clicks"),
+            prevent_initial_call=True)
+        @instrumentation.timed_callback
+        def load_shooting_views(_):
+            return get_shooting_views()
+    else:
+        @app.callback(
+            Output("barchart-shooting", "figure", allow_duplicate=True),
+            Input("barchart-shooting-load", "n_clicks"),
+            State("dropdown", "value"),
+            prevent_initial_call=True)
+        @instrumentation.timed_callback
+        def load_shooting_view(_, mask):
+            return figures.get_figure(SHOOTING_FIGURES[mask])
+
+
 if __name__ == '__main__':
+    reloader.start(on_reload=reload_layout)
     app.run_server(debug=True)
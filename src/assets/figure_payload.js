@@ -0,0 +1,79 @@
+/*
+ * Restores the figures optimized by payload.py before plotly.js draws them.
+ * Their template is only the name of a template of window.DASHBOARD_TEMPLATES,
+ * defined once per page by /_dash-figure-template.js, and the repeated strings
+ * of their customdata are indices in a list of values (trace._customdata).
+ * Plotly is loaded after this script, so Plotly.newPlot and Plotly.react
+ * are wrapped when window.Plotly is set.
+ */
+(function () {
+    function unpack(packed, codes) {
+        // The innermost lists are the records, whose string fields are encoded
+        if (codes.every(function (code) { return !Array.isArray(code); })) {
+            return codes.map(function (value, index) {
+                return packed.fields.indexOf(index) >= 0 ? packed.values[value] : value;
+            });
+        }
+        return codes.map(function (item) { return unpack(packed, item); });
+    }
+
+    function restoreTrace(trace) {
+        if (!trace || !trace._customdata) {
+            return trace;
+        }
+        var restored = Object.assign({}, trace);
+        delete restored._customdata;
+        // A customdata patched by a callback replaces the packed one
+        if (!('customdata' in trace)) {
+            restored.customdata = unpack(trace._customdata, trace._customdata.codes);
+        }
+        return restored;
+    }
+
+    function restoreLayout(layout) {
+        var templates = window.DASHBOARD_TEMPLATES || {};
+        if (!layout || typeof layout.template !== 'string' || !templates[layout.template]) {
+            return layout;
+        }
+        return Object.assign({}, layout, {template: templates[layout.template]});
+    }
+
+    function restore(data, layout) {
+        return [Array.isArray(data) ? data.map(restoreTrace) : data, restoreLayout(layout)];
+    }
+
+    function wrap(Plotly) {
+        ['newPlot', 'react'].forEach(function (method) {
+            var draw = Plotly[method];
+            if (typeof draw !== 'function' || draw.restoresPayload) {
+                return;
+            }
+            // Called with (element, data, layout, config) or (element, figure)
+            var wrapped = function (element, data, layout, config) {
+                if (data && !Array.isArray(data) && typeof data === 'object') {
+                    var figure = restore(data.data, data.layout);
+                    return draw.call(this, element, Object.assign({}, data, {data: figure[0], layout: figure[1]}));
+                }
+                var restored = restore(data, layout);
+                return draw.call(this, element, restored[0], restored[1], config);
+            };
+            wrapped.restoresPayload = true;
+            Plotly[method] = wrapped;
+        });
+    }
+
+    var current = window.Plotly;
+    if (current) {
+        wrap(current);
+    }
+    Object.defineProperty(window, 'Plotly', {
+        configurable: true,
+        get: function () { return current; },
+        set: function (value) {
+            if (value) {
+                wrap(value);
+            }
+            current = value;
+        }
+    });
+})();
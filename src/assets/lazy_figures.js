@@ -0,0 +1,45 @@
+/*
+ * Loads the lazy figures of the dashboard when they scroll into view.
+ * Each lazy graph is wrapped in a .lazy-figure element with a hidden
+ * .lazy-figure-trigger button, whose click fires the callback sending
+ * the figure. Dash renders the layout after this script runs, so the
+ * new .lazy-figure elements are found with a MutationObserver. Browsers
+ * without IntersectionObserver load every figure once it is rendered.
+ */
+(function () {
+    function load(element) {
+        var trigger = element.querySelector('.lazy-figure-trigger');
+        if (trigger) {
+            trigger.click();
+        }
+    }
+
+    // Without IntersectionObserver, every figure is loaded as soon as it is rendered
+    var watch = load;
+    if ('IntersectionObserver' in window) {
+        var visibility = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    visibility.unobserve(entry.target);
+                    load(entry.target);
+                }
+            });
+        }, {rootMargin: '200px'});
+        watch = function (element) {
+            visibility.observe(element);
+        };
+    }
+
+    var observed = new WeakSet();
+    function observeFigures() {
+        document.querySelectorAll('.lazy-figure').forEach(function (element) {
+            if (!observed.has(element)) {
+                observed.add(element);
+                watch(element);
+            }
+        });
+    }
+
+    new MutationObserver(observeFigures).observe(document.documentElement, {childList: true, subtree: true});
+    observeFigures();
+})();
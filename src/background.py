@@ -0,0 +1,184 @@
+'''
+    Contains the background execution of the heavy callbacks.
+
+    When BACKGROUND_CALLBACKS is enabled, the radar and heatmap callbacks
+    are not computed in the request thread of the web worker, but in a
+    process started by the DiskcacheManager of Dash, whose job queue and
+    results are stored in BACKGROUND_CACHE_DIR, so no broker is needed.
+    The browser polls the result every BACKGROUND_INTERVAL milliseconds,
+    and a new selection cancels the job of the previous one (the renderer
+    sends its id with the new request). At most BACKGROUND_WORKERS jobs
+    compute at once on the host, the others wait for their turn, and the
+    progress bar under each graph shows whether its job waits or computes.
+
+    A computing job holds one of the BACKGROUND_WORKERS slot keys of the
+    cache, with its pid. Dash kills a cancelled job without letting it
+    release its slot, so a waiting job takes back the slot of a process
+    which no longer exists, and a slot whose holder stopped refreshing
+    it expires after SLOT_TTL seconds.
+'''
+import contextlib
+import functools
+import os
+import threading
+import time
+import uuid
+
+from dash import html, Output
+
+import config
+
+# Progress of a job: waiting for a worker, then computing
+STEPS = 2
+# Seconds after which the results of the jobs are dropped
+EXPIRE = 300
+# Seconds after which the slot of a job is freed if the job stops refreshing it
+SLOT_TTL = 10
+# Seconds between two checks of the slots by a waiting job, doubling up to the maximum
+POLL_INTERVAL = (0.01, 0.25)
+
+_manager = {}
+
+
+def get_manager():
+    '''
+        Gets the manager of the background callbacks, creating its disk cache on first use.
+
+        Returns:
+            The dash.DiskcacheManager.
+    '''
+    if 'manager' not in _manager:
+        # diskcache and multiprocess are only needed in background mode
+        import diskcache  # pylint: disable=import-outside-toplevel
+        from dash import DiskcacheManager  # pylint: disable=import-outside-toplevel
+
+        cache = diskcache.Cache(config.BACKGROUND_CACHE_DIR)
+        _manager.update(cache=cache, manager=DiskcacheManager(cache, expire=EXPIRE))
+    return _manager['manager']
+
+
+def add_progress(id):
+    '''
+        Adds the progress bar of the background callback of a graph, hidden when no job runs.
+
+        Args:
+            id: id of the dcc.Graph
+        Returns:
+            The html.Progress.
+    '''
+    return html.Progress(id=f'{id}-progress', value=0, max=STEPS, className='callback-progress',
+                         style={'display': 'none', 'width': '100%'})
+
+
+def get_options(id):
+    '''
+        Gets the arguments of app.callback running the callback of a graph in the background.
+
+        Args:
+            id: id of the dcc.Graph updated by the callback
+        Returns:
+            A dictionary of the arguments, empty if BACKGROUND_CALLBACKS is disabled.
+    '''
+    if not config.BACKGROUND_CALLBACKS:
+        return {}
+    return dict(background=True, manager=get_manager(), interval=config.BACKGROUND_INTERVAL,
+                progress=[Output(f'{id}-progress', 'value'), Output(f'{id}-progress', 'max')],
+                running=[(Output(f'{id}-progress', 'style'),
+                          {'display': 'block', 'width': '100%'}, {'display': 'none', 'width': '100%'})])
+
+
+def _is_alive(pid):
+    '''
+        Tells whether a process of the host still exists.
+
+        Args:
+            pid: The pid of the process
+        Returns:
+            False if there is no such process.
+    '''
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _try_acquire(cache, token):
+    '''
+        Takes a free worker slot of the host, taking back those of the killed jobs.
+
+        Args:
+            cache: The diskcache.Cache shared by the processes of every web worker
+            token: The (pid, id) identifying the job
+        Returns:
+            The key of the slot taken, or None if every slot is taken.
+    '''
+    for i in range(config.BACKGROUND_WORKERS):
+        key = f'background-worker-{i}'
+        if cache.add(key, token, expire=SLOT_TTL):
+            return key
+        holder = cache.get(key)
+        if holder is not None and not _is_alive(holder[0]):
+            with cache.transact():
+                if cache.get(key) == holder:
+                    cache.delete(key)
+            if cache.add(key, token, expire=SLOT_TTL):
+                return key
+    return None
+
+
+@contextlib.contextmanager
+def worker_slot(cache):
+    '''
+        Waits for a free worker slot of the host and holds it, refreshing
+        it from a thread until the block exits.
+
+        Args:
+            cache: The diskcache.Cache shared by the processes of every web worker
+    '''
+    token = (os.getpid(), uuid.uuid4().hex)
+    delay = POLL_INTERVAL[0]
+    key = _try_acquire(cache, token)
+    while key is None:
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_INTERVAL[1])
+        key = _try_acquire(cache, token)
+
+    stop = threading.Event()
+
+    def refresh():
+        while not stop.wait(SLOT_TTL / 3):
+            cache.touch(key, expire=SLOT_TTL)
+    threading.Thread(target=refresh, name='background-slot', daemon=True).start()
+    try:
+        yield
+    finally:
+        stop.set()
+        with cache.transact():
+            if cache.get(key) == token:
+                cache.delete(key)
+
+
+def queued(function):
+    '''
+        Decorator making a callback wait for a free worker slot of the host before computing,
+        and report its progress. Without BACKGROUND_CALLBACKS, the callback is unchanged.
+
+        Args:
+            function: The callback
+        Returns:
+            The decorated callback, taking the set_progress function of Dash first.
+    '''
+    if not config.BACKGROUND_CALLBACKS:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(set_progress, *args):
+        set_progress((0, STEPS))
+        # The slots are counted in the cache shared by the processes of every web worker
+        with worker_slot(_manager['cache']):
+            set_progress((1, STEPS))
+            return function(*args)
+    return wrapper
@@ -2,17 +2,25 @@ import plotly.express as px
 import pandas as pd
 import plotly.graph_objects as go
 
+import data_catalog
+
+# The Moroccan players displayed in each bar chart
+OFFENSE_PLAYERS = ['Youssef En-Nesyri', 'Sofiane Boufal', 'Azzedine Ounahi', 'Hakim Ziyech', 'Achraf Hakimi']
+DEFENSE_PLAYERS = ['Romain Saiss', 'Noussair Mazraoui', 'Nayef Aguerd', 'Achraf Hakimi', 'Sofyan Amrabat']
+
 
 def load_data():
     '''
-        Imports the data from two .csv files.
+        Gets the data of the displayed players from the player table.
 
         Returns:
             Two pandas dataframe containing the offensive and defensive data.
     '''
-    df_offense = pd.read_csv("./assets/data/Passing.csv", sep=",")
-    df_defense = pd.read_csv("./assets/data/DefensiveActions.csv", sep=",")
-    return df_offense, df_defense
+    df_offense = data_catalog.get_players({'Passing': ['Short-Cmp', 'Medium-Cmp', 'Long-Cmp']},
+                                          players=[('Morocco', player) for player in OFFENSE_PLAYERS])
+    df_defense = data_catalog.get_players({'DefensiveActions': ['Tackles-Tkl', 'Blocks', 'Int']},
+                                          players=[('Morocco', player) for player in DEFENSE_PLAYERS])
+    return df_offense.reset_index(level='Player'), df_defense.reset_index(level='Player')
 
 
 def prep_offense_data(df):
@@ -24,8 +32,7 @@ def prep_offense_data(df):
         Returns:
             A prepared pandas dataframe containing the offensive data.
     '''
-    df_offense = df[df['Player'].isin(['Youssef EnNesyri', 'Sofiane Boufal','Azzedine Ounahi','Hakim Ziyech','Achraf Hakimi'])]
-    df_offense = df_offense.rename(columns={"Short-Cmp": "Short Pass", "Medium-Cmp": "Medium Pass", "Long-Cmp": "Long Pass"})
+    df_offense = df.rename(columns={"Short-Cmp": "Short Pass", "Medium-Cmp": "Medium Pass", "Long-Cmp": "Long Pass"})
     df_offense['Total'] = df_offense[["Short Pass", "Medium Pass", "Long Pass"]].sum(axis=1)
     df_offense = df_offense.sort_values('Total', ascending=False)
     df_offense.drop('Total', axis=1, inplace=True)
@@ -43,8 +50,7 @@ def prep_defense_data(df):
         Returns:
             A prepared pandas dataframe containing the offensive data.
     '''
-    df_defense = df[df['Player'].isin(['Romain Saiss', 'Noussair Mazraoui', 'Nayef Aguerd', 'Achraf Hakimi', 'Sofyan Amrabat'])]
-    df_defense = df_defense.rename(columns={"Tackles-Tkl": "Tackles", "Int": "Interceptions"})
+    df_defense = df.rename(columns={"Tackles-Tkl": "Tackles", "Int": "Interceptions"})
     df_defense['Total'] = df_defense[["Tackles", "Blocks", "Interceptions"]].sum(axis=1)
     df_defense = df_defense.sort_values('Total', ascending=False)
     df_defense.drop('Total', axis=1, inplace=True)
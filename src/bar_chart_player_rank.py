@@ -0,0 +1,157 @@
+'''
+    Contains the bar chart of the percentile ranks of a player.
+'''
+import math
+
+import config
+import instrumentation
+import percentiles
+import template
+
+# Stats displayed, with their label, in the order of the bars
+STATS = [
+    ('Goals', ('StandardStats', 'Gls')),
+    ('Assists', ('StandardStats', 'Ast')),
+    ('Expected goals (xG)', ('StandardStats', 'xG')),
+    ('Expected assisted goals (xAG)', ('StandardStats', 'xAG')),
+    ('Shots', ('Shooting', 'Sh')),
+    ('Shot-creating actions', ('GoalandShotCreation', 'SCA90')),
+    ('Key passes', ('Passing', 'KP')),
+    ('Pass completion (%)', ('Passing', 'Total-Cmp%')),
+    ('Progressive passes', ('Passing', 'PrgP')),
+    ('Progressive carries', ('Possession', 'Carries-PrgC')),
+    ('Successful take-ons', ('Possession', 'Take-Ons-Succ')),
+    ('Tackles + interceptions', ('DefensiveActions', 'Tkl+Int')),
+    ('Ball recoveries', ('MiscellaneousStats', 'Perf_Recov')),
+    ('Aerial duels won (%)', ('MiscellaneousStats', 'AerialDuels_Won%')),
+]
+
+
+def get_players():
+    '''
+        Lists the players which can be displayed, those ranked by the percentile engine.
+
+        Returns:
+            A list of (squad, player, position group) tuples, sorted by squad and player.
+    '''
+    return percentiles.get_ranked_players()
+
+
+def get_player_value(squad, player):
+    '''
+        Gets the value of a player in the dropdown, which carries his squad
+        since two squads can have players of the same name.
+
+        Args:
+            squad: name of the squad
+            player: name of the player
+        Returns:
+            The value, such as 'Morocco/Achraf Hakimi'.
+    '''
+    return f'{squad}/{player}'
+
+
+def parse_player_value(value):
+    '''
+        Gets the player of a value of the dropdown.
+
+        Args:
+            value: The value, such as 'Morocco/Achraf Hakimi'
+        Returns:
+            The (squad, player) tuple.
+        Raises:
+            KeyError: The value has no squad.
+    '''
+    squad, separator, player = value.partition('/')
+    if not separator:
+        raise KeyError(value)
+    return squad, player
+
+
+def get_player_options():
+    '''
+        Gets the options of the dropdown selecting the player.
+
+        Returns:
+            A list of options, labelled with the squad and position group of each player.
+    '''
+    return [{"label": f"{player} ({squad}, {position})", "value": get_player_value(squad, player)}
+            for squad, player, position in get_players()]
+
+
+def get_default_player():
+    '''
+        Gets the player displayed before any selection.
+
+        Returns:
+            The value of the player in the dropdown.
+    '''
+    players = [get_player_value(squad, player) for squad, player, _ in get_players()]
+    return config.PLAYER_RANK_DEFAULT if config.PLAYER_RANK_DEFAULT in players else players[0]
+
+
+def format_value(value, stat):
+    '''
+        Formats the value of a stat for the hover tooltips.
+
+        Args:
+            value: The value of the player or squad
+            stat: The (table, column) tuple of the stat
+        Returns:
+            The formatted value, per 90 minutes for the counts.
+    '''
+    if math.isnan(value):
+        return '-'
+    return f'{value:.2f} per 90' if percentiles.is_count(stat[1]) else f'{value:.1f}'
+
+
+def get_figure(player=None):
+    '''
+        Creates the bar chart of the percentiles of a player, among all the players
+        and among the players of his position group, next to those of his squad.
+        The percentiles are precomputed, so the figure is built as a dictionary
+        from a few reads of their arrays.
+
+        Args:
+            player: value of the player in the dropdown, the default player if None
+        Returns:
+            The figure, as a dictionary.
+        Raises:
+            KeyError: The player is unknown.
+    '''
+    key = parse_player_value(get_default_player() if player is None else player)
+    labels = [label for label, _ in STATS]
+    stats = [stat for _, stat in STATS]
+    with instrumentation.span('pandas'):
+        ranks = percentiles.get_player_ranks(key, stats)
+        squad, position = percentiles.get_player(key)
+    player = key[1]
+
+    colorway = template.THEME['colorway']
+    traces = []
+    for i, (scope, name, values) in enumerate([
+            ('all', 'Among all players', ranks['value']),
+            ('position', f'Among the {position} players', ranks['value']),
+            ('squads', f'{squad} among the squads', ranks['squad_value'])]):
+        traces.append(dict(
+            type='bar',
+            orientation='h',
+            name=name,
+            x=[round(value, 1) for value in ranks[scope].fillna(0)],
+            y=labels,
+            customdata=[format_value(value, stat) for value, stat in zip(values, stats)],
+            marker=dict(color=colorway[i % len(colorway)]),
+            hovertemplate='<b>%{y}</b><br>%{customdata}<br><b>Percentile:</b> %{x:.0f}<extra>' + name + '</extra>',
+        ))
+
+    layout = dict(
+        template=template.get_template(),
+        title=dict(text=f'How does {player} ({squad}) rank?'),
+        barmode='group',
+        height=700,
+        xaxis=dict(title=dict(text='Percentile'), range=[0, 100]),
+        yaxis=dict(autorange='reversed'),
+        legend=dict(font=dict(size=13)),
+        dragmode=False,
+    )
+    return dict(data=traces, layout=layout)
@@ -1,17 +1,36 @@
 #import and data load
-import plotly.express as px
+import json
+import threading
+
+import plotly.utils
 import pandas as pd
+from dash import Patch
+
+import data_catalog
+import instrumentation
+
+
+VIEWS = ["Overall", "Per Match"]
+TITLES = {"Overall": "Efficiency in offensive actions during the competition",
+          "Per Match": "Average efficiency in offensive actions per match"}
+
+# Memoized (dataframe, title, figure) of each view, built for one version of Shooting.csv
+_views = {}
+# Trace properties which differ between the views, the only ones sent by a partial update
+_changed_properties = []
+_views_version = None
+_views_lock = threading.Lock()
 
 
 # Preprocessing 
 def prep_data():
     '''
-        Imports the .csv file and does some preprocessing.
+        Gets the shooting table from the data catalog and does some preprocessing.
 
         Returns:
             A pandas dataframe containing the preprocessed data.
     '''
-    df_init = pd.read_csv("./assets/data/Shooting.csv")
+    df_init = data_catalog.get_table("Shooting", columns=["Squad", "Gls", "Sh", "SoT"])
     df_all = clean_split_concat(df_init)
     return df_all
 
@@ -50,6 +69,105 @@ def clean_split_concat(df_init):
 
 
 #Figure
+def build_views():
+    '''
+        Preprocesses the data once and builds the dataframe, title and figure of every view.
+        Returns:
+            A dictionary with the views as keys and (dataframe, title, figure) tuples as values.
+    '''
+    with instrumentation.span('pandas'):
+        df_all = prep_data()
+    views = {}
+    for mask in VIEWS:
+        df = df_all[df_all["View"]==mask]
+        views[mask] = (df, TITLES[mask], get_figure(df, TITLES[mask]))
+    return views
+
+
+def get_view(mask):
+    '''
+        Gets the memoized view, which is rebuilt only when Shooting.csv changes
+        Args:
+            mask: string representing the chosen view 
+        Returns:
+            The (dataframe, title, figure) tuple of the view.
+    '''
+    global _views, _changed_properties, _views_version  # pylint: disable=global-statement
+    version = data_catalog.get_version("Shooting")
+    if version != _views_version:
+        with _views_lock:
+            if version != _views_version:
+                _views = build_views()
+                _changed_properties = get_changed_properties([fig for _, _, fig in _views.values()])
+                _views_version = version
+    return _views[mask]
+
+
+def reset_views():
+    '''
+        Forgets the memoized views, so they are rebuilt on next use.
+    '''
+    global _views_version  # pylint: disable=global-statement
+    with _views_lock:
+        _views_version = None
+
+
+def to_json(obj):
+    '''
+        Serializes a figure or a partial update the way Dash sends it to the browser.
+        Args:
+            obj: the figure, Patch or any plotly-compatible object
+        Returns:
+            The JSON string.
+    '''
+    return json.dumps(obj, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def get_changed_properties(figures):
+    '''
+        Finds the trace properties whose values differ between figures with the same traces.
+        Args:
+            figures: list of figures to compare
+        Returns:
+            A list of (trace index, property name) tuples.
+    '''
+    traces = [fig.to_plotly_json()["data"] for fig in figures]
+    changed = []
+    for i, trace in enumerate(traces[0]):
+        for prop in trace:
+            values = {to_json(fig_traces[i].get(prop)) for fig_traces in traces}
+            if len(values) > 1:
+                changed.append((i, prop))
+    return changed
+
+
+def get_patch(mask):
+    '''
+        Builds the partial update turning any view of the figure into the chosen one.
+        Only the trace values which differ between the views and the title are sent.
+        Args:
+            mask: string representing the chosen view
+        Returns:
+            A dash Patch of the figure.
+    '''
+    _, mask_title, fig = get_view(mask)
+    patched_fig = Patch()
+    for i, prop in _changed_properties:
+        patched_fig["data"][i][prop] = fig.data[i][prop]
+    patched_fig["layout"]["title"]["text"] = mask_title
+    return patched_fig
+
+
+def compare_payload_sizes():
+    '''
+        Compares the size of the full figure and of the partial update sent for each view.
+        Returns:
+            A dictionary with the views as keys and the sizes in bytes as values.
+    '''
+    return {mask: {"figure": len(to_json(get_view(mask)[2])), "patch": len(to_json(get_patch(mask)))}
+            for mask in VIEWS}
+
+
 def mask_data(mask):
     '''
         Selects only the rows of the chosen view and its title
@@ -59,9 +177,7 @@ def mask_data(mask):
             A pandas dataframe with the rows corresponding to the view.
             The title of the figure
     '''
-    df = prep_data() 
-    mask_title = "Efficiency in offensive actions during the competition" if mask == "Overall" else "Average efficiency in offensive actions per match"
-    df = df[df["View"]==mask]
+    df, mask_title, _ = get_view(mask)
     return df, mask_title
 
 def get_figure(df, mask_title):
@@ -73,6 +189,9 @@ def get_figure(df, mask_title):
         Returns:
             figure based on the dataframe
     '''
+    # Only imported when a view is built, which the cached figures and the clientside views do not need
+    import plotly.express as px  # pylint: disable=import-outside-toplevel
+
     fig = px.bar(data_frame=df, x="Squad", y="value", color='Shots',
                  color_discrete_map={"Missed Shots on Target":"#dbd822" ,"Missed Shots not on Target":'rgb(235, 59, 59)',"Goals":'#4F7942'},
                  title=mask_title, 
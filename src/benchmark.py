@@ -0,0 +1,353 @@
+'''
+    Contains the benchmark suite of the preprocessing and figure-building functions.
+
+    Each stage is timed and memory-profiled on its own, then every figure
+    is built end to end, on the bundled data and on synthetic data scaled
+    to several times its number of rows. The import time of the app and
+    the size and serving time of its layout, with and without the lazy
+    figures, are measured too, and the import time of the app, with the
+    figure cache warm, is checked against a budget, listing the slowest imports.
+
+    Run it from the src folder, for example:
+        python benchmark.py --scales 1 10 100 --repeat 5
+    or, to only check the import time:
+        python benchmark.py --imports-only --import-budget 1000
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import data_catalog
+import figures
+import template
+
+# Import time of app.py, with the figure cache warm, above which the import check fails
+IMPORT_BUDGET_MS = 1000
+
+
+def scale_table(dataframe, factor):
+    '''
+        Generates a synthetic table with factor times the rows of the given one.
+        The first copy is unchanged and the other players get a numbered name,
+        so the squads and the hand-picked players of the charts are kept.
+
+        Args:
+            dataframe: The table to scale
+            factor: The number of copies of each row
+        Returns:
+            The scaled dataframe.
+    '''
+    copies = [dataframe]
+    for i in range(1, factor):
+        copy = dataframe.copy()
+        if 'Player' in copy:
+            copy['Player'] = copy['Player'].astype(str) + f' ({i})'
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+def write_scaled_data(factor, directory):
+    '''
+        Writes every bundled .csv file, scaled by the given factor, in a directory.
+
+        Args:
+            factor: The number of copies of each row
+            directory: The directory to write the synthetic .csv files in
+    '''
+    for name, dataframe in data_catalog.load_all().items():
+        scale_table(dataframe, factor).to_csv(os.path.join(directory, f'{name}.csv'), index=False)
+
+
+def reset_caches():
+    '''
+        Empties the data catalog and the data memoized by the visualizations,
+        so the next call of a stage parses and computes everything again.
+    '''
+    # pylint: disable=import-outside-toplevel
+    import bar_chart_shooting
+    import heatmap
+    import percentiles
+    import radar_chart_def_pos
+
+    data_catalog.reset()
+    bar_chart_shooting.reset_views()
+    heatmap.reset_tensors()
+    radar_chart_def_pos.reset_team_stats()
+    percentiles.reset()
+
+
+def cold(setup=None):
+    '''
+        Wraps the setup of a stage so every timed call starts from empty caches.
+
+        Args:
+            setup: Function returning the arguments of each call, or None
+        Returns:
+            The setup emptying the caches before building the arguments.
+    '''
+    def cold_setup():
+        reset_caches()
+        return setup() if setup else ()
+    return cold_setup
+
+
+def get_environment(cache_dir, **settings):
+    '''
+        Builds the environment of an app process writing its caches in a temporary
+        directory instead of the src folder.
+
+        Args:
+            cache_dir: The temporary directory
+            settings: Other environment variables of the process
+        Returns:
+            The environment variables.
+    '''
+    return dict(os.environ, FIGURE_CACHE_DIR=os.path.join(cache_dir, 'figures'),
+                RESULT_CACHE_FILE=os.path.join(cache_dir, 'results', 'results.sqlite'),
+                BACKGROUND_CACHE_DIR=os.path.join(cache_dir, 'background'),
+                ASSETS_CACHE_DIR=os.path.join(cache_dir, 'assets'), **settings)
+
+
+def measure(function, repeat, setup=None):
+    '''
+        Times a function and measures its peak memory allocation.
+
+        Args:
+            function: The function to call with the arguments returned by setup
+            repeat: The number of timed calls
+            setup: Function returning the arguments of each call, not measured
+        Returns:
+            A dictionary with the best and median time in ms and the peak memory in kB.
+    '''
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    args = setup() if setup else ()
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'best_ms': round(min(times) * 1000, 2),
+        'median_ms': round(statistics.median(times) * 1000, 2),
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def get_stages():
+    '''
+        Lists the stages benchmarked on their own, with the setup
+        building their inputs from the tables of the catalog. Every
+        setup empties the caches first, so each timed call is cold.
+
+        Returns:
+            A list of (name, function, setup) tuples.
+    '''
+    # pylint: disable=import-outside-toplevel
+    import bar_chart_off_def
+    import bar_chart_shooting
+    import heatmap
+    import percentiles
+    import radar_chart_def_pos
+    import violin
+
+    def heatmap_merged():
+        return (heatmap.filter_players(heatmap.merge_data()),)
+
+    radar_tables = radar_chart_def_pos.load_data
+    stages = [
+        ('heatmap.prep_data', heatmap.prep_data, None),
+        ('heatmap.add_minus_exp', heatmap.add_minus_exp, heatmap_merged),
+        ('heatmap.get_figure', heatmap.get_figure, lambda: (heatmap.prep_data(),)),
+        ('radar_chart_def_pos.load_data', radar_tables, None),
+        ('radar_chart_def_pos.prep_data_defense', radar_chart_def_pos.prep_data_defense,
+         lambda: radar_tables()[:2]),
+        ('radar_chart_def_pos.prep_data_possession', radar_chart_def_pos.prep_data_possession,
+         lambda: radar_tables()[2:]),
+        ('radar_chart_def_pos.get_radar_figure', radar_chart_def_pos.get_radar_figure,
+         lambda: (radar_chart_def_pos.prep_data_defense(*radar_tables()[:2]),
+                  radar_chart_def_pos.categories_def, 'defense')),
+        ('bar_chart_shooting.clean_split_concat', bar_chart_shooting.clean_split_concat,
+         lambda: (data_catalog.get_table('Shooting'),)),
+        ('data_catalog.get_player_table', data_catalog.get_player_table, None),
+        ('percentiles.compute_ranks', percentiles.compute_ranks, lambda: (data_catalog.get_player_table(),)),
+        ('bar_chart_off_def.prep_offense_data', bar_chart_off_def.prep_offense_data,
+         lambda: bar_chart_off_def.load_data()[:1]),
+        ('bar_chart_off_def.prep_defense_data', bar_chart_off_def.prep_defense_data,
+         lambda: bar_chart_off_def.load_data()[1:]),
+        ('violin.draw_figure', violin.draw_figure, lambda: (violin.prep_data_violin(), 'Min')),
+    ]
+    return [(name, function, cold(setup)) for name, function, setup in stages]
+
+
+def run_stages(repeat):
+    '''
+        Benchmarks every stage and every figure end to end on the current data folder.
+
+        Args:
+            repeat: The number of timed calls of each function
+        Returns:
+            A list of result dictionaries.
+    '''
+    results = []
+    for name, function, setup in get_stages():
+        results.append({'stage': name, **measure(function, repeat, setup)})
+    # The caches are emptied, so the end-to-end time includes parsing the tables
+    for name in figures.FIGURES:
+        results.append({'stage': f'figures.{name}',
+                        **measure(figures.build_figure, repeat, cold(lambda name=name: (name,)))})
+    return results
+
+
+def measure_app():
+    '''
+        Measures the import time of the app, without and with the figure cache,
+        and the size and serving time of its layout, with every figure inlined
+        and with the lazy figures. The layout is the first response the page
+        waits for, so its serving time is a proxy of the time to first paint.
+
+        Returns:
+            A dictionary of the measures.
+    '''
+    code = ('import time, json; start = time.perf_counter(); import app; '
+            'seconds = time.perf_counter() - start; '
+            'client = app.server.test_client(); client.get("/_dash-layout"); '
+            'start = time.perf_counter(); size = len(client.get("/_dash-layout").data); '
+            'print(json.dumps([seconds, size, time.perf_counter() - start]))')
+    measures = {}
+    for mode, lazy in [('eager', '0'), ('lazy', '1')]:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            environment = get_environment(cache_dir, LAZY_FIGURES=lazy)
+            for run in ['cold_cache', 'warm_cache']:
+                output = subprocess.run([sys.executable, '-c', code], env=environment, check=True,
+                                        capture_output=True, text=True, cwd=figures.SRC_DIR).stdout
+                seconds, size, serve_time = json.loads(output.strip().splitlines()[-1])
+                measures[f'import_app_{mode}_{run}_ms'] = round(seconds * 1000, 1)
+        measures[f'layout_{mode}_bytes'] = size
+        measures[f'layout_{mode}_serve_ms'] = round(serve_time * 1000, 2)
+    return measures
+
+
+def parse_importtime(output):
+    '''
+        Parses the report of the -X importtime option of Python.
+
+        Args:
+            output: The standard error of the Python process
+        Returns:
+            A list of (module, self time in ms, cumulative time in ms) tuples, in import order.
+    '''
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        imports.append((module.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+    return imports
+
+
+def measure_imports(top=15):
+    '''
+        Measures the import time of app.py, with the figure cache warm, which is the
+        time each worker and each reload of the development server waits before serving.
+
+        Args:
+            top: The number of slowest imports listed
+        Returns:
+            The import time of app.py in ms, a dataframe of the slowest imports by their own time,
+            and a dataframe of the modules of the application by their cumulative time.
+    '''
+    with tempfile.TemporaryDirectory() as cache_dir:
+        environment = get_environment(cache_dir, RELOAD_INTERVAL='0')
+        # The first import builds the figures, the second one only reads them
+        subprocess.run([sys.executable, '-c', 'import app'], env=environment, check=True,
+                       capture_output=True, cwd=figures.SRC_DIR)
+        output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], env=environment,
+                                check=True, capture_output=True, text=True, cwd=figures.SRC_DIR).stderr
+
+    imports = pd.DataFrame(parse_importtime(output), columns=['module', 'self_ms', 'cumulative_ms'])
+    total = imports.loc[imports['module'] == 'app', 'cumulative_ms'].iloc[-1]
+    slowest = imports.sort_values('self_ms', ascending=False).head(top)
+    local = {name[:-3] for name in os.listdir(figures.SRC_DIR) if name.endswith('.py')}
+    modules = imports[imports['module'].isin(local)].sort_values('cumulative_ms', ascending=False)
+    return total, slowest, modules
+
+
+def check_imports(budget):
+    '''
+        Prints the slowest imports of app.py and checks its import time against a budget.
+
+        Args:
+            budget: The import time budget in ms
+        Returns:
+            True if the import time is within the budget.
+    '''
+    total, slowest, modules = measure_imports()
+    print(f'Slowest imports:\n{slowest.round(1).to_string(index=False)}\n')
+    print(f'Modules of the application:\n{modules.round(1).to_string(index=False)}\n')
+    within = total <= budget
+    print(f'import app: {total:.0f} ms, budget {budget:.0f} ms: {"ok" if within else "over budget"}\n')
+    return within
+
+
+def main():
+    '''
+        Runs the benchmark suite and prints its results.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help='factors applied to the number of rows of the bundled data')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed calls of each stage')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET_MS,
+                        help='import time of app.py, in ms, above which the benchmark fails')
+    parser.add_argument('--imports-only', action='store_true', help='only check the import time of app.py')
+    args = parser.parse_args()
+
+    within_budget = check_imports(args.import_budget)
+    if args.imports_only:
+        sys.exit(0 if within_budget else 1)
+
+    template.create_custom_theme()
+    template.set_default_theme()
+
+    results = {'app': measure_app(), 'stages': []}
+    print(pd.Series(results['app']).to_string(), end='\n\n')
+
+    original_dir = data_catalog.DATA_DIR
+    for factor in args.scales:
+        with tempfile.TemporaryDirectory() as data_dir:
+            data_catalog.reset(original_dir)
+            if factor > 1:
+                write_scaled_data(factor, data_dir)
+                data_catalog.reset(data_dir)
+            stages = run_stages(args.repeat)
+        for stage in stages:
+            stage['scale'] = factor
+        results['stages'] += stages
+    data_catalog.reset(original_dir)
+
+    table = pd.DataFrame(results['stages']).pivot(index='stage', columns='scale')
+    print(table.to_string())
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if not within_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+'''
+    Contains the configuration of the application,
+    which can be changed through environment variables.
+'''
+import os
+
+
+def get_bool(name, default):
+    '''
+        Reads a boolean setting from the environment.
+
+        Args:
+            name: name of the environment variable
+            default: value used when the variable is not set
+        Returns:
+            The value of the setting.
+    '''
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# Ships both shooting views to the browser and switches them with a clientside callback.
+# When disabled, each dropdown change is served by the Flask worker.
+CLIENTSIDE_VIEWS = get_bool('CLIENTSIDE_VIEWS', True)
+
+# The layout only ships empty graphs, and each figure is fetched by a callback
+# when its graph scrolls into view. When disabled, every figure is inlined in the layout.
+LAZY_FIGURES = get_bool('LAZY_FIGURES', False)
+
+# Serialized figures are cached on disk, keyed by a hash of their input files and code
+FIGURE_CACHE = get_bool('FIGURE_CACHE', True)
+FIGURE_CACHE_DIR = os.environ.get('FIGURE_CACHE_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), '.figure_cache'))
+# Processes building the missing figures concurrently at startup, 1 builds them one after another
+FIGURE_WORKERS = int(os.environ.get('FIGURE_WORKERS', str(os.cpu_count() or 1)))
+
+# Figures sent without their template, sent once per page, with their floats rounded to PAYLOAD_DIGITS
+# significant digits and the repeated strings of their customdata encoded (payload.py)
+PAYLOAD_OPTIMIZER = get_bool('PAYLOAD_OPTIMIZER', True)
+PAYLOAD_DIGITS = int(os.environ.get('PAYLOAD_DIGITS', '6'))
+
+# Results of the callbacks, cached in a SQLite file shared by the workers of the host,
+# keyed by their inputs and the version of their data, with LRU eviction beyond RESULT_CACHE_MAX_MB
+RESULT_CACHE = get_bool('RESULT_CACHE', True)
+RESULT_CACHE_FILE = os.environ.get('RESULT_CACHE_FILE',
+                                   os.path.join(os.path.dirname(os.path.abspath(__file__)), '.result_cache',
+                                                'results.sqlite'))
+RESULT_CACHE_MAX_MB = float(os.environ.get('RESULT_CACHE_MAX_MB', '64'))
+
+# Runs the radar and heatmap callbacks in background processes (background.py), with a job queue
+# in BACKGROUND_CACHE_DIR, the browser polling their result every BACKGROUND_INTERVAL ms,
+# and at most BACKGROUND_WORKERS jobs computing at once on the host
+BACKGROUND_CALLBACKS = get_bool('BACKGROUND_CALLBACKS', False)
+BACKGROUND_CACHE_DIR = os.environ.get('BACKGROUND_CACHE_DIR',
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), '.background_cache'))
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', '2'))
+BACKGROUND_INTERVAL = int(os.environ.get('BACKGROUND_INTERVAL', '250'))
+
+# Production server (gunicorn.conf.py)
+BIND = os.environ.get('BIND', f"0.0.0.0:{os.environ.get('PORT', '8050')}")
+WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', '2'))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', '4'))
+# File created once the preloaded application is warm and the workers can be started
+READY_FILE = os.environ.get('READY_FILE')
+
+# Compresses the responses (brotli or gzip), answers the conditional GETs with 304,
+# and serves the assets precompressed in ASSETS_CACHE_DIR with long-lived cache headers
+HTTP_CACHE = get_bool('HTTP_CACHE', True)
+ASSETS_CACHE_DIR = os.environ.get('ASSETS_CACHE_DIR',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), '.assets_cache'))
+
+# Partitioned Parquet store of many tournaments (data_store.py), read instead of the .csv files
+# of assets/data when set, and the tournament displayed by the dashboard
+DATA_STORE_DIR = os.environ.get('DATA_STORE_DIR')
+COMPETITION = os.environ.get('COMPETITION', 'World Cup')
+SEASON = os.environ.get('SEASON', '2022')
+
+# Seconds between two checks of the data files by the reloader, 0 disables it
+RELOAD_INTERVAL = float(os.environ.get('RELOAD_INTERVAL', '2'))
+
+# Records per-request and per-callback timings, sent as Server-Timing headers and exposed on /metrics
+METRICS = get_bool('METRICS', True)
+
+# Minutes played below which a player is not ranked by the percentile engine (percentiles.py)
+PERCENTILE_MIN_MINUTES = float(os.environ.get('PERCENTILE_MIN_MINUTES', '90'))
+# Player whose percentile ranks are displayed before any selection, as Squad/Player
+PLAYER_RANK_DEFAULT = os.environ.get('PLAYER_RANK_DEFAULT', 'Morocco/Achraf Hakimi')
+
+# Violin plots: 'points' lets the browser compute the densities from every point,
+# 'kde' computes them on the server, 'auto' does so above VIOLIN_POINT_THRESHOLD rows
+VIOLIN_MODE = os.environ.get('VIOLIN_MODE', 'auto')
+# Maximum number of points sent with the server-side densities
+VIOLIN_POINT_THRESHOLD = int(os.environ.get('VIOLIN_POINT_THRESHOLD', '2000'))
+VIOLIN_KDE_POINTS = int(os.environ.get('VIOLIN_KDE_POINTS', '100'))
+VIOLIN_KDE_BINS = int(os.environ.get('VIOLIN_KDE_BINS', '256'))
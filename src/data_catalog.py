@@ -0,0 +1,615 @@
+'''
+    Contains the data catalog shared by all the visualizations.
+
+    Every .csv file of the assets/data folder is parsed once per process
+    with pinned dtypes, and every module which needs it gets a copy of the
+    parsed dataframe, so a module modifying its table cannot change the
+    tables of the others.
+
+    When DATA_STORE_DIR is set, the tables are read from the partitioned
+    store of data_store.py instead, for the COMPETITION and SEASON of
+    config.py only. The competition, squad and column filters given
+    to get_table are then pushed down to the Parquet files. Otherwise,
+    they are applied to the .csv file parsed once, whatever the filters.
+
+    The tables with one row per player are also joined in a single player
+    table, indexed by (Squad, Player): the players are matched on their
+    normalized names, once per version of each table, so a player-centric
+    view reads its columns from it instead of merging the tables itself.
+'''
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+import config
+import instrumentation
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'data')
+
+# Pinned dtypes of each table: the categorical (repeated text), text and integer
+# columns are listed, all the other columns are read as floats. The integers
+# are then downcast to the smallest type holding their values.
+SCHEMAS = {
+    'DefensiveActions': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age', 'Tackles-TklW', 'Int']
+    },
+    'GoalandShotCreation': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age']
+    },
+    'GroupStage': {
+        'category': ['Squad', 'Group'],
+        'text': [],
+        'int': ['MP', 'W', 'D', 'L', 'GF', 'GA', 'GD', 'Pts']
+    },
+    'MiscellaneousStats': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age', 'Perf_CrdY', 'Perf_CrdR', 'Perf_2CrdY', 'Perf_Fls', 'Perf_Fld',
+                'Perf_Off', 'Perf_Crs', 'Perf_Int', 'Perf_TklW', 'Perf_OG']
+    },
+    'PassTypes': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': ['CornerKicks-In'],
+        'int': ['Age', 'PassType-Crs']
+    },
+    'Passing': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age', 'Ast']
+    },
+    'PlayingTime': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age', 'MP', 'Starts', 'Starts-Compl', 'Subs-Subs', 'Subs-unSub']
+    },
+    'Possession': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age']
+    },
+    'Roster': {
+        'category': ['Squad', 'Player', 'Pos', 'Club'],
+        'text': ['Birth Place', 'Birth Date', 'Age'],
+        'int': ['MP']
+    },
+    'ScoresFixtures': {
+        'category': ['Squad', 'Comp', 'Round', 'Result', 'Opponent', 'Captain', 'Formation'],
+        'text': ['Date', 'GF', 'GA'],
+        'int': []
+    },
+    'Shooting': {
+        'category': ['Squad', 'Player', 'Pos'],
+        'text': [],
+        'int': ['Age', 'Gls', 'Sh', 'SoT', 'PK', 'PKatt']
+    },
+    'StandardStats': {
+        'category': ['Squad', 'Player', 'Pos', 'Club'],
+        'text': [],
+        'int': ['Age', 'MP', 'Starts']
+    },
+}
+
+# Characters escaped in UTF-7 in some .csv files, such as +AC0- for a hyphen in "+AC0-0.1"
+# (a single base64 character, as in the "G+A-PK/90" column, cannot encode one)
+ESCAPE = re.compile(r'\+[A-Za-z0-9/]{3,}-')
+
+# Tables mixing several competitions, with the column holding the competition of each row
+COMPETITION_COLUMNS = {'ScoresFixtures': 'Comp'}
+
+# Tables with one row per player, joined in the player table.
+# The roster lists every player of the tournament, and gives the index its names.
+PLAYER_TABLES = ['Roster', 'StandardStats', 'PlayingTime', 'Passing', 'PassTypes', 'DefensiveActions',
+                 'Possession', 'Shooting', 'GoalandShotCreation', 'MiscellaneousStats']
+
+# Loaded tables and their versions, keyed by (name, columns, competition, squads),
+# and the statistics of the tables read from the files (the whole tables without the store)
+_tables = {}
+_versions = {}
+_report = {}
+_lock = threading.Lock()
+
+# Index of the player table and its columns from each table, with the versions they were built from
+_player_index = {}
+_player_blocks = {}
+_player_table = {}
+_player_lock = threading.Lock()
+
+
+def get_dtypes(name):
+    '''
+        Builds the pinned dtypes of a table.
+
+        Args:
+            name: name of the table (the .csv file name without extension)
+        Returns:
+            The dtype mapping to give to pd.read_csv, or None
+            if the table has no schema.
+    '''
+    schema = SCHEMAS.get(name)
+    if schema is None:
+        return None
+    dtypes = defaultdict(lambda: 'float64')
+    dtypes.update({column: 'category' for column in schema['category']})
+    dtypes.update({column: 'object' for column in schema['text']})
+    dtypes.update({column: 'int64' for column in schema['int']})
+    return dtypes
+
+
+def _decode_escape(match):
+    '''
+        Decodes a character escaped in UTF-7, leaving the text unchanged if it is not an escape.
+
+        Args:
+            match: The match of ESCAPE
+        Returns:
+            The decoded text.
+    '''
+    try:
+        return match.group(0).encode('ascii').decode('utf-7')
+    except UnicodeError:
+        return match.group(0)
+
+
+def decode_escapes(dataframe, name):
+    '''
+        Decodes the characters escaped in UTF-7 in the text and categorical columns
+        of a parsed table, then gives the numeric columns their pinned dtype: a numeric
+        column with an escape, such as "+AC0-0.1" for -0.1, is parsed as text.
+
+        Args:
+            dataframe: The dataframe of the table, parsed with or without its numeric dtypes
+            name: name of the table
+        Returns:
+            The dataframe with its text decoded and its pinned dtypes.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    dtypes = get_dtypes(name)
+    columns = {}
+    numeric = {}
+    for column, dtype in dataframe.dtypes.items():
+        if dtype != 'category' and dtype != object:
+            if dtypes is not None and dtype != dtypes[column]:
+                numeric[column] = dtypes[column]
+            continue
+        values = dataframe[column]
+        # The distinct values of a categorical column are searched, not its rows
+        texts = values.cat.categories if dtype == 'category' else values.dropna()
+        if '+' not in ''.join(map(str, texts)):
+            continue
+        decoded = values.astype(object).str.replace(ESCAPE, _decode_escape, regex=True)
+        if dtypes is None:
+            columns[column] = pd.to_numeric(decoded, errors='ignore')
+        else:
+            columns[column] = decoded.astype(dtypes[column])
+    if numeric:
+        dataframe = dataframe.astype(numeric)
+    return dataframe.assign(**columns) if columns else dataframe
+
+
+def read_csv(path, name):
+    '''
+        Parses a .csv file of a table with its pinned dtypes. Only the parsed
+        text and categorical columns are searched for escaped characters, unless
+        a numeric column holds one: the file is then parsed again without the
+        numeric dtypes, given to the columns once decoded. Every column is parsed,
+        since the columns requested by get_table are selected from this single parse.
+
+        Args:
+            path: path of the .csv file
+            name: name of the table
+        Returns:
+            The dataframe of the table, with all its columns.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    dtypes = get_dtypes(name)
+    if dtypes is not None:
+        try:
+            return decode_escapes(pd.read_csv(path, sep=',', encoding='utf-8', dtype=dtypes), name)
+        except ValueError:
+            dtypes = {column: dtype for column, dtype in dtypes.items() if dtype in ('category', 'object')}
+    return decode_escapes(pd.read_csv(path, sep=',', encoding='utf-8', dtype=dtypes), name)
+
+
+def compact(dataframe, name):
+    '''
+        Converts the columns of a table to their most compact dtypes:
+        the categorical columns keep only the categories of their rows,
+        and the integers are downcast.
+
+        Args:
+            dataframe: The dataframe of the table, with its pinned or inferred dtypes
+            name: name of the table
+        Returns:
+            The compacted dataframe.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    schema = SCHEMAS.get(name)
+    if schema is None:
+        return dataframe
+    columns = {}
+    for column in dataframe.columns:
+        if column in schema['category']:
+            columns[column] = dataframe[column].astype('category').cat.remove_unused_categories()
+        elif column in schema['int']:
+            columns[column] = pd.to_numeric(dataframe[column], downcast='integer')
+    return dataframe.assign(**columns) if columns else dataframe
+
+
+def get_default_memory(dataframe):
+    '''
+        Measures the memory a dataframe would use with the dtypes inferred by default by
+        pandas, the categories being object strings and the integers 64-bit integers.
+
+        Args:
+            dataframe: The compacted dataframe
+        Returns:
+            The memory usage in bytes.
+    '''
+    dtypes = {column: 'object' if dtype == 'category' else 'int64'
+              for column, dtype in dataframe.dtypes.items() if dtype == 'category' or dtype.kind in 'iu'}
+    return dataframe.astype(dtypes).memory_usage(deep=True).sum()
+
+
+def get_files(name):
+    '''
+        Lists the files a table is read from.
+
+        Args:
+            name: name of the table
+        Returns:
+            The paths of the .csv file, or of the Parquet files of the store.
+    '''
+    if config.DATA_STORE_DIR:
+        import data_store  # pylint: disable=import-outside-toplevel
+        return data_store.get_files(name)
+    return [os.path.join(DATA_DIR, f'{name}.csv')]
+
+
+def get_version(name):
+    '''
+        Gets the version of the file(s) of a table, which changes
+        whenever they are modified.
+
+        Args:
+            name: name of the table
+        Returns:
+            A tuple identifying the file content, such as (modification time, size).
+    '''
+    if config.DATA_STORE_DIR:
+        import data_store  # pylint: disable=import-outside-toplevel
+        return data_store.get_version(name)
+    stat = os.stat(os.path.join(DATA_DIR, f'{name}.csv'))
+    return stat.st_mtime_ns, stat.st_size
+
+
+def filter_table(dataframe, name, columns=None, competition=None, squads=None):
+    '''
+        Selects the rows and columns of a parsed table matching the filters.
+
+        Args:
+            dataframe: The dataframe of the whole table
+            name: name of the table
+            columns: The columns to keep, or None for all of them
+            competition: The competition to keep, or None
+            squads: The squads to keep, or None for all of them
+        Returns:
+            The filtered dataframe, or the same one without any filter.
+    '''
+    if columns is None and competition is None and squads is None:
+        return dataframe
+    if competition is not None and name in COMPETITION_COLUMNS:
+        dataframe = dataframe[dataframe[COMPETITION_COLUMNS[name]] == competition]
+    if squads is not None:
+        dataframe = dataframe[dataframe['Squad'].isin(squads)]
+    if columns is not None:
+        dataframe = dataframe[list(columns)]
+    return compact(dataframe, name)
+
+
+def _read_table(name, columns, competition, squads):
+    '''
+        Reads the rows and columns of a table matching the filters.
+
+        Args:
+            name: name of the table to load
+            columns: The columns to read, or None for all of them
+            competition: The competition to read, or None
+            squads: The squads to read, or None for all of them
+        Returns:
+            The dataframe of the table.
+    '''
+    if config.DATA_STORE_DIR:
+        # The store is only imported when used, pyarrow being long to import
+        import data_store  # pylint: disable=import-outside-toplevel
+        # Only the tables partitioned by their own column hold several competitions per season
+        if competition is None and name not in COMPETITION_COLUMNS:
+            competition = config.COMPETITION
+        return compact(data_store.read_table(name, competition=competition, season=config.SEASON,
+                                             squads=squads, columns=columns), name)
+
+    dataframe = compact(read_csv(os.path.join(DATA_DIR, f'{name}.csv'), name), name)
+    return filter_table(dataframe, name, columns, competition, squads)
+
+
+def _load_table(key):
+    '''
+        Loads a table of the catalog and records its load statistics.
+        Without the store, a filtered table is selected from the whole
+        table, so each .csv file is only parsed once per version.
+
+        Args:
+            key: (name, columns, competition, squads) tuple of the table to load
+        Returns:
+            The dataframe of the table.
+    '''
+    name = key[0]
+    parsed_key = (name, None, None, None)
+    if not config.DATA_STORE_DIR and key != parsed_key:
+        if _tables.get(parsed_key) is None or _versions.get(parsed_key) != get_version(name):
+            _tables[parsed_key] = _load_table(parsed_key)
+        _versions[key] = _versions[parsed_key]
+        return filter_table(_tables[parsed_key], *key)
+
+    _versions[key] = get_version(name)
+    start = time.perf_counter()
+    with instrumentation.span('pandas'):
+        dataframe = _read_table(*key)
+    load_time = time.perf_counter() - start
+
+    _report[key] = {
+        'rows': len(dataframe),
+        'columns': len(dataframe.columns),
+        'load_ms': round(load_time * 1000, 2),
+        'memory_kb': round(dataframe.memory_usage(deep=True).sum() / 1024, 1)
+    }
+    return dataframe
+
+
+def table_names():
+    '''
+        Lists the tables available in the data folder (or in the store).
+
+        Returns:
+            The sorted names of the tables.
+    '''
+    if config.DATA_STORE_DIR:
+        import data_store  # pylint: disable=import-outside-toplevel
+        return data_store.table_names()
+    return sorted(file[:-len('.csv')] for file in os.listdir(DATA_DIR) if file.endswith('.csv'))
+
+
+def _get_shared_table(name, columns=None, competition=None, squads=None):
+    '''
+        Gets the dataframe of a table shared by the catalog, reading it on first
+        use and again only if its file(s) changed since. It must not be modified.
+
+        Args:
+            name: name of the table
+            columns: The columns needed, or None for all of them
+            competition: The competition of the rows needed, or None for all of them
+            squads: The squads needed, or None for all of them
+        Returns:
+            The shared dataframe of the table.
+    '''
+    key = (name, None if columns is None else tuple(columns), competition,
+           None if squads is None else tuple(squads))
+    dataframe = _tables.get(key)
+    if dataframe is None or _versions.get(key) != get_version(name):
+        with _lock:
+            dataframe = _tables.get(key)
+            if dataframe is None or _versions.get(key) != get_version(name):
+                dataframe = _load_table(key)
+                _tables[key] = dataframe
+    return dataframe
+
+
+def get_table(name, columns=None, competition=None, squads=None):
+    '''
+        Gets a table of the catalog, reading it on first use
+        and again only if its file(s) changed since.
+
+        Args:
+            name: name of the table (the .csv file name without extension)
+            columns: The columns needed, or None for all of them
+            competition: For the tables mixing competitions (ScoresFixtures),
+                the competition of the rows needed, or None for all of them
+            squads: The squads needed, or None for all of them
+        Returns:
+            A copy of the dataframe of the table.
+    '''
+    return _get_shared_table(name, columns, competition, squads).copy()
+
+
+def normalize_name(name):
+    '''
+        Normalizes the name of a squad or player, so the spellings of the different
+        files match: the UTF-7 escapes (such as +AC0- for a hyphen) are decoded,
+        and the accents, case, spaces and punctuation are ignored.
+
+        Args:
+            name: The name to normalize
+        Returns:
+            The normalized name, such as 'youssefennesyri'.
+    '''
+    if '+' in name:
+        try:
+            name = name.encode('ascii').decode('utf-7')
+        except UnicodeError:
+            pass
+    return ''.join(char for char in unicodedata.normalize('NFKD', name) if char.isalnum()).casefold()
+
+
+def _get_player_index():
+    '''
+        Gets the index of the player table, built from the roster
+        and sorted by squad and player.
+
+        Returns:
+            The (Squad, Player) index and a dictionary with the normalized
+            (squad, player) names as keys and the row positions as values.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    version = get_version('Roster')
+    if _player_index.get('version') != version:
+        roster = _get_shared_table('Roster', columns=['Squad', 'Player']).sort_values(['Squad', 'Player'])
+        index = pd.MultiIndex.from_frame(roster)
+        positions = {(normalize_name(squad), normalize_name(player)): position
+                     for position, (squad, player) in enumerate(index)}
+        # The version is replaced last, the index being read by the other threads meanwhile
+        _player_index.update(index=index, positions=positions, version=version)
+    return _player_index['index'], _player_index['positions']
+
+
+def _get_player_block(name):
+    '''
+        Gets the columns of a table in the rows of the player table.
+        The players missing from the table have missing values.
+
+        Args:
+            name: name of the table, one of PLAYER_TABLES
+        Returns:
+            The shared dataframe of the columns of the table, indexed by (Squad, Player).
+    '''
+    index, positions = _get_player_index()
+    versions = (get_version(name), _player_index['version'])
+    block = _player_blocks.get(name)
+    if block is None or block[0] != versions:
+        with _player_lock:
+            block = _player_blocks.get(name)
+            if block is None or block[0] != versions:
+                dataframe = _get_shared_table(name)
+                rows = [positions.get((normalize_name(squad), normalize_name(player)), -1)
+                        for squad, player in zip(dataframe['Squad'], dataframe['Player'])]
+                dataframe = dataframe.drop(columns=['Squad', 'Player']).set_axis(rows)
+                dataframe = dataframe[dataframe.index >= 0].reindex(range(len(index))).set_axis(index)
+                block = (versions, dataframe)
+                _player_blocks[name] = block
+    return block[1]
+
+
+def get_player_table():
+    '''
+        Gets the wide table of every player, joining the columns of all the PLAYER_TABLES.
+
+        Returns:
+            A copy of the dataframe indexed by (Squad, Player),
+            with (table, column) tuples as columns.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    blocks = {name: _get_player_block(name) for name in PLAYER_TABLES}
+    versions = [_player_blocks[name][0] for name in PLAYER_TABLES]
+    if _player_table.get('versions') != versions:
+        _player_table.update(table=pd.concat(blocks, axis=1), versions=versions)
+    return _player_table['table'].copy()
+
+
+def get_players(columns, players=None, squads=None):
+    '''
+        Reads columns of the player table, for some players or squads.
+        A player is found in constant time from any spelling of its name.
+
+        Args:
+            columns: Dictionary with the names of the PLAYER_TABLES as keys
+                and the lists of their columns to read as values
+            players: The (squad, player) tuples of the rows to read,
+                in the order of the rows, or None for every player
+            squads: The squads of the rows to read, or None for all of them
+        Returns:
+            A new dataframe indexed by (Squad, Player), with the requested columns.
+        Raises:
+            KeyError: A player is not in the roster.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    index, positions = _get_player_index()
+    if players is not None:
+        rows = [positions[(normalize_name(squad), normalize_name(player))] for squad, player in players]
+    elif squads is not None:
+        rows = index.get_level_values('Squad').isin(squads).nonzero()[0]
+    else:
+        rows = slice(None)
+    return pd.concat([_get_player_block(name)[list(names)].iloc[rows] for name, names in columns.items()],
+                     axis=1)
+
+
+def reset(data_dir=None):
+    '''
+        Empties the catalog, optionally pointing it to another data folder.
+
+        Args:
+            data_dir: The new data folder, or None to keep the current one
+    '''
+    global DATA_DIR  # pylint: disable=global-statement
+    with _lock:
+        if data_dir is not None:
+            DATA_DIR = data_dir
+        _tables.clear()
+        _versions.clear()
+        _report.clear()
+        _player_index.clear()
+        _player_blocks.clear()
+        _player_table.clear()
+
+
+def load_all():
+    '''
+        Loads every table of the data folder in the catalog.
+
+        Returns:
+            A dictionary with the table names as keys and the dataframes as values.
+    '''
+    return {name: get_table(name) for name in table_names()}
+
+
+def get_load_report():
+    '''
+        Gets the load time and memory usage of each table read from the files, per filter
+        with the store, with the memory it would use with the default dtypes of pandas.
+
+        Returns:
+            A pandas dataframe indexed by table name.
+    '''
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    report = {}
+    for key, stats in _report.items():
+        default_memory = get_default_memory(_tables[key])
+        report[_format_key(key)] = dict(stats, default_memory_kb=round(default_memory / 1024, 1),
+                                        saved_percent=round(100 - stats['memory_kb'] * 1024 / default_memory * 100, 1))
+    report = pd.DataFrame.from_dict(report, orient='index')
+    report.index.name = 'table'
+    return report.sort_index()
+
+
+def _format_key(key):
+    '''
+        Formats the key of a loaded table, with its filters.
+
+        Args:
+            key: (name, columns, competition, squads) tuple of the table
+        Returns:
+            The name of the table, followed by its filters if any.
+    '''
+    name, columns, competition, squads = key
+    filters = [f'{len(columns)} columns' if columns else None, competition,
+               ', '.join(squads) if squads else None]
+    filters = [value for value in filters if value]
+    return f"{name} ({'; '.join(filters)})" if filters else name
+
+
+if __name__ == '__main__':
+    load_all()
+    print(get_load_report().to_string())
@@ -0,0 +1,234 @@
+'''
+    Contains the partitioned data store of many tournaments and seasons.
+
+    Each table is a Parquet dataset, partitioned by competition and season:
+        <store>/<table>/competition=<competition>/season=<season>/part-0.parquet
+    A tournament is ingested from a folder of .csv files such as assets/data.
+    The rows of ScoresFixtures carry their own competition (qualifiers,
+    friendlies, ...), so they are partitioned by their Comp column instead.
+
+    The reads push the competition and season filters down to the partitions,
+    the squad filter down to the row groups (through their statistics)
+    and only read the requested columns, so a worker only loads what its
+    charts need. The data catalog reads from the store when DATA_STORE_DIR is set.
+
+    Run it from the src folder, for example:
+        python data_store.py ingest assets/data --competition "World Cup" --season 2022
+        python data_store.py list
+'''
+import argparse
+import os
+import shutil
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import config
+import data_catalog
+
+PARTITIONING = ds.partitioning(pa.schema([('competition', pa.string()), ('season', pa.string())]),
+                               flavor='hive')
+
+# Rows per row group: the squad filter skips the row groups without the squads
+ROW_GROUP_SIZE = 1000
+
+
+def get_store_dir(store_dir=None):
+    '''
+        Gets the folder of the store.
+
+        Args:
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+        Returns:
+            The path of the folder.
+    '''
+    return store_dir or config.DATA_STORE_DIR
+
+
+def get_partition_dir(name, competition, season, store_dir=None):
+    '''
+        Gets the folder of a partition of a table.
+
+        Args:
+            name: name of the table
+            competition: The competition of the partition
+            season: The season of the partition
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+        Returns:
+            The path of the folder.
+    '''
+    # The partition values are URI-encoded, as the hive partitioning of pyarrow expects
+    return os.path.join(get_store_dir(store_dir), name, f'competition={quote(competition, safe="")}',
+                        f'season={quote(str(season), safe="")}')
+
+
+def write_partition(dataframe, name, competition, season, store_dir=None):
+    '''
+        Writes (or replaces) a partition of a table. The rows keep their order,
+        the charts depending on it (the players of a squad are grouped in the .csv files).
+
+        Args:
+            dataframe: The rows of the partition
+            name: name of the table
+            competition: The competition of the partition
+            season: The season of the partition
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+    '''
+    directory = get_partition_dir(name, competition, season, store_dir)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    # The categories are stored as plain strings, each partition having its own
+    dataframe = dataframe.astype({column: 'object' for column, dtype in dataframe.dtypes.items()
+                                  if dtype == 'category'})
+    table = pa.Table.from_pandas(dataframe, preserve_index=False)
+    pq.write_table(table, os.path.join(directory, 'part-0.parquet'), row_group_size=ROW_GROUP_SIZE)
+
+
+def ingest(source_dir, competition, season, store_dir=None):
+    '''
+        Ingests the .csv files of a tournament in the store,
+        replacing the partitions of the same competition and season.
+
+        Args:
+            source_dir: The folder of the .csv files
+            competition: The competition of the tournament, such as 'World Cup'
+            season: The season of the tournament, such as 2022
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+        Returns:
+            A dictionary with the table names as keys and their number of rows as values.
+    '''
+    rows = {}
+    for file in sorted(os.listdir(source_dir)):
+        if not file.endswith('.csv'):
+            continue
+        name = file[:-len('.csv')]
+        dataframe = data_catalog.read_csv(os.path.join(source_dir, file), name)
+        column = data_catalog.COMPETITION_COLUMNS.get(name)
+        if column is None:
+            write_partition(dataframe, name, competition, season, store_dir)
+        else:
+            for value, partition in dataframe.groupby(column, observed=True):
+                write_partition(partition, name, value, season, store_dir)
+        rows[name] = len(dataframe)
+    return rows
+
+
+def table_names(store_dir=None):
+    '''
+        Lists the tables of the store.
+
+        Returns:
+            The sorted names of the tables.
+    '''
+    directory = get_store_dir(store_dir)
+    return sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+
+
+def get_files(name, store_dir=None):
+    '''
+        Lists the Parquet files of every partition of a table.
+
+        Args:
+            name: name of the table
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+        Returns:
+            The sorted paths of the files.
+    '''
+    files = []
+    for directory, _, names in os.walk(os.path.join(get_store_dir(store_dir), name)):
+        files += [os.path.join(directory, file) for file in names if file.endswith('.parquet')]
+    return sorted(files)
+
+
+def get_version(name, store_dir=None):
+    '''
+        Gets the version of a table, which changes whenever one of its partitions is written.
+
+        Args:
+            name: name of the table
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+        Returns:
+            A (latest modification time, total size, number of files) tuple.
+    '''
+    stats = [os.stat(path) for path in get_files(name, store_dir)]
+    return (max((stat.st_mtime_ns for stat in stats), default=0),
+            sum(stat.st_size for stat in stats), len(stats))
+
+
+def list_partitions(store_dir=None):
+    '''
+        Lists the partitions of every table of the store.
+
+        Returns:
+            A pandas dataframe with one row per partition, with its number of rows and size.
+    '''
+    partitions = []
+    for name in table_names(store_dir):
+        for path in get_files(name, store_dir):
+            values = ds.get_partition_keys(PARTITIONING.parse(
+                os.path.relpath(path, os.path.join(get_store_dir(store_dir), name))))
+            partitions.append({'table': name, 'competition': values['competition'],
+                               'season': values['season'], 'rows': pq.ParquetFile(path).metadata.num_rows,
+                               'size_kb': round(os.path.getsize(path) / 1024, 1)})
+    return pd.DataFrame(partitions)
+
+
+def read_table(name, competition=None, season=None, squads=None, columns=None, store_dir=None):
+    '''
+        Reads the rows of a table matching the filters, reading
+        only the matching partitions, row groups and columns.
+
+        Args:
+            name: name of the table
+            competition: The competition to read, or None for all of them
+            season: The season to read, or None for all of them
+            squads: The squads to read, or None for all of them
+            columns: The columns to read, or None for all of them
+            store_dir: The folder of the store, or None for DATA_STORE_DIR
+        Returns:
+            The pandas dataframe of the matching rows.
+    '''
+    dataset = ds.dataset(os.path.join(get_store_dir(store_dir), name), format='parquet',
+                         partitioning=PARTITIONING)
+    expression = None
+    for field, value in [('competition', competition), ('season', season)]:
+        if value is not None:
+            condition = ds.field(field) == str(value)
+            expression = condition if expression is None else expression & condition
+    if squads is not None:
+        condition = ds.field('Squad').isin(list(squads))
+        expression = condition if expression is None else expression & condition
+
+    if columns is None:
+        # The partition keys are not columns of the table
+        columns = [column for column in dataset.schema.names if column not in PARTITIONING.schema.names]
+    return dataset.to_table(columns=list(columns), filter=expression).to_pandas()
+
+
+def main():
+    '''
+        Ingests a tournament or lists the partitions of the store.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', help='folder of the store (DATA_STORE_DIR by default)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    ingest_parser = commands.add_parser('ingest', help='ingest a folder of .csv files')
+    ingest_parser.add_argument('source', help='folder of the .csv files of the tournament')
+    ingest_parser.add_argument('--competition', required=True)
+    ingest_parser.add_argument('--season', required=True)
+    commands.add_parser('list', help='list the partitions of the store')
+    args = parser.parse_args()
+
+    if not get_store_dir(args.store):
+        parser.error('set DATA_STORE_DIR or --store')
+    if args.command == 'ingest':
+        print(pd.Series(ingest(args.source, args.competition, args.season, args.store)).to_string())
+    else:
+        print(list_partitions(args.store).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,414 @@
+'''
+    Contains the registry of every figure displayed in the dashboard,
+    with the tables and modules each one is built from, and the
+    content-addressed on-disk cache of the built figures.
+
+    A cached figure is keyed by a hash of its input .csv files and of the
+    source code of its builder modules, so the application starts from
+    the cache when nothing changed and only rebuilds the figures whose
+    inputs changed. At startup, the missing figures are built concurrently
+    in a pool of FIGURE_WORKERS processes, since none depends on another.
+'''
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# The visualization modules are imported by the builders only, so that
+# starting from the cache does not pay for pandas and plotly.express.
+# pylint: disable=import-outside-toplevel
+
+def build_offense():
+    import bar_chart_off_def
+    df_offense, _ = bar_chart_off_def.load_data()
+    return bar_chart_off_def.create_offense_plot(bar_chart_off_def.prep_offense_data(df_offense))
+
+
+def build_defense():
+    import bar_chart_off_def
+    _, df_defense = bar_chart_off_def.load_data()
+    return bar_chart_off_def.create_defense_plot(bar_chart_off_def.prep_defense_data(df_defense))
+
+
+def build_radar_defense():
+    import radar_chart_def_pos
+    return radar_chart_def_pos.get_figure('defense')
+
+
+def build_radar_possession():
+    import radar_chart_def_pos
+    return radar_chart_def_pos.get_figure('possession')
+
+
+def build_shooting_overall():
+    import bar_chart_shooting
+    return bar_chart_shooting.get_view("Overall")[2]
+
+
+def build_shooting_per_match():
+    import bar_chart_shooting
+    return bar_chart_shooting.get_view("Per Match")[2]
+
+
+def build_heatmap():
+    import heatmap
+    # Sliced from the arrays of every squad, which are refreshed at the same time
+    figure = heatmap.get_squad_figure()
+    # The selectors of the layout are read from the cached figure, without loading the arrays
+    tensors = heatmap.get_squad_tensors()
+    meta = {'squads': sorted(tensors), 'max_players': max(len(tensor['players']) for tensor in tensors.values())}
+    return dict(figure, layout=dict(figure['layout'], meta=meta))
+
+
+def build_violin_min():
+    import violin
+    return violin.draw_figure(df=violin.prep_data_violin(), column="Min")
+
+
+def build_violin_age():
+    import violin
+    return violin.draw_figure(df=violin.prep_data_violin(), column="Age")
+
+
+def build_player_rank():
+    import bar_chart_player_rank
+    return bar_chart_player_rank.get_figure()
+
+
+VIOLIN_SETTINGS = ['VIOLIN_MODE', 'VIOLIN_POINT_THRESHOLD', 'VIOLIN_KDE_POINTS', 'VIOLIN_KDE_BINS']
+
+# Every figure with its builder, the tables (.csv files of assets/data),
+# the modules (besides COMMON_MODULES) and the settings of config.py it depends on
+FIGURES = {
+    'offense': {
+        'builder': build_offense,
+        'tables': ['Roster', 'Passing'],
+        'modules': ['bar_chart_off_def']
+    },
+    'defense': {
+        'builder': build_defense,
+        'tables': ['Roster', 'DefensiveActions'],
+        'modules': ['bar_chart_off_def']
+    },
+    'radar_defense': {
+        'builder': build_radar_defense,
+        'tables': ['DefensiveActions', 'MiscellaneousStats'],
+        'modules': ['radar_chart_def_pos']
+    },
+    'radar_possession': {
+        'builder': build_radar_possession,
+        'tables': ['Passing', 'Possession', 'ScoresFixtures'],
+        'modules': ['radar_chart_def_pos']
+    },
+    'shooting_overall': {
+        'builder': build_shooting_overall,
+        'tables': ['Shooting'],
+        'modules': ['bar_chart_shooting']
+    },
+    'shooting_per_match': {
+        'builder': build_shooting_per_match,
+        'tables': ['Shooting'],
+        'modules': ['bar_chart_shooting']
+    },
+    'heatmap': {
+        'builder': build_heatmap,
+        'tables': ['Roster', 'PlayingTime', 'StandardStats'],
+        'modules': ['heatmap']
+    },
+    'violin_min': {
+        'builder': build_violin_min,
+        'tables': ['StandardStats'],
+        'modules': ['violin'],
+        'settings': VIOLIN_SETTINGS
+    },
+    'violin_age': {
+        'builder': build_violin_age,
+        'tables': ['StandardStats'],
+        'modules': ['violin'],
+        'settings': VIOLIN_SETTINGS
+    },
+    'player_rank': {
+        'builder': build_player_rank,
+        'tables': ['Roster', 'StandardStats', 'PlayingTime', 'Passing', 'PassTypes', 'DefensiveActions',
+                   'Possession', 'Shooting', 'GoalandShotCreation', 'MiscellaneousStats'],
+        'modules': ['bar_chart_player_rank', 'percentiles'],
+        'settings': ['PERCENTILE_MIN_MINUTES', 'PLAYER_RANK_DEFAULT']
+    },
+}
+
+# Modules and settings every figure depends on
+COMMON_MODULES = ['template', 'data_catalog', 'figures', 'payload']
+COMMON_SETTINGS = ['DATA_STORE_DIR', 'COMPETITION', 'SEASON', 'PAYLOAD_OPTIMIZER', 'PAYLOAD_DIGITS']
+
+def get_dependency_graph():
+    '''
+        Builds the dependency graph from each table to the modules
+        and figures built from it, such as Shooting to bar_chart_shooting
+        and its two figures.
+
+        Returns:
+            A dictionary with the table names as keys and dictionaries
+            of the 'modules' and 'figures' depending on them as values.
+    '''
+    graph = {}
+    for name, spec in FIGURES.items():
+        for table in spec['tables']:
+            node = graph.setdefault(table, {'modules': [], 'figures': []})
+            node['modules'] += [module for module in spec['modules'] if module not in node['modules']]
+            node['figures'].append(name)
+    return graph
+
+
+# Hashes of the files already read, keyed by (path, modification time, size)
+_file_hashes = {}
+# Figures already loaded by this process, keyed by name, with their cache key
+_figures = {}
+
+
+def _hash_file(path):
+    '''
+        Hashes the content of a file, reading it only once per version.
+
+        Args:
+            path: path of the file
+        Returns:
+            The hex digest of the content.
+    '''
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        with open(path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        _file_hashes[key] = digest
+    return digest
+
+
+def get_input_files(name):
+    '''
+        Lists the files a figure is built from.
+
+        Args:
+            name: name of the figure in FIGURES
+        Returns:
+            The paths of the input .csv (or Parquet) files and of the builder modules.
+    '''
+    import data_catalog
+
+    spec = FIGURES[name]
+    tables = [path for table in spec['tables'] for path in data_catalog.get_files(table)]
+    modules = [os.path.join(SRC_DIR, f'{module}.py') for module in spec['modules'] + COMMON_MODULES]
+    return tables + modules
+
+
+def get_cache_key(name):
+    '''
+        Computes the content-addressed key of a figure.
+
+        Args:
+            name: name of the figure in FIGURES
+        Returns:
+            The hex digest identifying the inputs and code of the figure.
+    '''
+    import plotly
+
+    key = hashlib.sha256(f'{name}:plotly-{plotly.__version__}'.encode())
+    for setting in COMMON_SETTINGS + FIGURES[name].get('settings', []):
+        key.update(f'{setting}={getattr(config, setting)}'.encode())
+    for path in get_input_files(name):
+        key.update(f'{os.path.basename(path)}:{_hash_file(path)}'.encode())
+    return key.hexdigest()
+
+
+def build_figure(name):
+    '''
+        Builds a figure with the default theme of the application.
+
+        Args:
+            name: name of the figure in FIGURES
+        Returns:
+            The plotly figure.
+    '''
+    import template
+
+    template.create_custom_theme()
+    template.set_default_theme()
+    return FIGURES[name]['builder']()
+
+
+def _write_cache(name, key, fig_json):
+    '''
+        Writes the serialized figure to the cache atomically and removes
+        the older versions of the same figure.
+
+        Args:
+            name: name of the figure
+            key: cache key of the figure
+            fig_json: the serialized figure
+    '''
+    os.makedirs(config.FIGURE_CACHE_DIR, exist_ok=True)
+    path = os.path.join(config.FIGURE_CACHE_DIR, f'{name}-{key}.json')
+    with tempfile.NamedTemporaryFile('w', dir=config.FIGURE_CACHE_DIR, delete=False, suffix='.tmp') as file:
+        file.write(fig_json)
+    os.replace(file.name, path)
+
+    for old_file in os.listdir(config.FIGURE_CACHE_DIR):
+        if old_file.startswith(f'{name}-') and old_file.endswith('.json') and old_file != os.path.basename(path):
+            os.remove(os.path.join(config.FIGURE_CACHE_DIR, old_file))
+
+
+def _build_serialized(name):
+    '''
+        Builds a figure and serializes it, in this process or in a worker process of the pool.
+
+        Args:
+            name: name of the figure in FIGURES
+        Returns:
+            The JSON of the figure, optimized by payload.py, and the build time in seconds.
+    '''
+    import payload
+
+    start = time.perf_counter()
+    fig_json = payload.dumps(payload.optimize(build_figure(name)))
+    return fig_json, time.perf_counter() - start
+
+
+def _read_cache(name, key):
+    '''
+        Reads a figure from the cache.
+
+        Args:
+            name: name of the figure
+            key: cache key of the figure
+        Returns:
+            The figure as a dictionary, or None if it is not cached.
+    '''
+    if not config.FIGURE_CACHE:
+        return None
+    path = os.path.join(config.FIGURE_CACHE_DIR, f'{name}-{key}.json')
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _store(name, key, fig_json):
+    '''
+        Keeps a built figure in memory and writes it to the cache.
+
+        Args:
+            name: name of the figure
+            key: cache key of the figure
+            fig_json: the serialized figure
+        Returns:
+            The figure as a dictionary.
+    '''
+    if config.FIGURE_CACHE:
+        _write_cache(name, key, fig_json)
+    figure = json.loads(fig_json)
+    _figures[name] = (key, figure)
+    return figure
+
+
+def get_figure(name):
+    '''
+        Gets a figure from the cache, building and caching it
+        if its inputs changed since it was cached. The figure is then
+        kept in memory, so the lazy loading callbacks do not read it again.
+        The figure is cached as optimized by payload.py, and only kept
+        in memory without FIGURE_CACHE.
+        The returned dictionary is shared and must not be modified.
+
+        Args:
+            name: name of the figure in FIGURES
+        Returns:
+            The figure as a dictionary, ready to be given to a dcc.Graph.
+    '''
+    key = get_cache_key(name)
+    loaded = _figures.get(name)
+    if loaded is not None and loaded[0] == key:
+        return loaded[1]
+
+    figure = _read_cache(name, key)
+    if figure is None:
+        fig_json, seconds = _build_serialized(name)
+        logger.info('Built %s in %.0f ms', name, seconds * 1000)
+        return _store(name, key, fig_json)
+    _figures[name] = (key, figure)
+    return figure
+
+
+def is_current(name):
+    '''
+        Tells whether the figure loaded by this process was built from the current inputs.
+
+        Args:
+            name: name of the figure in FIGURES
+        Returns:
+            False if the figure is not loaded or its inputs changed since.
+    '''
+    loaded = _figures.get(name)
+    return loaded is not None and loaded[0] == get_cache_key(name)
+
+
+def build_figures(names=None, workers=None):
+    '''
+        Builds the figures missing from the cache, concurrently in a process
+        pool, so a cold start takes as long as the slowest figure instead of
+        the sum of all of them. The figures are gathered in the order of
+        their names, and built one after another in this process with a single
+        worker, a single missing figure or if the pool cannot be started.
+        Every figure is then loaded in memory.
+
+        Args:
+            names: names of the figures in FIGURES, every figure by default
+            workers: The number of processes, FIGURE_WORKERS by default
+        Returns:
+            A dictionary with the names of the built figures as keys and their build times in seconds as values.
+    '''
+    start = time.perf_counter()
+    names = list(FIGURES) if names is None else names
+    workers = config.FIGURE_WORKERS if workers is None else workers
+    keys = {name: get_cache_key(name) for name in names}
+    missing = [name for name in names if _figures.get(name, (None,))[0] != keys[name]
+               and not (config.FIGURE_CACHE and os.path.exists(
+                   os.path.join(config.FIGURE_CACHE_DIR, f'{name}-{keys[name]}.json')))]
+
+    times = {}
+    workers = min(workers, len(missing))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {name: pool.submit(_build_serialized, name) for name in missing}
+                for name in missing:
+                    fig_json, times[name] = futures[name].result()
+                    _store(name, keys[name], fig_json)
+        except (OSError, BrokenProcessPool):
+            logger.warning('Could not build the figures in a process pool, building them one after another',
+                           exc_info=True)
+            workers = 1
+    for name in missing:
+        if name not in times:
+            fig_json, times[name] = _build_serialized(name)
+            _store(name, keys[name], fig_json)
+
+    for name in missing:
+        logger.info('Built %s in %.0f ms', name, times[name] * 1000)
+    for name in names:
+        get_figure(name)
+    if missing:
+        logger.info('Built %s figures with %s processes in %.0f ms', len(missing), max(workers, 1),
+                    (time.perf_counter() - start) * 1000)
+    return times
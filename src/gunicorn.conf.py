@@ -0,0 +1,48 @@
+'''
+    Contains the gunicorn configuration of the production server.
+    Run it from the src folder with: gunicorn -c gunicorn.conf.py
+'''
+import os
+
+# Imported under another name: 'config' is itself a gunicorn setting
+import config as app_config
+
+wsgi_app = 'wsgi:server'
+bind = app_config.BIND
+workers = app_config.WEB_WORKERS
+threads = app_config.WEB_THREADS
+
+# Loads the application (and warms it up) in the master process before forking,
+# so the data and figures are shared copy-on-write between the workers
+preload_app = True
+
+
+def when_ready(server):
+    '''
+        Called once the master process is ready, after the preloaded warmup.
+    '''
+    server.log.info('Application warm, starting %s workers with %s threads', workers, threads)
+    if app_config.READY_FILE:
+        with open(app_config.READY_FILE, 'w', encoding='utf-8') as file:
+            file.write(str(os.getpid()))
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    '''
+        Called in each worker after it is forked: threads do not survive
+        the fork, so each worker starts its own reloader of the figures.
+        Only the worker holding the lock file of the reloader rebuilds
+        them, the others load them from the figure cache.
+    '''
+    # pylint: disable=import-outside-toplevel
+    import reloader
+    from app import reload_layout
+    reloader.start(on_reload=reload_layout)
+
+
+def on_exit(server):  # pylint: disable=unused-argument
+    '''
+        Called when gunicorn stops, removes the readiness file.
+    '''
+    if app_config.READY_FILE and os.path.exists(app_config.READY_FILE):
+        os.remove(app_config.READY_FILE)
@@ -1,14 +1,21 @@
 '''
     Contains some functions related to the creation of the heatmap.
 '''
-import plotly.express as px
+import plotly.colors
 import pandas as pd
 import numpy as np
 
 import template
+import data_catalog
+import instrumentation
 
 # Define the statistics used in the heatmap
 stats = ["G", "AG", "onG", "onGA", "PlusMinus", "OnOff"]
+# Statistics which are not already per 90 minutes played
+per_match_stats = ["G", "AG", "onG", "onGA"]
+
+# Memoized arrays of every squad, with the versions of the tables they were computed from
+_squad_tensors = {}
 
 '''
     Functions to preprocess the data used in the visualisation.
@@ -55,23 +62,25 @@ def filter_columns(dataframe):
     return dataframe
 
 
-def filter_players(dataframe):
+def filter_players(dataframe, squad="Morocco", n=10):
     '''
         Filters the elements of the dataframe by squad, position, and minutes, 
-        to keep only the 10 non-goalkeeper players with the most playing time 
-        in the Moroccan national team.
+        to keep only the n non-goalkeeper players with the most playing time 
+        in the given national team (by default, the 10 of Morocco).
 
         Args:
             dataframe: The dataframe to process
+            squad: The national team to keep
+            n: The number of players to keep
         Returns:
             The dataframe filtered by squad, position, and minutes played.
     '''
-    # Filter for only Morocco
-    dataframe = dataframe.loc[dataframe["Squad"] == "Morocco"]
+    # Filter for only the squad
+    dataframe = dataframe.loc[dataframe["Squad"] == squad]
     # Remove the goalkeepers
     dataframe = dataframe.loc[dataframe["Pos"] != "GK"]
-    # Keep the 10 players who played most minutes
-    dataframe = dataframe.sort_values(by=["Min"], ascending=False).head(10)
+    # Keep the n players who played most minutes
+    dataframe = dataframe.sort_values(by=["Min"], ascending=False, kind="mergesort").head(n)
     dataframe = dataframe.set_index(["Player"])
     return dataframe
 
@@ -90,40 +99,101 @@ def add_minus_exp(dataframe):
             except for the "onGA" statistic which needs to be the opposite 
             to respect the color signification.
     '''
-    for stat_name in stats:
-        # Normalize all the variables per 90 minutes played if not done already
-        if stat_name not in ["PlusMinus", "OnOff"]:
-            dataframe[f"actual_{stat_name}"] = dataframe[f"actual_{stat_name}"] / dataframe["MP"]
-            dataframe[f"expected_{stat_name}"] = dataframe[f"expected_{stat_name}"] / dataframe["MP"]
-        # Create the actual minus expected columns for the selected variables
-        dataframe = dataframe.round(decimals=2)
-        dataframe[stat_name] = dataframe[f"actual_{stat_name}"] - dataframe[f"expected_{stat_name}"]
-        # Take the opposite for onGA to respect the color code from negative to positive
-        if stat_name == "onGA":
-            dataframe[stat_name] = - dataframe[stat_name]
+    actual_keys = [f"actual_{stat_name}" for stat_name in stats]
+    expected_keys = [f"expected_{stat_name}" for stat_name in stats]
+    # Normalize all the variables per 90 minutes played if not done already,
+    # all the statistics at once
+    divisor = np.where(np.isin(stats, per_match_stats), dataframe[["MP"]].to_numpy(dtype=float), 1.0)
+    actual = np.round(dataframe[actual_keys].to_numpy(dtype=float) / divisor, 2)
+    expected = np.round(dataframe[expected_keys].to_numpy(dtype=float) / divisor, 2)
+    # Create the actual minus expected columns for the selected variables
+    difference = actual - expected
+    # Take the opposite for onGA to respect the color code from negative to positive
+    difference[:, stats.index("onGA")] *= -1
+
+    dataframe = dataframe.copy()
+    dataframe[actual_keys] = actual
+    dataframe[expected_keys] = expected
+    dataframe[stats] = difference
     # Round the raw data to two decimals to display the values more clearly
     dataframe = dataframe.round(decimals=2)
     return dataframe
 
 
-def prep_data():
+def merge_data():
+    '''
+    Gets the playing time and standard stats of every player from the player table.
+
+    Returns:
+        The dataframe of every player with standardized names.
+    '''
+    dataframe = data_catalog.get_players({
+        'PlayingTime': ['Pos', 'MP', 'Min', 'TeamSuccess-onG', 'TeamSuccess-onGA', 'TeamSuccess-PlusMinus/90',
+                        'TeamSuccess-OnOff', 'TeamSuccess(xG)-onxG', 'TeamSuccess(xG)-onxGA',
+                        'TeamSuccess(xG)-PlusMinus/90', 'TeamSuccess(xG)-OnOff'],
+        'StandardStats': ['Gls', 'Ast', 'xG', 'xAG']
+    })
+    return filter_columns(dataframe.reset_index())
+
+
+def prep_data(squad="Morocco", n=10):
     '''
     Applies all the data preprocessing.
 
+    Args:
+        squad: The national team to display
+        n: The number of players to display
     Returns:
         The processed dataframe with standardized names and desired statistics.
     '''
-    dataframe_pt = pd.read_csv('./assets/data/PlayingTime.csv')
-    dataframe_ss = pd.read_csv('./assets/data/StandardStats.csv')
-    dataframe = pd.merge(dataframe_pt, dataframe_ss, on=['Squad', 'Player', 'Pos', 'Age', 'MP', 'Min', '90s'], how='outer')
-
-    dataframe = filter_columns(dataframe)
-    dataframe = filter_players(dataframe)
+    dataframe = merge_data()
+    dataframe = filter_players(dataframe, squad, n)
     dataframe = add_minus_exp(dataframe)
     
     return dataframe
 
 
+def get_squad_tensors():
+    '''
+    Precomputes, for every squad, the arrays displayed in the heatmap:
+    the players sorted by minutes played, their raw statistics and the hover data.
+    They are computed in a single vectorized pass, once, and again only
+    when one of the tables they come from changes.
+
+    Returns:
+        A dictionary with the squads as keys and dictionaries of
+        NumPy arrays (players, raw, hoverdata) as values.
+    '''
+    versions = tuple(data_catalog.get_version(table) for table in ['Roster', 'PlayingTime', 'StandardStats'])
+    if _squad_tensors.get('versions') != versions:
+        dataframe = merge_data()
+        # Remove the goalkeepers and the players who did not play
+        dataframe = dataframe.loc[(dataframe["Pos"] != "GK") & (dataframe["MP"] > 0)]
+        dataframe = dataframe.sort_values(by=["Squad", "Min"], ascending=[True, False], kind="mergesort")
+        dataframe = add_minus_exp(dataframe.set_index(["Player"]))
+        hoverdata, raw_data, _ = get_display_data(dataframe)
+
+        squads = dataframe["Squad"].to_numpy()
+        tensors = {}
+        for squad in pd.unique(squads):
+            rows = squads == squad
+            tensors[squad] = {
+                "players": dataframe.index.to_numpy()[rows],
+                "raw": raw_data.to_numpy()[rows],
+                "hoverdata": hoverdata[rows]
+            }
+        # The versions are replaced last, the arrays being read by the other threads meanwhile
+        _squad_tensors.update(tensors=tensors, columns=list(raw_data.columns), versions=versions)
+    return _squad_tensors["tensors"]
+
+
+def reset_tensors():
+    '''
+    Forgets the precomputed arrays of the squads, so they are computed again on next use.
+    '''
+    _squad_tensors.clear()
+
+
 '''
    Functions related to the creation of the heatmap.
 '''
@@ -151,14 +221,25 @@ def get_display_data(dataframe):
 
     hoverdata = np.stack([df_pos, df_actual, df_expected], axis=-1)
 
-    # Normalize each column between -1 and 1
-    norm_data = raw_data.copy()
-    for stat_name in raw_data.keys():
-        norm_data[stat_name] = raw_data[stat_name] / raw_data[stat_name].abs().max()
+    norm_data = pd.DataFrame(normalize(raw_data.to_numpy()), index=raw_data.index, columns=raw_data.columns)
     
     return hoverdata, raw_data, norm_data
 
 
+def normalize(raw):
+    '''
+        Normalizes each column between -1 and 1, dividing it by its largest absolute value.
+        The columns where every displayed player has 0 stay at 0.
+
+        Args:
+            raw: The array of the raw statistics, with one column per statistic
+        Returns:
+            The normalized array.
+    '''
+    maximum = np.abs(raw).max(axis=0)
+    return np.divide(raw, maximum, out=np.zeros_like(raw, dtype=float), where=maximum != 0)
+
+
 def get_heatmap_hover_template(customdata):
     '''
         Creates the template for the hover tooltips in the heatmap.
@@ -190,29 +271,78 @@ def get_figure(dataframe):
             The figure to be displayed.
     '''
     hoverdata, raw_data, norm_data = get_display_data(dataframe)
+    return draw_heatmap(norm_data, raw_data, hoverdata)
 
-    # Create the heatmap
-    fig = px.imshow(img=norm_data,
-                    x=norm_data.keys(), # columns also works
-                    y=norm_data.index,
-                    color_continuous_midpoint=0,
-                    title = "Actual minus expected value per 90 minutes played",
-                    aspect="auto"
-                    )
-        
-    fig.update_layout(
-                      yaxis_title="Player",
-                      dragmode=False,
-                      coloraxis_showscale=False,
-                      xaxis_side="top",
-                      yaxis_autorange="reversed",
-                      colorscale_sequential='RdBu'
-                      )
-    
+
+def get_squad_figure(squad="Morocco", n=10):
+    '''
+        Generates the heatmap of the n players of a squad with the most playing time,
+        slicing the precomputed arrays of the squad.
+
+        Args:
+            squad: The national team to display
+            n: The number of players to display
+        Returns:
+            The figure to be displayed.
+    '''
+    with instrumentation.span('pandas'):
+        tensor = get_squad_tensors()[squad]
+        raw = tensor["raw"][:n]
+        columns = _squad_tensors["columns"]
+        # Normalize each column between -1 and 1, over the displayed players
+        norm = normalize(raw)
+        raw_data = pd.DataFrame(raw, index=tensor["players"][:n], columns=columns)
+        norm_data = pd.DataFrame(norm, index=raw_data.index, columns=columns)
+    return draw_heatmap(norm_data, raw_data, tensor["hoverdata"][:n])
+
+
+def get_colorscale(colors):
+    '''
+        Converts a list of colors to a colorscale, with evenly spaced colors.
+
+        Args:
+            colors: The list of colors
+        Returns:
+            The list of [position, color] pairs.
+    '''
+    return [[index / (len(colors) - 1), color] for index, color in enumerate(colors)]
+
+
+def draw_heatmap(norm_data, raw_data, hoverdata):
+    '''
+        Draws the heatmap. The figure is the one px.imshow would create,
+        built as a dictionary, so the callback neither imports plotly.express
+        nor validates the figure.
+
+        Args:
+            norm_data: The data to set the color values
+            raw_data: The data to display
+            hoverdata: The position, actual value, and expected value of each cell
+        Returns:
+            The figure to be displayed, as a dictionary.
+    '''
     # Include the hover template and change displayed text to raw values (not normalized)
-    fig.update_traces(hovertemplate=get_heatmap_hover_template(hoverdata),
-                      customdata=hoverdata,
-                      text=raw_data, texttemplate="%{text}"
-                      )
-    
-    return fig
+    trace = {
+        "type": "heatmap",
+        "name": "0",
+        "x": list(norm_data.columns),
+        "y": norm_data.index.tolist(),
+        "z": norm_data.to_numpy().tolist(),
+        "coloraxis": "coloraxis",
+        "xaxis": "x",
+        "yaxis": "y",
+        "hovertemplate": get_heatmap_hover_template(hoverdata),
+        "customdata": np.asarray(hoverdata).tolist(),
+        "text": raw_data.to_numpy().tolist(),
+        "texttemplate": "%{text}"
+    }
+    layout = {
+        "template": template.get_template(),
+        "title": {"text": "Actual minus expected value per 90 minutes played"},
+        "xaxis": {"anchor": "y", "domain": [0.0, 1.0], "side": "top"},
+        "yaxis": {"anchor": "x", "domain": [0.0, 1.0], "autorange": "reversed", "title": {"text": "Player"}},
+        "coloraxis": {"colorscale": get_colorscale(template.THEME["colorscale"]), "cmid": 0, "showscale": False},
+        "colorscale": {"sequential": get_colorscale(plotly.colors.sequential.RdBu)},
+        "dragmode": False
+    }
+    return {"data": [trace], "layout": layout}
@@ -0,0 +1,414 @@
+'''
+    Contains the compression and HTTP caching of the responses of the application.
+
+    The layout, dependencies and callback responses are compressed with
+    brotli (when installed) or gzip, depending on what the browser accepts.
+    The GET responses get an ETag computed from their content, so a browser
+    which already has them receives an empty 304 response.
+
+    The files of the assets folder are served from precompressed copies,
+    written once per version of each file in ASSETS_CACHE_DIR. The URLs
+    Dash generates for them are versioned (?m=...), so these responses are
+    cached by the browser for a year without revalidation; the other
+    assets, such as the fonts referenced by the CSS files, are revalidated
+    with their ETag.
+
+    The JavaScript bundles of Dash and its component libraries, served
+    under _dash-component-suites, go through the same precompressed copies.
+    Running `python http_cache.py` writes the best compressed copies of the
+    assets and bundles ahead of time, for example in the build step of the
+    deployment, and the warmup of wsgi.py writes the missing ones; a request
+    finding no copy only compresses its file at the fast level.
+    The compressed bytes of the other responses are kept in memory by the
+    hash of their content, so an unchanged response is compressed only once.
+'''
+import functools
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+import config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Internals of Dash (checked with dash 2.9) the route of the component suites relies on,
+# without which Dash keeps serving them itself
+try:
+    from dash._validate import validate_js_path
+    from dash.fingerprint import check_fingerprint
+except ImportError:
+    validate_js_path = check_fingerprint = None
+
+ASSETS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+
+# Extensions of the assets worth compressing (the images and the woff fonts are already compressed)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.json', '.csv', '.svg', '.ttf', '.eot', '.ico', '.txt', '.html')
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript',
+                          'text/javascript')
+
+# Smaller responses fit in a single packet anyway
+MIN_SIZE = 500
+# Versioned assets never change, the URL of their next version does
+IMMUTABLE_MAX_AGE = 31536000
+# Total size of the compressed responses kept in memory, in bytes
+COMPRESSED_CACHE_SIZE = 32 * 1024 * 1024
+
+# Hashes of the assets already read, keyed by (path, modification time, size)
+_file_hashes = {}
+
+# Compressed bytes of the responses, keyed by (hash of the content, encoding), least recently used first
+_compressed = OrderedDict()
+_compressed_size = 0
+_compressed_lock = threading.Lock()
+
+# Locks of the compressed copies being written, keyed by path
+_write_locks = {}
+_write_locks_lock = threading.Lock()
+
+
+def get_encoding():
+    '''
+        Chooses the compression of the response among those the browser accepts.
+
+        Returns:
+            'br', 'gzip' or None.
+    '''
+    if brotli is not None and 'br' in request.accept_encodings:
+        return 'br'
+    if 'gzip' in request.accept_encodings:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level='fast'):
+    '''
+        Compresses data with the given encoding.
+
+        Args:
+            data: The bytes to compress
+            encoding: 'br' or 'gzip'
+            level: 'fast' for the dynamic responses, 'best' for the precompressed assets
+        Returns:
+            The compressed bytes.
+    '''
+    if encoding == 'br':
+        return brotli.compress(data, quality=5 if level == 'fast' else 11)
+    return gzip.compress(data, compresslevel=6 if level == 'fast' else 9, mtime=0)
+
+
+def _hash_file(path):
+    '''
+        Hashes the content of an asset, reading it only once per version.
+
+        Args:
+            path: path of the file
+        Returns:
+            The first 16 characters of the hex digest of the content.
+    '''
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    digest = _file_hashes.get(key)
+    if digest is None:
+        with open(path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()[:16]
+        _file_hashes[key] = digest
+    return digest
+
+
+def get_cached_compression(data, digest, encoding):
+    '''
+        Compresses the content of a response, or gets its compressed
+        bytes from memory if the same content was already compressed.
+
+        Args:
+            data: The bytes to compress
+            digest: The hash of data
+            encoding: 'br' or 'gzip'
+        Returns:
+            The compressed bytes.
+    '''
+    global _compressed_size
+    key = (digest, encoding)
+    with _compressed_lock:
+        compressed = _compressed.get(key)
+        if compressed is not None:
+            _compressed.move_to_end(key)
+            return compressed
+
+    compressed = compress(data, encoding)
+    if len(compressed) > COMPRESSED_CACHE_SIZE:
+        return compressed
+    with _compressed_lock:
+        if key not in _compressed:
+            _compressed[key] = compressed
+            _compressed_size += len(compressed)
+        while _compressed_size > COMPRESSED_CACHE_SIZE:
+            _compressed_size -= len(_compressed.popitem(last=False)[1])
+    return compressed
+
+
+def get_compressed_asset(path, encoding, root=ASSETS_FOLDER, cache_dir=None, level='best'):
+    '''
+        Gets the precompressed copy of an asset, writing it if this
+        version of the asset was not compressed yet. The copies are
+        named after the hash of the content of the asset.
+
+        The best compression of a large bundle takes seconds, so the
+        requests only write a copy at the 'fast' level when the best one
+        is missing; precompress_assets writes the best ones, which then
+        replace it. Each copy is written by a single thread of the process.
+
+        Args:
+            path: path of the asset
+            encoding: 'br' or 'gzip'
+            root: folder the asset is served from
+            cache_dir: folder of the compressed copies, ASSETS_CACHE_DIR if None
+            level: 'best', or 'fast' to serve a request
+        Returns:
+            The path of the compressed copy.
+    '''
+    relative_path = os.path.relpath(path, root)
+    directory = os.path.join(cache_dir or config.ASSETS_CACHE_DIR, os.path.dirname(relative_path))
+    name = os.path.basename(relative_path)
+    digest = _hash_file(path)
+    best_path = os.path.join(directory, f'{name}.{digest}.{encoding}')
+    compressed_path = best_path if level == 'best' else os.path.join(directory, f'{name}.{digest}.fast.{encoding}')
+    if os.path.exists(best_path):
+        return best_path
+    if os.path.exists(compressed_path):
+        return compressed_path
+
+    with _get_write_lock(compressed_path):
+        # Written by another thread meanwhile
+        if os.path.exists(compressed_path):
+            return compressed_path
+        os.makedirs(directory, exist_ok=True)
+        with open(path, 'rb') as file:
+            data = compress(file.read(), encoding, level=level)
+        with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False, suffix='.tmp') as file:
+            file.write(data)
+        os.replace(file.name, compressed_path)
+
+    # The copies of the older versions of the asset, and its fast copy once the best one is written, are removed
+    pattern = re.compile(re.escape(name) + r'\.[0-9a-f]{16}(\.fast)?\.' + re.escape(encoding))
+    for old_file in os.listdir(directory):
+        if pattern.fullmatch(old_file) and old_file not in (os.path.basename(compressed_path),
+                                                             os.path.basename(best_path)):
+            try:
+                os.remove(os.path.join(directory, old_file))
+            except FileNotFoundError:
+                pass
+    return compressed_path
+
+
+def _get_write_lock(path):
+    '''
+        Gets the lock of the thread writing a compressed copy.
+
+        Args:
+            path: path of the compressed copy
+        Returns:
+            The threading.Lock of the path.
+    '''
+    with _write_locks_lock:
+        return _write_locks.setdefault(path, threading.Lock())
+
+
+def get_component_suites(app):
+    '''
+        Lists the JavaScript bundles Dash serves under _dash-component-suites.
+        Dash registers them when it renders the index page, which is
+        rendered once here if no browser requested it yet.
+
+        Args:
+            app: The Dash app
+        Returns:
+            A list of (package name, path of the package folder, path of the bundle) tuples.
+    '''
+    if not app.registered_paths:
+        app.server.test_client().get(app.config.routes_pathname_prefix)
+    suites = []
+    for package_name, paths in sorted(app.registered_paths.items()):
+        package_file = getattr(sys.modules.get(package_name), '__file__', None)
+        if not package_file:
+            continue
+        root = os.path.dirname(package_file)
+        for path_in_package in sorted(paths):
+            path = safe_join(root, path_in_package)
+            if path is not None and os.path.isfile(path):
+                suites.append((package_name, root, path))
+    return suites
+
+
+def precompress_assets(app=None):
+    '''
+        Writes the best compressed copies of every compressible asset,
+        and of the JavaScript bundles of Dash when the app is given.
+
+        Args:
+            app: The Dash app, None to only compress the assets folder
+        Returns:
+            A dictionary with the relative paths of the assets as keys
+            and their size, uncompressed and per encoding, as values.
+    '''
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    files = [(os.path.relpath(os.path.join(directory, file), ASSETS_FOLDER), ASSETS_FOLDER, None,
+              os.path.join(directory, file))
+             for directory, _, directory_files in os.walk(ASSETS_FOLDER) for file in sorted(directory_files)]
+    if app is not None:
+        files += [(f'_dash-component-suites/{package_name}/{os.path.relpath(path, root)}', root,
+                   os.path.join(config.ASSETS_CACHE_DIR, '_dash-component-suites', package_name), path)
+                  for package_name, root, path in get_component_suites(app)]
+
+    sizes = {}
+    for name, root, cache_dir, path in files:
+        if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+            continue
+        sizes[name] = {
+            'identity': os.path.getsize(path),
+            **{encoding: os.path.getsize(get_compressed_asset(path, encoding, root, cache_dir))
+               for encoding in encodings}
+        }
+    return sizes
+
+
+def serve_asset(filename):
+    '''
+        Serves a file of the assets folder, replacing the route of Dash.
+        The precompressed copy is sent when the browser accepts it.
+
+        Args:
+            filename: path of the file in the assets folder
+        Returns:
+            The response with the (compressed) file.
+    '''
+    path = safe_join(ASSETS_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    encoding = get_encoding() if filename.endswith(COMPRESSIBLE_EXTENSIONS) else None
+    etag = _hash_file(path) + (f'-{encoding}' if encoding else '')
+    # Without a version in the URL, the browser revalidates the asset with its ETag
+    versioned = 'm' in request.args
+    response = send_file(get_compressed_asset(path, encoding, level='fast') if encoding else path,
+                         mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                         conditional=True, etag=etag, last_modified=os.path.getmtime(path),
+                         max_age=IMMUTABLE_MAX_AGE if versioned else None)
+    if encoding and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+        response.vary.add('Accept-Encoding')
+    if versioned:
+        response.cache_control.immutable = True
+    return response
+
+
+def serve_component_suite(app, original_view, package_name, fingerprinted_path):
+    '''
+        Serves a JavaScript bundle of Dash or of a component library,
+        replacing the route of Dash. The precompressed copy is sent
+        when the browser accepts it.
+
+        Args:
+            app: The Dash app
+            original_view: The route of Dash, for the bundles which are not files on disk
+            package_name: name of the Python package of the bundle
+            fingerprinted_path: path of the bundle in the package, with its version
+        Returns:
+            The response with the (compressed) bundle.
+    '''
+    path_in_package, has_fingerprint = check_fingerprint(fingerprinted_path)
+    validate_js_path(app.registered_paths, package_name, path_in_package)
+
+    package_file = getattr(sys.modules[package_name], '__file__', None)
+    root = os.path.dirname(package_file) if package_file else None
+    path = safe_join(root, path_in_package) if root else None
+    if path is None or not os.path.isfile(path):
+        return original_view(package_name=package_name, fingerprinted_path=fingerprinted_path)
+
+    encoding = get_encoding() if path.endswith(COMPRESSIBLE_EXTENSIONS) else None
+    cache_dir = os.path.join(config.ASSETS_CACHE_DIR, '_dash-component-suites', package_name)
+    response = send_file(get_compressed_asset(path, encoding, root, cache_dir, level='fast') if encoding else path,
+                         mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                         conditional=True, etag=_hash_file(path) + (f'-{encoding}' if encoding else ''),
+                         last_modified=os.path.getmtime(path),
+                         max_age=IMMUTABLE_MAX_AGE if has_fingerprint else None)
+    if encoding and response.status_code == 200:
+        response.headers['Content-Encoding'] = encoding
+    if encoding:
+        response.vary.add('Accept-Encoding')
+    if has_fingerprint:
+        response.cache_control.immutable = True
+    return response
+
+
+def _after_request(response):
+    '''
+        Adds an ETag to the GET responses, answers the conditional
+        requests with 304 and compresses the responses.
+
+        Args:
+            response: The response of the request
+        Returns:
+            The response, possibly replaced by a 304 or compressed.
+    '''
+    if response.direct_passthrough or response.status_code != 200 \
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    data = response.get_data()
+    encoding = get_encoding() if len(data) >= MIN_SIZE else None
+    response.vary.add('Accept-Encoding')
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    if request.method == 'GET':
+        # Each encoding of the same content is a different representation, with its own tag
+        etag = digest + (f'-{encoding}' if encoding else '')
+        response.set_etag(etag)
+        # Unless the route made it cacheable, the browser revalidates the response with its ETag
+        if response.cache_control.max_age is None:
+            response.cache_control.no_cache = True
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+
+    if encoding:
+        response.set_data(get_cached_compression(data, digest, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    '''
+        Adds the compression and caching of the responses to the Flask
+        server of a Dash app, and replaces its routes of the assets and
+        of the component suites.
+
+        Args:
+            app: The Dash app
+    '''
+    server = app.server
+    server.after_request(_after_request)
+    blueprint = app.config.routes_pathname_prefix.replace('/', '_').replace('.', '_') + 'dash_assets'
+    server.view_functions[f'{blueprint}.static'] = serve_asset
+    suites = app.config.routes_pathname_prefix + '_dash-component-suites/<string:package_name>/<path:fingerprinted_path>'
+    if validate_js_path is not None and suites in server.view_functions:
+        server.view_functions[suites] = functools.partial(serve_component_suite, app, server.view_functions[suites])
+
+
+if __name__ == '__main__':
+    from app import app as dash_app  # pylint: disable=import-outside-toplevel
+    for asset, asset_sizes in precompress_assets(dash_app).items():
+        print(asset, asset_sizes)
@@ -0,0 +1,266 @@
+'''
+    Contains the per-request and per-callback instrumentation of the application.
+
+    For every request, the wall time, the time spent in the callback, in
+    the pandas work of the callback and in the serialization of the figures
+    (their optimization by payload.py, then their encoding to JSON by Dash),
+    and the response size are recorded.
+    They are sent back as a Server-Timing header and aggregated in latency
+    histograms exposed, in the Prometheus text format, by the /metrics route.
+    The metrics are kept per process, so each worker exposes its own.
+
+    Flask is only imported by the functions instrumenting the server, so the
+    data and visualization modules record their spans without importing it.
+'''
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+PHASES = ['callback', 'pandas', 'serialize']
+
+
+class Histogram:
+    '''
+        Latency histogram with the cumulative buckets of the Prometheus format.
+    '''
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        '''
+            Adds a value to the histogram.
+
+            Args:
+                value: The observed duration in seconds
+        '''
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+_lock = threading.Lock()
+# Start and spans of the request served by the current thread
+_current = threading.local()
+_request_latency = defaultdict(Histogram)
+_callback_latency = defaultdict(Histogram)
+_phase_seconds = defaultdict(float)
+_response_bytes = defaultdict(int)
+# Functions returning the lines of the metrics of other modules
+_collectors = []
+
+
+@contextmanager
+def span(phase):
+    '''
+        Measures a phase of the current request, such as 'pandas'. Outside of
+        a request, or within a span of the same phase, nothing is recorded.
+
+        Args:
+            phase: The name of the phase
+    '''
+    spans = getattr(_current, 'spans', None)
+    if spans is None or phase in _current.active:
+        yield
+        return
+    _current.active.add(phase)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[phase] += time.perf_counter() - start
+        _current.active.discard(phase)
+
+
+def timed_callback(function):
+    '''
+        Decorator recording the execution time of a Dash callback.
+
+        Args:
+            function: The callback function
+        Returns:
+            The wrapped callback.
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            with _lock:
+                _callback_latency[function.__name__].observe(duration)
+            if getattr(_current, 'spans', None) is not None:
+                _current.spans['callback'] += duration
+    return wrapper
+
+
+def timed_serialization(function):
+    '''
+        Decorator recording the time of a serialization function in the 'serialize' phase.
+
+        Args:
+            function: The function, such as the to_json of Dash
+        Returns:
+            The wrapped function.
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span('serialize'):
+            return function(*args, **kwargs)
+    wrapper.instrumented = True
+    return wrapper
+
+
+def get_endpoint():
+    '''
+        Gets a low-cardinality name of the current request: the route
+        pattern, and the output of the callback for callback requests.
+
+        Returns:
+            The endpoint name.
+    '''
+    from flask import request  # pylint: disable=import-outside-toplevel
+
+    rule = request.url_rule.rule if request.url_rule else 'unmatched'
+    if request.path.endswith('_dash-update-component'):
+        body = request.get_json(silent=True) or {}
+        return f"{rule}:{body.get('output', '')}"
+    return rule
+
+
+def _before_request():
+    '''
+        Starts measuring the current request.
+    '''
+    _current.start = time.perf_counter()
+    _current.spans = defaultdict(float)
+    _current.active = set()
+
+
+def _teardown_request(_):
+    '''
+        Stops measuring the current request, even if it failed.
+    '''
+    _current.spans = None
+
+
+def _after_request(response):
+    '''
+        Records the metrics of the current request and adds its Server-Timing header.
+
+        Args:
+            response: The response of the request
+        Returns:
+            The response, with the Server-Timing header.
+    '''
+    spans = getattr(_current, 'spans', None)
+    if spans is None:
+        return response
+    total = time.perf_counter() - _current.start
+
+    size = response.content_length
+    if size is None and not response.direct_passthrough:
+        size = len(response.get_data())
+
+    endpoint = get_endpoint()
+    with _lock:
+        _request_latency[endpoint].observe(total)
+        _response_bytes[endpoint] += size or 0
+        for phase, seconds in spans.items():
+            _phase_seconds[(endpoint, phase)] += seconds
+
+    timings = [f'total;dur={total * 1000:.2f}']
+    timings += [f'{phase};dur={spans[phase] * 1000:.2f}' for phase in PHASES if phase in spans]
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+def _format_histogram(name, label, histograms):
+    '''
+        Formats histograms in the Prometheus text format.
+
+        Args:
+            name: The name of the metric
+            label: The name of the label distinguishing the histograms
+            histograms: Dictionary with the label values as keys and the histograms as values
+        Returns:
+            The lines of text of the metric.
+    '''
+    lines = [f'# TYPE {name} histogram']
+    for key, histogram in sorted(histograms.items()):
+        for bound, count in zip(BUCKETS, histogram.counts):
+            lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{label}="{key}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{{label}="{key}"}} {histogram.sum}')
+        lines.append(f'{name}_count{{{label}="{key}"}} {histogram.count}')
+    return lines
+
+
+def render_metrics():
+    '''
+        Renders the metrics of this process in the Prometheus text format.
+
+        Returns:
+            The text of the metrics.
+    '''
+    with _lock:
+        lines = ['# HELP dash_request_duration_seconds Wall time of the requests.']
+        lines += _format_histogram('dash_request_duration_seconds', 'endpoint', _request_latency)
+        lines += ['# HELP dash_callback_duration_seconds Execution time of the callbacks.']
+        lines += _format_histogram('dash_callback_duration_seconds', 'callback', _callback_latency)
+        lines += ['# HELP dash_phase_seconds_total Time spent in each phase of the requests.',
+                  '# TYPE dash_phase_seconds_total counter']
+        lines += [f'dash_phase_seconds_total{{endpoint="{endpoint}",phase="{phase}"}} {seconds}'
+                  for (endpoint, phase), seconds in sorted(_phase_seconds.items())]
+        lines += ['# HELP dash_response_bytes_total Size of the responses.',
+                  '# TYPE dash_response_bytes_total counter']
+        lines += [f'dash_response_bytes_total{{endpoint="{endpoint}"}} {size}'
+                  for endpoint, size in sorted(_response_bytes.items())]
+    for collector in _collectors:
+        lines += collector()
+    return '\n'.join(lines) + '\n'
+
+
+def add_collector(collector):
+    '''
+        Adds the metrics of another module to the /metrics route.
+
+        Args:
+            collector: Function returning the lines of its metrics in the Prometheus text format
+    '''
+    _collectors.append(collector)
+
+
+def init_app(app):
+    '''
+        Instruments the Flask server of a Dash app and adds the /metrics route.
+
+        Args:
+            app: The Dash app
+    '''
+    # pylint: disable=import-outside-toplevel
+    from dash import _callback, dash as dash_module
+    from flask import Response
+
+    # Dash encodes the callback responses and the layout with the to_json of these modules
+    # (checked with dash 2.9), which are left as they are if it changes
+    for module in (_callback, dash_module):
+        to_json = getattr(module, 'to_json', None)
+        if callable(to_json) and not getattr(to_json, 'instrumented', False):
+            module.to_json = timed_serialization(to_json)
+
+    server = app.server
+    server.before_request(_before_request)
+    server.after_request(_after_request)
+    server.teardown_request(_teardown_request)
+    server.add_url_rule('/metrics', 'metrics',
+                        lambda: Response(render_metrics(), mimetype='text/plain; version=0.0.4'))
@@ -0,0 +1,529 @@
+'''
+    Contains the load test of the dashboard, replaying realistic sessions.
+
+    Each virtual user opens the page as a browser does: the index page,
+    the scripts and stylesheets it references, the fonts and images of
+    the stylesheets, the chunks of the components of the layout, the
+    layout and the callbacks graph. It then fires the callbacks called
+    on page load (such as the lazy figures), and interacts with the
+    dashboard: every server-side callback of the callbacks graph is
+    exercised by choosing new values for its dropdowns and sliders, so
+    new callbacks are load-tested without changing this file. A user
+    keeps its browser cache between its sessions: the versioned assets
+    are not requested again, and the others are revalidated with their ETag.
+
+    The throughput, the 50th, 95th and 99th percentiles of the latency
+    and the error rate are reported per endpoint. By default, the
+    production server (gunicorn.conf.py) is started on a free local
+    port, with the given numbers of workers and threads.
+
+    Run it from the src folder, for example:
+        python loadtest.py --users 20 --duration 60 --workers 2 --threads 4
+        python loadtest.py --url http://localhost:8050 --users 5
+'''
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+import figures
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Chunks loaded by the renderer for each type of component of the layout
+COMPONENT_CHUNKS = {
+    'Graph': ['async-graph.js', 'async-plotlyjs.js'],
+    'Dropdown': ['async-dropdown.js'],
+    'Slider': ['async-slider.js'],
+    'RangeSlider': ['async-slider.js'],
+}
+CHUNKS_PATH = '/_dash-component-suites/dash/dcc/'
+
+HEADERS = {'Accept-Encoding': 'br, gzip' if brotli is not None else 'gzip', 'User-Agent': 'dashboard-loadtest'}
+# Seconds between two polls of a background callback
+POLL_INTERVAL = 0.1
+
+
+class Recorder:
+    '''
+        Latencies and errors of the requests, per endpoint, shared by the users.
+    '''
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, error):
+        '''
+            Records a request.
+
+            Args:
+                endpoint: The name of the endpoint, such as 'layout'
+                seconds: The latency of the request
+                error: True if the request failed
+        '''
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.errors[endpoint] += error
+
+    def report(self, duration):
+        '''
+            Summarizes the recorded requests.
+
+            Args:
+                duration: The duration of the test in seconds
+            Returns:
+                A pandas dataframe indexed by endpoint, with a total row.
+        '''
+        rows = {}
+        endpoints = sorted(self.latencies) + ['total']
+        for endpoint in endpoints:
+            if endpoint == 'total':
+                latencies = np.concatenate([self.latencies[name] for name in endpoints[:-1]])
+                errors = sum(self.errors.values())
+            else:
+                latencies, errors = np.array(self.latencies[endpoint]), self.errors[endpoint]
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            rows[endpoint] = {
+                'requests': len(latencies),
+                'requests_per_s': round(len(latencies) / duration, 2),
+                'p50_ms': round(p50, 1), 'p95_ms': round(p95, 1), 'p99_ms': round(p99, 1),
+                'max_ms': round(latencies.max() * 1000, 1),
+                'error_rate': round(errors / len(latencies), 4)
+            }
+        report = pd.DataFrame.from_dict(rows, orient='index')
+        report.index.name = 'endpoint'
+        return report
+
+
+def get_endpoint(path):
+    '''
+        Gets a low-cardinality name of the endpoint of a path.
+
+        Args:
+            path: The path of the request, with its query
+        Returns:
+            The name of the endpoint, such as 'assets' or 'component-suites'.
+    '''
+    path = path.split('?')[0]
+    if path.startswith('/_dash-component-suites/'):
+        return 'component-suites'
+    if path.startswith('/assets/'):
+        return 'fonts' if re.search(r'\.(woff2?|ttf|eot|otf)$', path) else 'assets'
+    return {'/': 'index', '/_dash-layout': 'layout', '/_dash-dependencies': 'dependencies'}.get(path, path)
+
+
+def get_components(layout):
+    '''
+        Lists the components of a layout with an id.
+
+        Args:
+            layout: The layout, as returned by /_dash-layout
+        Returns:
+            A dictionary with the ids as keys and the components as values,
+            and the set of the types of every component.
+    '''
+    components, types = {}, set()
+    stack = [layout]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack += node
+        elif isinstance(node, dict) and 'props' in node:
+            types.add(node['type'])
+            if 'id' in node['props']:
+                components[node['props']['id']] = node
+            stack.append(node['props'].get('children'))
+    return components, types
+
+
+def get_outputs(output):
+    '''
+        Parses the output of a callback, as given by /_dash-dependencies.
+
+        Args:
+            output: The output, 'id.property' or '..id.property...id.property..' for several outputs
+        Returns:
+            The outputs of the request of the callback.
+    '''
+    if output.startswith('..'):
+        return [dict(zip(['id', 'property'], part.rsplit('.', 1))) for part in output[2:-2].split('...')]
+    return dict(zip(['id', 'property'], output.rsplit('.', 1)))
+
+
+def choose_value(component, prop, rng):
+    '''
+        Chooses the new value of a property, as a user interacting with the component would.
+
+        Args:
+            component: The component, as in the layout
+            prop: The property of the component
+            rng: The random generator of the user
+        Returns:
+            The new value of the property.
+    '''
+    props = component['props']
+    if prop == 'n_clicks':
+        return (props.get('n_clicks') or 0) + 1
+    if prop == 'value' and props.get('options'):
+        values = [option['value'] if isinstance(option, dict) else option for option in props['options']]
+        if props.get('multi'):
+            return rng.sample(values, rng.randint(1, len(values)))
+        return rng.choice(values)
+    if prop == 'value' and 'min' in props and 'max' in props:
+        step = props.get('step') or 1
+        return props['min'] + step * rng.randint(0, int((props['max'] - props['min']) / step))
+    return props.get(prop)
+
+
+class User:
+    '''
+        Virtual user replaying sessions of the dashboard, with its own connection and browser cache.
+    '''
+    def __init__(self, url, recorder, think_time, seed):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.connection = None
+        # ETags of the revalidated assets, and the assets cached without revalidation
+        self.etags = {}
+        self.immutable = set()
+
+    def request(self, method, path, body=None, endpoint=None):
+        '''
+            Sends a request and records its latency.
+
+            Args:
+                method: 'GET' or 'POST'
+                path: The path of the request
+                body: The JSON body of a POST request
+                endpoint: The name of the endpoint, by default derived from the path
+            Returns:
+                The status and the decompressed body of the response,
+                or (None, None) on a connection error.
+        '''
+        headers = dict(HEADERS)
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        elif path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+
+        start = time.perf_counter()
+        # A kept-alive connection closed by the server is reopened once, as browsers do
+        for attempt in ['reused', 'new'] if self.connection is not None else ['new']:
+            if attempt == 'new':
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                if attempt == 'new':
+                    return self.fail(endpoint or get_endpoint(path), start)
+            except (OSError, http.client.HTTPException):
+                return self.fail(endpoint or get_endpoint(path), start)
+        self.recorder.record(endpoint or get_endpoint(path), time.perf_counter() - start, response.status >= 400)
+        data = decompress(data, response.getheader('Content-Encoding'))
+
+        if method == 'GET' and response.status == 200:
+            # Cached until they expire, which is longer than the test
+            max_age = re.search(r'max-age=(\d+)', response.getheader('Cache-Control') or '')
+            if max_age and int(max_age.group(1)) > 0 and 'no-cache' not in response.getheader('Cache-Control'):
+                self.immutable.add(path)
+            elif response.getheader('ETag'):
+                self.etags[path] = response.getheader('ETag')
+        return response.status, data
+
+    def fail(self, endpoint, start):
+        '''
+            Records a failed request and closes the connection.
+
+            Args:
+                endpoint: The name of the endpoint
+                start: The time.perf_counter() value at which the request started
+            Returns:
+                (None, None), as the status and body of the failed request.
+        '''
+        self.recorder.record(endpoint, time.perf_counter() - start, True)
+        self.connection.close()
+        self.connection = None
+        return None, None
+
+    def get_json(self, path):
+        '''
+            Gets a JSON resource.
+
+            Args:
+                path: The path of the resource
+            Returns:
+                The decoded JSON, or None if the request failed.
+        '''
+        self.etags.pop(path, None)
+        status, data = self.request('GET', path)
+        if status != 200:
+            return None
+        return json.loads(data)
+
+    def get_assets(self, paths):
+        '''
+            Gets the assets of the page, except those in the browser cache.
+
+            Args:
+                paths: The paths of the assets
+            Returns:
+                The bodies of the assets received, keyed by path.
+        '''
+        bodies = {}
+        for path in paths:
+            if path in self.immutable:
+                continue
+            status, data = self.request('GET', path)
+            if status == 200:
+                bodies[path] = data
+        return bodies
+
+    def call(self, callback, values):
+        '''
+            Calls a server-side callback, and polls its result if it runs in the background.
+
+            Args:
+                callback: The callback, as given by /_dash-dependencies
+                values: Dictionary with the (id, property) of the inputs and states as keys,
+                    and their values as values
+        '''
+        body = {
+            'output': callback['output'],
+            'outputs': get_outputs(callback['output']),
+            'inputs': [dict(item, value=values.get((item['id'], item['property'])))
+                       for item in callback['inputs']],
+            'state': [dict(item, value=values.get((item['id'], item['property'])))
+                      for item in callback['state']],
+            'changedPropIds': [f"{item['id']}.{item['property']}" for item in callback['inputs']],
+        }
+        # The outputs shared by several callbacks have a suffix, replaced by the inputs of the callback
+        endpoint = f"callback {callback['output'].split('@')[0]}"
+        if '@' in callback['output']:
+            endpoint += f" ({', '.join(item['id'] for item in callback['inputs'])})"
+        start = time.perf_counter()
+        status, data = self.request('POST', '/_dash-update-component', body, endpoint)
+        if status != 200 or b'cacheKey' not in data[:200]:
+            return
+
+        # The latency of a background callback is the time until its result is received
+        job = json.loads(data)
+        path = f"/_dash-update-component?cacheKey={job['cacheKey']}&job={job['job']}"
+        while status == 200 and b'"response"' not in data:
+            time.sleep(POLL_INTERVAL)
+            status, data = self.request('POST', path, body, f'{endpoint} (poll)')
+        self.recorder.record(f'{endpoint} (result)', time.perf_counter() - start, status != 200)
+
+    def think(self):
+        '''
+            Waits as a user reading the dashboard, for a random time around the think time.
+        '''
+        time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+
+    def run_session(self, actions):
+        '''
+            Replays a session: the page load, then the given number of interactions.
+
+            Args:
+                actions: The number of interactions
+        '''
+        status, index = self.request('GET', '/')
+        if status == 200:
+            page = index.decode('utf-8')
+            links = self.get_assets(re.findall(r'<link[^>]+href="([^"]+)"', page))
+            self.get_assets(re.findall(r'<script[^>]+src="([^"]+)"', page))
+            # The fonts and images of the stylesheets, relative to them
+            resources = []
+            for path, css in links.items():
+                if not path.split('?')[0].endswith('.css'):
+                    continue
+                for url in re.findall(r'url\([\'"]?([^\'")]+)', css.decode('utf-8')):
+                    if not url.startswith(('data:', 'http')):
+                        resources.append(os.path.normpath(os.path.join(os.path.dirname(path.split('?')[0]), url)))
+            self.get_assets(resources)
+
+        layout = self.get_json('/_dash-layout')
+        callbacks = self.get_json('/_dash-dependencies')
+        if layout is None or callbacks is None:
+            return
+        components, types = get_components(layout)
+        self.get_assets(sorted({CHUNKS_PATH + chunk for kind in types for chunk in COMPONENT_CHUNKS.get(kind, [])}))
+
+        callbacks = [callback for callback in callbacks if not callback.get('clientside_function')]
+        values = {(id, prop): component['props'].get(prop)
+                  for id, component in components.items() for prop in component['props']}
+        # The callbacks called on page load, and those of the hidden triggers of the lazy figures
+        for callback in callbacks:
+            inputs = [(item['id'], item['property']) for item in callback['inputs']]
+            if not callback.get('prevent_initial_call'):
+                self.call(callback, values)
+            elif all(prop == 'n_clicks' for _, prop in inputs):
+                values.update({key: choose_value(components[key[0]], key[1], self.rng) for key in inputs})
+                self.call(callback, values)
+
+        # The interactions, on the callbacks of the dropdowns and sliders
+        interactive = [callback for callback in callbacks
+                       if any(item['property'] != 'n_clicks' for item in callback['inputs'])]
+        for _ in range(actions if interactive else 0):
+            self.think()
+            callback = self.rng.choice(interactive)
+            item = self.rng.choice([item for item in callback['inputs'] if item['property'] != 'n_clicks'])
+            key = (item['id'], item['property'])
+            values[key] = choose_value(components[item['id']], item['property'], self.rng)
+            self.call(callback, values)
+
+    def run(self, deadline, actions):
+        '''
+            Replays sessions until the deadline.
+
+            Args:
+                deadline: The time.perf_counter() value at which the user stops
+                actions: The number of interactions of each session
+        '''
+        while time.perf_counter() < deadline:
+            self.run_session(actions)
+            self.think()
+
+
+def decompress(data, encoding):
+    '''
+        Decompresses the body of a response.
+
+        Args:
+            data: The bytes of the body
+            encoding: The Content-Encoding of the response, 'br', 'gzip' or None
+        Returns:
+            The decompressed bytes.
+    '''
+    if encoding == 'br':
+        return brotli.decompress(data)
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    return data
+
+
+def get_free_port():
+    '''
+        Finds a free local TCP port.
+
+        Returns:
+            The port number.
+    '''
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, threads, timeout=300):
+    '''
+        Starts the production server on a free local port and waits for its warmup.
+
+        Args:
+            workers: The number of gunicorn workers
+            threads: The number of threads of each worker
+            timeout: The maximum number of seconds to wait for the server
+        Returns:
+            The gunicorn process and the URL of the server.
+    '''
+    port = get_free_port()
+    environment = dict(os.environ, BIND=f'127.0.0.1:{port}', WEB_CONCURRENCY=str(workers),
+                       WEB_THREADS=str(threads), RELOAD_INTERVAL='0')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                               cwd=figures.SRC_DIR, env=environment,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('the server exited during its startup')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/ready')
+            if connection.getresponse().status == 200:
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError('the server was not ready in time')
+
+
+def run(url, users, duration, actions, think_time, seed=0):
+    '''
+        Runs the load test against a server.
+
+        Args:
+            url: The URL of the server
+            users: The number of concurrent users
+            duration: The number of seconds during which new sessions are started
+            actions: The number of interactions of each session
+            think_time: The mean number of seconds between two interactions of a user
+            seed: The seed of the random choices of the users
+        Returns:
+            The report of the test, as a pandas dataframe indexed by endpoint.
+    '''
+    recorder = Recorder()
+    start = time.perf_counter()
+    threads = [threading.Thread(target=User(url, recorder, think_time, seed + i).run,
+                                args=(start + duration, actions), daemon=True) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.report(time.perf_counter() - start)
+
+
+def main():
+    '''
+        Runs the load test and prints its report.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='URL of a running server (by default, one is started)')
+    parser.add_argument('--users', type=int, default=10, help='number of concurrent users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds during which sessions are started')
+    parser.add_argument('--actions', type=int, default=5, help='number of interactions of each session')
+    parser.add_argument('--think', type=float, default=1, help='mean seconds between two interactions')
+    parser.add_argument('--workers', type=int, default=2, help='number of workers of the started server')
+    parser.add_argument('--threads', type=int, default=4, help='number of threads of each worker')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random choices of the users')
+    parser.add_argument('--output', help='JSON file to write the report to')
+    args = parser.parse_args()
+
+    process, url = (None, args.url) if args.url else start_server(args.workers, args.threads)
+    try:
+        report = run(url, args.users, args.duration, args.actions, args.think, args.seed)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    print(report.to_string())
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report.to_dict(orient='index'), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
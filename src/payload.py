@@ -0,0 +1,266 @@
+'''
+    Contains the optimization of the figures before they are sent to the browser.
+
+    Every figure of the dashboard and of the callbacks carries the same
+    template, which weighs most of its JSON: it is replaced by the name
+    TEMPLATE_NAME, and the template itself is sent once per page by the
+    script /_dash-figure-template.js, cached by the browser. The floats of
+    the traces are rounded to PAYLOAD_DIGITS significant digits, and the
+    repeated strings of their customdata (such as the position of every cell
+    of the heatmap) are replaced by their index in a list of distinct values.
+    The script assets/figure_payload.js restores the template and the
+    customdata before plotly.js draws a figure.
+
+    The command `python payload.py` prints the bytes saved on each figure.
+'''
+import functools
+import hashlib
+import json
+import math
+
+import flask
+import plotly
+import plotly.utils
+
+import config
+import instrumentation
+import template
+
+# Name of the template of the optimized figures, replaced by the shared template in the browser
+TEMPLATE_NAME = 'dashboard'
+# Trace attribute with the encoded customdata
+PACKED_CUSTOMDATA = '_customdata'
+TEMPLATE_ROUTE = '_dash-figure-template.js'
+
+
+def to_dict(figure):
+    '''
+        Converts a figure to the dictionary sent to the browser.
+
+        Args:
+            figure: The plotly figure, or its dictionary
+        Returns:
+            The dictionary of the figure, as serialized to JSON.
+    '''
+    if isinstance(figure, dict):
+        return figure
+    return json.loads(figure.to_json())
+
+
+def dumps(figure):
+    '''
+        Serializes a figure to JSON.
+
+        Args:
+            figure: The figure as a dictionary
+        Returns:
+            The JSON of the figure.
+    '''
+    return json.dumps(figure, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def get_template_version():
+    '''
+        Gets the version of the shared template, added to the URL of its script. It is
+        derived from the code of template.py and the version of plotly, so the pages
+        do not need to build the template, which merges the themes of plotly.
+
+        Returns:
+            The first characters of the hash.
+    '''
+    version = hashlib.sha256(f'plotly-{plotly.__version__}'.encode())
+    with open(template.__file__, 'rb') as file:
+        version.update(file.read())
+    return version.hexdigest()[:12]
+
+
+def get_template_script():
+    '''
+        Renders the script defining the shared template in the browser.
+
+        Returns:
+            The JavaScript code.
+    '''
+    return f'window.DASHBOARD_TEMPLATES = {{{json.dumps(TEMPLATE_NAME)}: {template.get_template_json()}}};\n'
+
+
+def round_floats(value, digits):
+    '''
+        Rounds the floats of a (nested) list to a number of significant digits.
+
+        Args:
+            value: A number, string or list
+            digits: The number of significant digits kept
+        Returns:
+            The value with its floats rounded.
+    '''
+    if isinstance(value, float):
+        if not math.isfinite(value) or value == 0:
+            return value
+        return round(value, digits - 1 - math.floor(math.log10(abs(value))))
+    if isinstance(value, list):
+        return [round_floats(item, digits) for item in value]
+    return value
+
+
+def _get_records(customdata):
+    '''
+        Lists the records of a customdata array, which are the innermost
+        lists, such as the [position, actual, expected] of each cell of a heatmap.
+
+        Args:
+            customdata: The customdata of a trace
+        Returns:
+            The records, or None if the array has no records.
+    '''
+    if not isinstance(customdata, list) or not customdata:
+        return None
+    if all(isinstance(item, list) for item in customdata):
+        if all(not isinstance(value, list) for item in customdata for value in item):
+            return customdata
+        records = [_get_records(item) for item in customdata]
+        if any(item is None for item in records):
+            return None
+        return [record for item in records for record in item]
+    return None
+
+
+def _encode(customdata, fields, values):
+    '''
+        Replaces the string fields of the records by their index in a list of values.
+
+        Args:
+            customdata: The (nested) customdata of a trace
+            fields: The indices of the string fields in a record
+            values: The index of each distinct value, filled in place
+        Returns:
+            The encoded customdata.
+    '''
+    if all(not isinstance(item, list) for item in customdata):
+        return [values.setdefault(value, len(values)) if index in fields else value
+                for index, value in enumerate(customdata)]
+    return [_encode(item, fields, values) for item in customdata]
+
+
+def pack_customdata(trace):
+    '''
+        Replaces the customdata of a trace by its values without repetition, when
+        this is smaller: the strings of its records become indices in a list of values.
+
+        Args:
+            trace: The trace as a dictionary, modified in place
+    '''
+    records = _get_records(trace.get('customdata'))
+    if not records or len({len(record) for record in records}) != 1:
+        return
+    fields = [index for index in range(len(records[0]))
+              if all(isinstance(record[index], str) for record in records)]
+    if not fields:
+        return
+
+    values = {}
+    packed = {'fields': fields, 'codes': _encode(trace['customdata'], fields, values), 'values': list(values)}
+    if len(dumps(packed)) < len(dumps(trace['customdata'])):
+        del trace['customdata']
+        trace[PACKED_CUSTOMDATA] = packed
+
+
+def optimize(figure):
+    '''
+        Optimizes a figure before it is sent to the browser, unless PAYLOAD_OPTIMIZER is disabled.
+
+        Args:
+            figure: The plotly figure, or its dictionary, which is not modified
+        Returns:
+            The optimized figure as a dictionary.
+    '''
+    figure = to_dict(figure)
+    if not config.PAYLOAD_OPTIMIZER:
+        return figure
+
+    optimized = dict(figure, data=[dict(trace) for trace in figure.get('data', [])])
+    for trace in optimized['data']:
+        for key, value in trace.items():
+            if isinstance(value, (list, float)):
+                trace[key] = round_floats(value, config.PAYLOAD_DIGITS)
+        pack_customdata(trace)
+
+    layout = figure.get('layout', {})
+    if json.dumps(layout.get('template')) == template.get_template_json():
+        optimized['layout'] = dict(layout, template=TEMPLATE_NAME)
+    return optimized
+
+
+def optimized(function):
+    '''
+        Decorator optimizing the figure returned by a callback.
+
+        Args:
+            function: The callback
+        Returns:
+            The decorated callback.
+    '''
+    @functools.wraps(function)
+    def wrapper(*args):
+        figure = function(*args)
+        with instrumentation.span('serialize'):
+            return optimize(figure)
+    return wrapper
+
+
+def serve_template():
+    '''
+        Serves the script of the shared template, cached for a year when its version is in the URL.
+
+        Returns:
+            The response with the script.
+    '''
+    response = flask.Response(get_template_script(), mimetype='application/javascript')
+    if flask.request.args.get('v') == get_template_version():
+        response.cache_control.max_age = 365 * 24 * 3600
+        response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    '''
+        Adds the script of the shared template to the pages of a Dash app,
+        before the scripts of Dash and of plotly.js.
+
+        Args:
+            app: The Dash app
+    '''
+    prefix = app.config.routes_pathname_prefix
+    app.server.add_url_rule(f'{prefix}{TEMPLATE_ROUTE}', 'figure_template', serve_template)
+    app.config.external_scripts.append(
+        f'{app.config.requests_pathname_prefix}{TEMPLATE_ROUTE}?v={get_template_version()}')
+
+
+def get_report():
+    '''
+        Measures the JSON of every figure of figures.py, before and after its optimization.
+
+        Returns:
+            A list of (name, original bytes, optimized bytes) tuples.
+    '''
+    import figures  # pylint: disable=import-outside-toplevel
+
+    report = []
+    for name in figures.FIGURES:
+        figure = to_dict(figures.build_figure(name))
+        report.append((name, len(dumps(figure)), len(dumps(optimize(figure)))))
+    return report
+
+
+if __name__ == '__main__':
+    config.PAYLOAD_OPTIMIZER = True
+    total = [0, 0]
+    print(f'{"figure":<20} {"original":>10} {"optimized":>10} {"saved":>10}')
+    for name, original, optimized_size in get_report():
+        total[0] += original
+        total[1] += optimized_size
+        print(f'{name:<20} {original:>10} {optimized_size:>10} {original - optimized_size:>10} '
+              f'({(original - optimized_size) / original:.0%})')
+    print(f'{"total":<20} {total[0]:>10} {total[1]:>10} {total[0] - total[1]:>10} '
+          f'({(total[0] - total[1]) / total[0]:.0%})')
+    print(f'shared template, sent once per page: {len(get_template_script())} bytes')
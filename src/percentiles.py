@@ -0,0 +1,237 @@
+'''
+    Contains the percentile rank engine of the player and team stats.
+
+    Every numeric column of the player table of the data catalog is ranked
+    in a single vectorized pass: the counts (goals, tackles, passes, ...)
+    per 90 minutes played, and the rates, averages and per-90 columns as
+    they are. A player is ranked among all the players, and among the
+    players of his position group (the first of his positions, such as DF
+    for DF,MF), and his squad among all the squads. The players with less
+    than PERCENTILE_MIN_MINUTES minutes are not ranked, nor counted in the
+    ranks of the others.
+
+    The ranks are computed once, and again only when one of the player
+    tables changes, then kept in NumPy arrays, so the rank of a player
+    (or squad) in a stat is read in constant time.
+'''
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import config
+import data_catalog
+
+# Columns describing the player and his playing time, ranked as they are
+CONTEXT_COLUMNS = {'Age', 'MP', 'Min', '90s', 'Starts', 'Mn/MP', 'Min%', 'Starts-Mn/Start', 'Starts-Compl',
+                   'Subs-Subs', 'Subs-Mn/Sub', 'Subs-unSub'}
+# Rates, averages and per-90 columns, ranked as they are; the other columns are counts
+RATE_COLUMN = re.compile(r'%|/(90|Sh|SoT)$|^(SCA90|GCA90|Dist|TeamSuccess-PPM)$')
+# Number of players on the pitch, to turn the summed 90s of the players into the playing time of the team
+PLAYERS_ON_PITCH = 11
+# Populations a player is ranked in
+SCOPES = ['all', 'position', 'squads']
+
+_ranks = {}
+_lock = threading.Lock()
+
+
+def is_count(column):
+    '''
+        Tells whether a column is a count, ranked per 90 minutes played.
+
+        Args:
+            column: name of the column
+        Returns:
+            True if the column is a count.
+    '''
+    return column not in CONTEXT_COLUMNS and not RATE_COLUMN.search(column)
+
+
+def get_percentiles(values, groups=None):
+    '''
+        Computes the percentile of each value in its column, from 0 to 100: its rank
+        over the number of ranked values. Tied values share the average of their ranks,
+        so the many players tied at 0 in a count are not ranked at the top of the tie.
+
+        Args:
+            values: The dataframe of the values, missing where not ranked
+            groups: The group of each row, ranked separately, or None
+        Returns:
+            The NumPy array of the percentiles, NaN where the value is missing.
+    '''
+    ranked = values if groups is None else values.groupby(groups, observed=True)
+    return ranked.rank(method='average', pct=True).to_numpy() * 100
+
+
+def compute_ranks(table):
+    '''
+        Computes the per-90 values and the percentiles of every player and squad.
+
+        Args:
+            table: The player table, indexed by (Squad, Player) with (table, column) tuples as columns
+        Returns:
+            A dictionary of the arrays of the ranks, with one row per player (or squad)
+            and one column per stat, and of the positions of the players, keyed by
+            (squad, player) since two squads can have players of the same name,
+            of the squads and of the stats in them.
+    '''
+    stats = table.select_dtypes('number')
+    counts = np.array([is_count(column) for _, column in stats.columns])
+    nineties = table[('StandardStats', '90s')].astype(float)
+    minutes = table[('StandardStats', 'Min')].astype(float)
+
+    values = stats.astype(float)
+    values.loc[:, counts] = values.loc[:, counts].div(nineties.where(nineties > 0), axis=0)
+    values = values.where(minutes >= config.PERCENTILE_MIN_MINUTES, axis=0)
+    positions = table[('Roster', 'Pos')].astype(str).str.split(',').str[0]
+    positions = positions.where(values.notna().any(axis=1).to_numpy())
+
+    # The counts of a squad per 90 minutes of the team, its rates weighted by the playing time of its players
+    squads = stats.index.get_level_values('Squad').astype(str)
+    weights = stats.notna().mul(nineties.fillna(0), axis=0)
+    squad_values = stats.mul(nineties, axis=0).groupby(squads).sum() / weights.groupby(squads).sum()
+    team_nineties = nineties.groupby(squads).sum() / PLAYERS_ON_PITCH
+    squad_values.loc[:, counts] = stats.loc[:, counts].groupby(squads).sum().div(team_nineties, axis=0)
+
+    return {
+        'players': {(str(squad), str(player)): row for row, (squad, player) in enumerate(stats.index)},
+        'stats': {stat: column for column, stat in enumerate(stats.columns)},
+        'squads': {squad: row for row, squad in enumerate(squad_values.index)},
+        'player_squads': np.asarray(squads),
+        'player_positions': positions.to_numpy(),
+        'values': values.to_numpy(),
+        'all': get_percentiles(values),
+        'position': get_percentiles(values, positions.to_numpy()),
+        'squad_values': squad_values.to_numpy(),
+        'squads_percentiles': get_percentiles(squad_values),
+    }
+
+
+def get_ranks():
+    '''
+        Gets the ranks of every player and squad, computed again only when a player table changed.
+
+        Returns:
+            The dictionary of compute_ranks, shared and read-only.
+    '''
+    versions = tuple(data_catalog.get_version(name) for name in data_catalog.PLAYER_TABLES)
+    if _ranks.get('versions') != versions:
+        with _lock:
+            if _ranks.get('versions') != versions:
+                ranks = compute_ranks(data_catalog.get_player_table())
+                for array in ranks.values():
+                    if isinstance(array, np.ndarray):
+                        array.flags.writeable = False
+                # The versions are replaced last, the ranks being read by the other threads meanwhile
+                _ranks.update(ranks=ranks, versions=versions)
+    return _ranks['ranks']
+
+
+def reset():
+    '''
+        Forgets the ranks, so they are computed again on next use.
+    '''
+    with _lock:
+        _ranks.clear()
+
+
+def get_percentile(player, stat, scope='all'):
+    '''
+        Gets the percentile of a player in a stat, in constant time.
+
+        Args:
+            player: (squad, player) tuple of the player
+            stat: (table, column) tuple of the stat, such as ('Passing', 'KP')
+            scope: 'all' among all the players, 'position' among the players of his
+                position group, 'squads' of his squad among all the squads
+        Returns:
+            The percentile, from 0 to 100, NaN if the player (or stat) is not ranked.
+        Raises:
+            KeyError: The player or the stat is unknown.
+    '''
+    ranks = get_ranks()
+    row, column = ranks['players'][player], ranks['stats'][stat]
+    if scope == 'squads':
+        return ranks['squads_percentiles'][ranks['squads'][ranks['player_squads'][row]], column]
+    return ranks[scope][row, column]
+
+
+def get_squad_percentile(squad, stat):
+    '''
+        Gets the percentile of a squad in a stat among all the squads, in constant time.
+
+        Args:
+            squad: name of the squad
+            stat: (table, column) tuple of the stat
+        Returns:
+            The percentile, from 0 to 100.
+        Raises:
+            KeyError: The squad or the stat is unknown.
+    '''
+    ranks = get_ranks()
+    return ranks['squads_percentiles'][ranks['squads'][squad], ranks['stats'][stat]]
+
+
+def get_player_ranks(player, stats):
+    '''
+        Gets the values and percentiles of a player, and of his squad, in some stats.
+
+        Args:
+            player: (squad, player) tuple of the player
+            stats: (table, column) tuples of the stats
+        Returns:
+            A dataframe indexed by the stats, with the value of the player, his percentile
+            in each scope and the value of his squad as columns.
+        Raises:
+            KeyError: The player or a stat is unknown.
+    '''
+    ranks = get_ranks()
+    row = ranks['players'][player]
+    squad = ranks['squads'][ranks['player_squads'][row]]
+    columns = [ranks['stats'][stat] for stat in stats]
+    return pd.DataFrame({
+        'value': ranks['values'][row, columns],
+        'all': ranks['all'][row, columns],
+        'position': ranks['position'][row, columns],
+        'squads': ranks['squads_percentiles'][squad, columns],
+        'squad_value': ranks['squad_values'][squad, columns],
+    }, index=pd.MultiIndex.from_tuples(stats))
+
+
+def get_player(player):
+    '''
+        Gets the squad and position group of a player, in constant time.
+
+        Args:
+            player: (squad, player) tuple of the player
+        Returns:
+            The (squad, position group) tuple, with a missing position group if the player is not ranked.
+        Raises:
+            KeyError: The player is unknown.
+    '''
+    ranks = get_ranks()
+    row = ranks['players'][player]
+    return ranks['player_squads'][row], ranks['player_positions'][row]
+
+
+def get_ranked_players():
+    '''
+        Lists the players ranked in at least one stat.
+
+        Returns:
+            A list of (squad, player, position group) tuples, sorted by squad and player.
+    '''
+    ranks = get_ranks()
+    return [(squad, player, ranks['player_positions'][row])
+            for (squad, player), row in ranks['players'].items() if isinstance(ranks['player_positions'][row], str)]
+
+
+if __name__ == '__main__':
+    import time
+
+    start = time.perf_counter()
+    get_ranks()
+    print(f'Ranked {len(get_ranked_players())} players in {len(get_ranks()["stats"])} stats '
+          f'in {(time.perf_counter() - start) * 1000:.0f} ms')
@@ -1,170 +1,212 @@
-import plotly.graph_objects as go
 import pandas as pd
 import template
+import data_catalog
+import config
+import instrumentation
 
 # DATA LOADING AND PROCESSING
 
 # Variable definitions
 
-teams=['Argentina','Croatia','France','Morocco']
-#Corresponding playingtime for each country 
-Playingtime=[7.7,7.7,7.3,7.3]
+# Number of players on the pitch, to turn the summed 90s of the players into the playing time of the team
+PLAYERS_ON_PITCH = 11
 
 categories_def = ['Interceptions','Tackles','Clearances','Defenders recoveries','Fouls','AerialDuelswon' ]
 categories_pos=['Possession (%) ','Touches in defensive 1/3 (%) ','Progressive Passes (%) ','Progressive Carries (%) ']
 
+# Columns read from each table, the only ones used by the radar charts
+COLUMNS = {
+    "DefensiveActions": ['Squad','90s','Int','Tackles-Tkl','Clr'],
+    "MiscellaneousStats": ['Squad','Pos','Perf_Fls','Perf_Recov','AerialDuels_Won'],
+    "Passing": ['Squad','Total-PrgDist','Total-TotDist'],
+    "Possession": ['Squad','Touches-Def 3rd','Touches','Carries-PrgDist','Carries-TotDist'],
+    "ScoresFixtures": ['Squad','Comp','Poss'],
+}
+
+# Memoized stats of every squad for each radar, with the versions of the tables they were computed from
+_team_stats = {}
+
 '''
     Functions to preprocess the data used in the visualisation.
 '''
 
+def get_table(name):
+    '''
+        Gets a table from the data catalog, with only the columns used by the radar charts,
+        and only the fixtures of the displayed competition
+        Args:
+            name: name of the table
+        Returns:
+            A copy of the dataframe of the table
+    '''
+    competition = config.COMPETITION if name in data_catalog.COMPETITION_COLUMNS else None
+    return data_catalog.get_table(name, columns=COLUMNS[name], competition=competition)
+
+
 def load_data():
     '''
         Load the datasets used in both radarcharts
     '''
-    df_defense = pd.read_csv("assets/data/DefensiveActions.csv", sep=",")
-    df_miscellaneous= pd.read_csv("assets/data/MiscellaneousStats.csv", sep=",")
-    df_passing = pd.read_csv("assets/data/Passing.csv", sep=",")
-    df_possession = pd.read_csv("assets/data/Possession.csv", sep=",")
-    df_scorefixtures = pd.read_csv("assets/data/ScoresFixtures.csv", sep=",")
+    df_defense = get_table("DefensiveActions")
+    df_miscellaneous= get_table("MiscellaneousStats")
+    df_passing = get_table("Passing")
+    df_possession = get_table("Possession")
+    df_scorefixtures = get_table("ScoresFixtures")
     return df_miscellaneous,df_defense,df_passing,df_possession,df_scorefixtures
 
-def divide_playingtime(stat):
+
+def get_playingtime(df):
     '''
-        From a specific statistic  divide by the corresponding Playingtime of the team,
-        to create the stat by game. Then it is approximated, keeping 1 number after the dot.
+        Derives the playing time of each team (number of games, counting the extra time)
+        from the 90s played by its players. It is approximated, keeping 1 number after the dot.
         Args:
-            stats: the list to process
+            df: a dataset with one row per player and the Squad and 90s columns
         Returns:
-            The stat divided by the playingtime
+            A pandas Series of the playing time, indexed by Squad
     '''
-    stat_divide=[(x / y) for x, y in zip(stat, Playingtime)]
-    stat_game=[round(val, 1) for val in stat_divide]
-    return stat_game
+    return (df.groupby('Squad')['90s'].sum() / PLAYERS_ON_PITCH).round(1)
 
 
-def divide_total_100(count,tot):            
+def sort_teams(stats):
     '''
-    From a specific statistic, divide the count by the total and create a percentage.
-    Then it is approximated, keeping 1 number after the dot.
+        Sorts the teams in reverse alphabetical order, to have Morocco first
         Args:
-            count: the stat count
-            total: the total category count 
+            stats: a dataframe indexed by Squad
         Returns:
-            The stat ratio 
+            The sorted dataframe
     '''
-    ratio=[(x / y)*100 for x, y in zip(count, tot)]
-    ratio_approx=[round(val, 1) for val in ratio]
-    return(ratio_approx)
+    return stats.sort_index(ascending=False)
+
 
 def prep_data_defense(dfmisc,df_def):
     '''
-        From the two defensive datasets, calculate the six defensives stats used for the radar chart
+        From the two defensive datasets, calculate the six defensives stats used for the radar chart,
+        for every team, with a single grouped pass over each dataset
         Args:
             dfmisc: the dataset of miscellaneous stats
             df_def: the dataset of the defensive stats
         Returns:
-            A dictionnary containing the name of the country as a key and the corresponding defensive stats used in the defensive radarchart
+            A dataframe indexed by Squad, with the defensive stats by game as columns
     '''
-    
-    inter=df_def.groupby('Squad')['Int'].sum().to_list()
-    tkl=df_def.groupby('Squad')['Tackles-Tkl'].sum().to_list()
-    clr=df_def.groupby('Squad')['Clr'].sum().to_list()
-    fouls=dfmisc.groupby('Squad')['Perf_Fls'].sum().to_list()
+    defense = df_def.groupby('Squad')[['Int','Tackles-Tkl','Clr']].sum()
+    # Only the recoveries of the defenders are counted
+    misc = dfmisc[['Squad','Perf_Fls','AerialDuels_Won']].assign(
+        Recov_DF=dfmisc['Perf_Recov'].where(dfmisc['Pos'] == 'DF', 0))
+    misc = misc.groupby('Squad')[['Recov_DF','Perf_Fls','AerialDuels_Won']].sum()
 
-    defenders_data = dfmisc[dfmisc['Pos'] == 'DF']
-    recoveries=defenders_data.groupby('Squad')['Perf_Recov'].sum().to_list()
-    aerialsDuelswon=dfmisc.groupby('Squad')['AerialDuels_Won'].sum().to_list()
+    stats = defense.join(misc, how='inner')
+    stats = stats.div(get_playingtime(df_def), axis=0).round(1)
+    stats.columns = categories_def
+    return sort_teams(stats)
 
-    int_game,tkl_game,clr_game,fouls_game,recov_game,aerial_game=divide_playingtime(inter),divide_playingtime(tkl),divide_playingtime(clr),divide_playingtime(fouls),divide_playingtime(recoveries),divide_playingtime(aerialsDuelswon)
-
-    #Creation of the dictionary containing the stats for each team
-    dict_country={}
-    for i in range (len(teams)):
-        country=teams[i]
-        dict_country[country]=  [int_game[i],tkl_game[i],clr_game[i],recov_game[i],fouls_game[i],aerial_game[i]]
-        
-    #Sort the dictionnary to have Morocco first
-    dict_country_sorted = dict(sorted(dict_country.items(), key=lambda x: x[0], reverse=True))
-    return dict_country_sorted
 
 def prep_data_possession(df_passing,df_possession,df_scorefixtures):
     '''
-        From the three possession datasets, calculate the four possession stats used for the radar chart
+        From the three possession datasets, calculate the four possession stats used for the radar chart,
+        for every team, with a single grouped pass over each dataset
         Args:
             df_passing: the dataset of passing stats
             df_possession: the dataset of the possession stats
             df_scorefixtures: the dataset of the scorefixtures stats
         Returns:
-            A dictionnary containing the name of the country as a key and the corresponding stats used in the possession radarchart
-    '''
-    ScoreFixtures_WC = df_scorefixtures.loc[df_scorefixtures['Comp'] == 'World Cup']
-    possession_moy_calc = ScoreFixtures_WC.groupby('Squad')['Poss'].mean().to_list()
-    possession_moy=[round(val, 1) for val in possession_moy_calc]
-    
-    Touches_def = df_possession.groupby('Squad')['Touches-Def 3rd'].sum().to_list()
-    Touches_tot = df_possession.groupby('Squad')['Touches'].sum().to_list()
-    def_touches = divide_total_100(Touches_def,Touches_tot)
-    
-    total_PrgD = df_passing.groupby('Squad')['Total-PrgDist'].sum().to_list()
-    total_Dist_D = df_passing.groupby('Squad')['Total-TotDist'].sum().to_list()
-    prog_passing_ratio = divide_total_100(total_PrgD,total_Dist_D)
-    
-    total_PrgC = df_possession.groupby('Squad')['Carries-PrgDist'].sum().to_list()
-    Total_Dist_C = df_possession.groupby('Squad')['Carries-TotDist'].sum().to_list()
-    prog_carries_ratio = divide_total_100(total_PrgC,Total_Dist_C)
-
-    dict_country={}
-    for i in range (len(teams)):
-        country = teams[i]
-        dict_country[country] = [possession_moy[i],def_touches[i],prog_passing_ratio[i],prog_carries_ratio[i]]
-        
-    #Sort the dictionnary to have Morocco first
-    dict_country_sorted = dict(sorted(dict_country.items(), key=lambda x: x[0], reverse=True))
-    return dict_country_sorted
+            A dataframe indexed by Squad, with the possession stats as columns
+    '''
+    ScoreFixtures_WC = df_scorefixtures.loc[df_scorefixtures['Comp'] == config.COMPETITION]
+    possession_moy = ScoreFixtures_WC.groupby('Squad')['Poss'].mean().round(1)
+
+    possession = df_possession.groupby('Squad')[['Touches-Def 3rd','Touches','Carries-PrgDist','Carries-TotDist']].sum()
+    passing = df_passing.groupby('Squad')[['Total-PrgDist','Total-TotDist']].sum()
+
+    stats = pd.DataFrame({
+        categories_pos[0]: possession_moy,
+        categories_pos[1]: (possession['Touches-Def 3rd'] / possession['Touches'] * 100).round(1),
+        categories_pos[2]: (passing['Total-PrgDist'] / passing['Total-TotDist'] * 100).round(1),
+        categories_pos[3]: (possession['Carries-PrgDist'] / possession['Carries-TotDist'] * 100).round(1),
+    }).dropna()
+    return sort_teams(stats)
+
+
+def get_team_stats(type):
+    '''
+        Gets the stats of every team for one of the radar charts, computed once
+        and again only when one of the tables they come from changes
+        Args:
+            type: defense or possession
+        Returns:
+            A dataframe indexed by Squad, with the stats of the radar chart as columns
+    '''
+    tables = (["MiscellaneousStats", "DefensiveActions"] if type == 'defense'
+              else ["Passing", "Possession", "ScoresFixtures"])
+    versions = tuple(data_catalog.get_version(table) for table in tables)
+    cached = _team_stats.get(type)
+    if cached is None or cached[0] != versions:
+        prep = prep_data_defense if type == 'defense' else prep_data_possession
+        cached = (versions, prep(*[get_table(table) for table in tables]))
+        _team_stats[type] = cached
+    return cached[1]
+
+
+def reset_team_stats():
+    '''
+        Forgets the stats of every team, so they are computed again on next use
+    '''
+    _team_stats.clear()
+
+
+def get_teams():
+    '''
+        Lists the teams which can be displayed on the radar charts
+        Returns:
+            The list of squads, Morocco first
+    '''
+    return get_team_stats('defense').index.intersection(get_team_stats('possession').index).to_list()
 
 
 def get_radar_figure(team_data,categories,type):
 
     """
-    Create the radar chart (defense or possession) from the dictionnary created above, it fills only Morocco ont the radar
+    Create the radar chart (defense or possession) from the dataframe created above, it fills only Morocco ont the radar.
+    The figure is built as a dictionary, so the callbacks do not validate it with plotly.graph_objects
         Args:
             categories: List of the corresponding categories for the radar chart (defense or possession)
             type: defense or possession
-            team_data: Dictionary with team names as keys and corresponding data as values
+            team_data: Dataframe indexed by team name, with the stats of the categories as columns
 
         Returns:
-            A plotly Figure with the radar chart
+            The radar chart figure, as a dictionary
     """
-    fig = go.Figure()
-    for i,team_name in enumerate(team_data.keys()):
+    colorway = template.THEME['colorway']
+    traces = []
+    for i,(team_name,values) in enumerate(zip(team_data.index,team_data[categories].to_numpy().tolist())):
         
         hovertemplate = '<span style="color: white"><b>{}</b><br>{}: {}</span><extra></extra>'.format(team_name, '%{theta}', '%{r}') 
-        trace = go.Scatterpolar(
-            r=team_data[team_name] + [team_data[team_name][0]],
+        traces.append(dict(
+            type='scatterpolar',
+            r=values + [values[0]],
             theta=categories + [categories[0]],
             fill=('toself'if team_name=='Morocco' else 'none'),
-            hoveron='points+fills',
+            hoveron='points',
             line=dict(
                 shape='spline',
                 width=3,
             ),
             hoverlabel=dict(
-            bgcolor=template.THEME['colorway'][i]),
+            bgcolor=colorway[i % len(colorway)]),
             name=team_name,
             marker=dict(size=8),
             hovertemplate=hovertemplate,
-        )
-
-        fig.add_trace(trace)
+        ))
 
-    fig.update_layout(
-        title=("Defensive actions by game"if type=='defense' else "Morocco's possession style compared to other teams"),
+    layout = dict(
+        template=template.get_template(),
+        title=dict(text=("Defensive actions by game"if type=='defense' else "Morocco's possession style compared to other teams")),
         polar=dict(
-            radialaxis=dict(visible=True,linecolor='rgba(0,0,0,0.4)',gridcolor='rgba(0,0,0,0.1)')
+            radialaxis=dict(visible=True,linecolor='rgba(0,0,0,0.4)',gridcolor='rgba(0,0,0,0.1)'),
+            bgcolor='rgba(0,0,0, 0.1)'
         ),
         hovermode='closest',
         legend=dict(
-            title='<span style="font-size: 18px"><b>Teams</b></span> <br> (<span style="font-size: 14px"><i>Click on a team to select it or remove it</i>)</span>',
+            title=dict(text='<span style="font-size: 18px"><b>Teams</b></span> <br> (<span style="font-size: 14px"><i>Click on a team to select it or remove it</i>)</span>'),
             orientation='v',
             yanchor='top',
             y=(1 if type=='defense' else 1.26),
@@ -176,18 +218,29 @@ def get_radar_figure(team_data,categories,type):
         )
     )
 
-    fig.update_polars(bgcolor='rgba(0,0,0, 0.1)')
-    fig.update_traces(hoveron="points")
+    return dict(data=traces, layout=layout)
 
+def get_figure(type,teams=None):
+    '''
+        Creates one of the radar charts for a selection of teams
+        Args:
+            type: defense or possession
+            teams: list of the teams to display, all the teams if None
+
+        Returns:
+            The radar chart figure, as a dictionary
+    '''
+    with instrumentation.span('pandas'):
+        stats = get_team_stats(type)
+        if teams is not None:
+            stats = stats[stats.index.isin(teams)]
+    fig = get_radar_figure(stats,(categories_def if type=='defense' else categories_pos),type)
+    if type=='possession':
+        fig['layout']['polar']['radialaxis']['type'] = 'log'
     return fig
 
 # Preprocess and create the two figures 
-def get_fig():
-    df_miscellanous,df_defense,df_passing,df_possession,df_scorefixtures=load_data()
-    dict_country_defense= prep_data_defense(df_miscellanous,df_defense)
-    dict_country_poss = prep_data_possession(df_passing,df_possession,df_scorefixtures)
-
-    fig_def=get_radar_figure(dict_country_defense,categories_def,'defense')
-    fig_poss=get_radar_figure(dict_country_poss,categories_pos,'possession')
-    fig_poss.update_layout(polar=dict(radialaxis=dict(type='log')))
+def get_fig(teams=None):
+    fig_def=get_figure('defense',teams)
+    fig_poss=get_figure('possession',teams)
     return fig_def,fig_poss
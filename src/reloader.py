@@ -0,0 +1,234 @@
+'''
+    Contains the incremental hot reload of the figures when their data changes.
+
+    A background thread checks the version of every table the figures are
+    built from. When a data file changed, only the figures depending on it,
+    according to the dependency graph of figures.py, are rebuilt in the
+    background. Each one replaces the previous one in a single assignment,
+    then the on_reload function (app.reload_layout) refreshes the data of
+    the callbacks and swaps in a layout built from the new figures.
+    The requests keep being served from the previous figures meanwhile,
+    so a data refresh needs neither a restart nor a rebuild of every figure.
+
+    Every worker of a host starts a reloader, but only the one holding the
+    lock file of FIGURE_CACHE_DIR watches the data files and rebuilds the
+    figures. It then writes the names of the rebuilt figures in the reload
+    file, and the other workers load these figures from the figure cache
+    instead of building them again. When the lock holder exits, another
+    worker takes the lock. Without FIGURE_CACHE, or without fcntl (on
+    Windows), there is no cache to share and every process reloads alone.
+'''
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import config
+import figures
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+LOCK_FILE = 'reloader.lock'
+RELOAD_FILE = 'reloader.json'
+
+_thread = None
+# Open lock file of the process holding the lock, with its pid
+_lock = None
+
+
+def get_versions():
+    '''
+        Gets the version of every table the figures depend on.
+
+        Returns:
+            A dictionary with the table names as keys and their versions as values.
+    '''
+    import data_catalog
+
+    versions = {}
+    for table in figures.get_dependency_graph():
+        try:
+            versions[table] = data_catalog.get_version(table)
+        except OSError:
+            # The file is being replaced, it is checked again next time
+            versions[table] = None
+    return versions
+
+
+def get_affected_figures(tables):
+    '''
+        Lists the figures depending on some tables.
+
+        Args:
+            tables: names of the changed tables
+        Returns:
+            The names of the figures, in the order of the registry.
+    '''
+    graph = figures.get_dependency_graph()
+    affected = {name for table in tables for name in graph.get(table, {}).get('figures', [])}
+    return [name for name in figures.FIGURES if name in affected]
+
+
+def reload(tables, on_reload=None):
+    '''
+        Rebuilds the figures depending on the changed tables, and publishes
+        them to the other workers before calling on_reload.
+
+        Args:
+            tables: names of the changed tables
+            on_reload: function called with the names of the rebuilt figures
+        Returns:
+            The names of the rebuilt figures.
+    '''
+    start = time.perf_counter()
+    names = get_affected_figures(tables)
+    for name in names:
+        figures.get_figure(name)
+    publish(names)
+    if on_reload is not None:
+        on_reload(names)
+    logger.info('Reloaded %s after a change of %s in %.0f ms', ', '.join(names), ', '.join(tables),
+                (time.perf_counter() - start) * 1000)
+    return names
+
+
+def acquire_lock():
+    '''
+        Tries to take the lock making this process the one which watches the
+        data files of the host. The lock is held until the process exits.
+
+        Returns:
+            True if this process holds the lock.
+    '''
+    global _lock  # pylint: disable=global-statement
+    if fcntl is None or not config.FIGURE_CACHE:
+        return True
+    # A forked process inherits the file, but not the role
+    if _lock is not None and _lock[1] == os.getpid():
+        return True
+
+    os.makedirs(config.FIGURE_CACHE_DIR, exist_ok=True)
+    # Kept open, the lock is released when the process exits
+    file = open(os.path.join(config.FIGURE_CACHE_DIR, LOCK_FILE), 'a',  # pylint: disable=consider-using-with
+                encoding='utf-8')
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        file.close()
+        return False
+    _lock = (file, os.getpid())
+    logger.info('Watching the data files in process %s', os.getpid())
+    return True
+
+
+def publish(names):
+    '''
+        Writes the names of the rebuilt figures in the reload file atomically,
+        for the other workers to load them.
+
+        Args:
+            names: names of the rebuilt figures
+    '''
+    if fcntl is None or not config.FIGURE_CACHE:
+        return
+    with tempfile.NamedTemporaryFile('w', dir=config.FIGURE_CACHE_DIR, delete=False, suffix='.tmp') as file:
+        json.dump({'id': f'{os.getpid()}-{time.time_ns()}', 'figures': names}, file)
+    os.replace(file.name, os.path.join(config.FIGURE_CACHE_DIR, RELOAD_FILE))
+
+
+def follow(seen, on_reload=None):
+    '''
+        Loads the figures rebuilt by the lock holder from the figure cache,
+        when the reload file changed since it was last seen. Only the figures
+        this process did not already load from the current inputs are loaded.
+
+        Args:
+            seen: id of the reload file last seen, None at first
+            on_reload: function called with the names of the loaded figures
+        Returns:
+            The id of the reload file now seen.
+    '''
+    try:
+        with open(os.path.join(config.FIGURE_CACHE_DIR, RELOAD_FILE), encoding='utf-8') as file:
+            published = json.load(file)
+    except (OSError, ValueError):
+        return seen
+    if published['id'] == seen:
+        return seen
+
+    names = [name for name in published['figures'] if not figures.is_current(name)]
+    if names:
+        for name in names:
+            figures.get_figure(name)
+        if on_reload is not None:
+            on_reload(names)
+        logger.info('Loaded %s rebuilt by another worker', ', '.join(names))
+    return published['id']
+
+
+def watch(interval, on_reload=None):
+    '''
+        Checks the data files every interval and reloads the figures depending
+        on the changed ones. A table is only reloaded once its version did not
+        change between two checks, so a file being written is not read.
+        Until this process holds the lock, it only follows the reloads of
+        the lock holder.
+
+        Args:
+            interval: The seconds between two checks
+            on_reload: function called with the names of the rebuilt figures
+    '''
+    loaded = get_versions()
+    previous = loaded
+    seen = None
+    while True:
+        time.sleep(interval)
+        if not acquire_lock():
+            try:
+                seen = follow(seen, on_reload)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Could not load the figures rebuilt by another worker')
+            continue
+
+        current = get_versions()
+        changed = [table for table, version in current.items()
+                   if version is not None and version != loaded.get(table) and version == previous.get(table)]
+        previous = current
+        if not changed:
+            continue
+        try:
+            reload(changed, on_reload)
+        except Exception:  # pylint: disable=broad-except
+            # The previous figures are kept, the file will be reloaded once fixed
+            logger.exception('Could not reload the figures depending on %s', ', '.join(changed))
+            continue
+        loaded = dict(loaded, **{table: current[table] for table in changed})
+
+
+def start(on_reload=None, interval=None):
+    '''
+        Starts the reloader thread of this process, unless it runs already
+        or the interval is 0.
+
+        Args:
+            on_reload: function called with the names of the rebuilt figures
+            interval: The seconds between two checks, RELOAD_INTERVAL by default
+    '''
+    global _thread  # pylint: disable=global-statement
+    interval = config.RELOAD_INTERVAL if interval is None else interval
+    if interval <= 0 or (_thread is not None and _thread.is_alive()):
+        return
+    _thread = threading.Thread(target=watch, args=(interval, on_reload), name='reloader', daemon=True)
+    _thread.start()
+
+
+if __name__ == '__main__':
+    for table_name, node in sorted(figures.get_dependency_graph().items()):
+        print(f"{table_name}: modules {', '.join(node['modules'])}; figures {', '.join(node['figures'])}")
@@ -0,0 +1,223 @@
+'''
+    Contains the cache of the callback results, shared by the workers of a host.
+
+    A cached function is keyed by its arguments (the callback inputs), the
+    versions of the tables it reads, the settings of the data it displays and
+    the version of its code. The results are serialized to JSON and stored in
+    a SQLite file (RESULT_CACHE_FILE), which every worker of the host opens,
+    so a popular selection is computed once per host instead of once per worker.
+    The least recently used results are evicted once the file holds more than
+    RESULT_CACHE_MAX_MB of results. The total size is kept up to date by
+    triggers, so the results are only scanned when some must be evicted, and
+    the access time of a result is only written again once it is a minute old,
+    so most cache hits are plain reads which do not take the write lock. The hits and misses of each function are
+    counted per process and exposed on /metrics.
+'''
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import plotly
+import plotly.utils
+
+import config
+import figures
+
+logger = logging.getLogger(__name__)
+
+# Access times more recent than this, in seconds, are not written again on a hit
+ACCESS_RESOLUTION = 60
+# Share of RESULT_CACHE_MAX_MB left after an eviction, so the next results are stored without evicting
+EVICTION_TARGET = 0.9
+
+_local = threading.local()
+_lock = threading.Lock()
+# Hits and misses of each cached function, in this process
+_counters = defaultdict(lambda: {'hit': 0, 'miss': 0})
+
+
+def _connect():
+    '''
+        Gets the connection of the current thread to the cache file,
+        creating it after a fork or on first use.
+
+        Returns:
+            The sqlite3 connection.
+    '''
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.pid != os.getpid():
+        os.makedirs(os.path.dirname(config.RESULT_CACHE_FILE), exist_ok=True)
+        connection = sqlite3.connect(config.RESULT_CACHE_FILE, timeout=5, isolation_level=None)
+        # Write-ahead logging lets the workers read while another one writes
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('CREATE TABLE IF NOT EXISTS results '
+                               '(key TEXT PRIMARY KEY, value TEXT, size INTEGER, accessed REAL)')
+            # Total size of the results, a single row maintained by the triggers
+            connection.execute('CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY, size INTEGER)')
+            connection.execute('INSERT OR IGNORE INTO total VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM results))')
+            connection.execute('CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results '
+                               'BEGIN UPDATE total SET size = size + new.size; END')
+            connection.execute('CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results '
+                               'BEGIN UPDATE total SET size = size - old.size; END')
+        _local.connection, _local.pid = connection, os.getpid()
+    return connection
+
+
+def get_key(function, args, tables):
+    '''
+        Computes the key of a result.
+
+        Args:
+            function: The cached function
+            args: The arguments of the call
+            tables: The tables the function reads
+        Returns:
+            The hex digest identifying the result.
+    '''
+    import data_catalog
+
+    key = hashlib.sha256(f'{function.__module__}.{function.__qualname__}:plotly-{plotly.__version__}'.encode())
+    key.update(json.dumps(args, sort_keys=True, default=str).encode())
+    for table in tables:
+        key.update(f'{table}={data_catalog.get_version(table)}'.encode())
+    for setting in figures.COMMON_SETTINGS:
+        key.update(f'{setting}={getattr(config, setting)}'.encode())
+    # The code of the function and of the modules it calls
+    for path in [inspect.getsourcefile(inspect.unwrap(function))] + getattr(function, 'cache_modules', []):
+        stat = os.stat(path)
+        key.update(f'{os.path.basename(path)}={stat.st_mtime_ns},{stat.st_size}'.encode())
+    return key.hexdigest()
+
+
+def get(key):
+    '''
+        Gets a result from the cache and marks it as recently used,
+        if it was not already marked in the last ACCESS_RESOLUTION seconds.
+
+        Args:
+            key: The key of the result
+        Returns:
+            The serialized result, or None if it is not cached.
+    '''
+    connection = _connect()
+    row = connection.execute('SELECT value, accessed FROM results WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+    now = time.time()
+    if row[1] < now - ACCESS_RESOLUTION:
+        connection.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+    return row[0]
+
+
+def put(key, value):
+    '''
+        Stores a result in the cache. Once the results take more than
+        RESULT_CACHE_MAX_MB, the least recently used ones are evicted
+        down to EVICTION_TARGET of it.
+
+        Args:
+            key: The key of the result
+            value: The serialized result
+    '''
+    connection = _connect()
+    limit = config.RESULT_CACHE_MAX_MB * 1024 * 1024
+    with connection:
+        connection.execute('BEGIN IMMEDIATE')
+        # Deleted then inserted, so the triggers count the size of a replaced result
+        connection.execute('DELETE FROM results WHERE key = ?', (key,))
+        connection.execute('INSERT INTO results VALUES (?, ?, ?, ?)', (key, value, len(value), time.time()))
+        total, = connection.execute('SELECT size FROM total').fetchone()
+        if total > limit:
+            connection.execute('DELETE FROM results WHERE key IN ('
+                               'SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY accessed DESC) AS total '
+                               'FROM results) WHERE total > ?)', (limit * EVICTION_TARGET,))
+
+
+def cached(tables, modules=()):
+    '''
+        Decorator caching the results of a function, such as a callback,
+        whose arguments and result can be serialized to JSON.
+
+        Args:
+            tables: The tables the function reads
+            modules: The visualization modules the function calls, such as 'heatmap'
+        Returns:
+            The decorator.
+    '''
+    def decorator(function):
+        function.cache_modules = [os.path.join(figures.SRC_DIR, f'{module}.py') for module in modules]
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            if not config.RESULT_CACHE:
+                return function(*args)
+            try:
+                key = get_key(function, args, tables)
+                value = get(key)
+            except (OSError, sqlite3.Error):
+                logger.exception('Could not read the result cache')
+                return function(*args)
+
+            name = function.__name__
+            if value is not None:
+                with _lock:
+                    _counters[name]['hit'] += 1
+                return json.loads(value)
+
+            with _lock:
+                _counters[name]['miss'] += 1
+            result = function(*args)
+            try:
+                put(key, json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder))
+            except sqlite3.Error:
+                logger.exception('Could not write to the result cache')
+            return result
+        return wrapper
+    return decorator
+
+
+def get_stats():
+    '''
+        Gets the number and total size of the results in the cache.
+
+        Returns:
+            A (number of results, size in bytes) tuple.
+    '''
+    connection = _connect()
+    count, = connection.execute('SELECT COUNT(*) FROM results').fetchone()
+    size, = connection.execute('SELECT size FROM total').fetchone()
+    return count, size
+
+
+def render_metrics():
+    '''
+        Renders the counters of this process and the size of the cache in the Prometheus text format.
+
+        Returns:
+            The lines of text of the metrics.
+    '''
+    lines = ['# HELP dash_result_cache_requests_total Calls of the cached functions, by result.',
+             '# TYPE dash_result_cache_requests_total counter']
+    with _lock:
+        for name, counters in sorted(_counters.items()):
+            lines += [f'dash_result_cache_requests_total{{function="{name}",result="{result}"}} {count}'
+                      for result, count in counters.items()]
+    try:
+        count, size = get_stats()
+    except sqlite3.Error:
+        return lines
+    lines += ['# HELP dash_result_cache_entries Results in the cache of the host.',
+              '# TYPE dash_result_cache_entries gauge', f'dash_result_cache_entries {count}',
+              '# HELP dash_result_cache_bytes Size of the results in the cache of the host.',
+              '# TYPE dash_result_cache_bytes gauge', f'dash_result_cache_bytes {size}']
+    return lines
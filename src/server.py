@@ -13,7 +13,10 @@ def create_app():
             The server to be run
     '''
     # the import is intentionally inside to work with the server failsafe
-    from app import app  # pylint: disable=import-outside-toplevel
+    from app import app, reload_layout  # pylint: disable=import-outside-toplevel
+    import reloader  # pylint: disable=import-outside-toplevel
+    # Rebuilds only the figures whose data changed, without reimporting the app
+    reloader.start(on_reload=reload_layout)
     return app.server
 
 
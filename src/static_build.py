@@ -0,0 +1,313 @@
+'''
+    Contains the static build of the dashboard, served without any Python server.
+
+    Every figure is built once, in parallel in a process pool, then the
+    layout of app.py is rendered to a single index.html embedding the
+    JSON of the figures, next to plotly.js and the stylesheets of the
+    assets folder. The interactions are replayed in the browser:
+    the shooting views and the ranks of every player are switched, the
+    radar charts show the selected teams, and the heatmap is sliced from
+    the arrays of every squad.
+
+    Run it from the src folder, for example:
+        python static_build.py --output build --workers 4
+    then serve the output folder with any static file server.
+'''
+import argparse
+import html
+import json
+import os
+import re
+import shutil
+
+import plotly
+
+import config
+import figures
+import payload
+
+# Tags whose children are not rendered
+VOID_TAGS = {'img', 'br', 'hr', 'input'}
+# Style properties given as numbers without unit
+UNITLESS_STYLES = {'opacity', 'zIndex', 'fontWeight', 'flex', 'flexGrow', 'flexShrink', 'lineHeight', 'order'}
+
+PAGE = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="UTF-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="icon" href="assets/favicon.ico">
+{stylesheets}
+<script src="figure_template.js"></script>
+<script src="assets/figure_payload.js"></script>
+<script src="plotly.min.js"></script>
+</head>
+<body>
+{body}
+<script id="dashboard-data" type="application/json">{data}</script>
+<script>
+{script}
+</script>
+</body>
+</html>
+'''
+
+# Normalizes each column of the heatmap by its largest absolute value, as heatmap.normalize does,
+# a column of zeros staying at 0
+NORMALIZE_SCRIPT = '''
+function normalizeColumns(raw) {
+    var maxima = raw[0].map(function (_, column) {
+        return Math.max.apply(null, raw.map(function (row) { return Math.abs(row[column]); }));
+    });
+    return raw.map(function (row) {
+        return row.map(function (value, column) { return maxima[column] ? value / maxima[column] : 0; });
+    });
+}
+'''
+
+SCRIPT = NORMALIZE_SCRIPT + '''
+(function () {
+    var data = JSON.parse(document.getElementById('dashboard-data').textContent);
+
+    Object.keys(data.graphs).forEach(function (id) {
+        var figure = data.graphs[id];
+        Plotly.newPlot(id, figure.data, figure.layout, data.configs[id]);
+    });
+
+    // Shooting and player rank bar charts: every view is precomputed
+    Object.keys(data.views).forEach(function (id) {
+        var views = data.views[id];
+        document.getElementById(id).addEventListener('change', function (event) {
+            var figure = views.figures[event.target.value];
+            Plotly.react(views.graph, figure.data, figure.layout, data.configs[views.graph]);
+        });
+    });
+
+    // Radar charts: every team is drawn, the selection only changes their visibility
+    Object.keys(data.team_selectors).forEach(function (id) {
+        var graph = data.team_selectors[id];
+        document.getElementById(id).addEventListener('change', function (event) {
+            var selected = Array.prototype.map.call(event.target.selectedOptions, function (option) {
+                return option.value;
+            });
+            var traces = document.getElementById(graph).data;
+            Plotly.restyle(graph, {visible: traces.map(function (trace) {
+                return selected.indexOf(trace.name) >= 0;
+            })});
+        });
+    });
+
+    // Heatmap: the n first players of the squad, normalized over the displayed players
+    var heatmap = data.heatmap;
+    var squadSelector = document.getElementById(heatmap.squad);
+    var topN = document.getElementById(heatmap.top_n);
+    function updateHeatmap() {
+        var squad = heatmap.squads[squadSelector.value];
+        var n = parseInt(topN.value, 10);
+        var raw = squad.raw.slice(0, n);
+        var norm = normalizeColumns(raw);
+        document.getElementById(heatmap.top_n + '-value').textContent = n;
+        Plotly.restyle(heatmap.graph, {
+            z: [norm], y: [squad.players.slice(0, n)], text: [raw], customdata: [squad.hoverdata.slice(0, n)]
+        });
+    }
+    squadSelector.addEventListener('change', updateHeatmap);
+    topN.addEventListener('input', updateHeatmap);
+})();
+'''
+
+
+def build_figures(workers):
+    '''
+        Builds every figure of the registry, in parallel if there is more than one worker.
+
+        Args:
+            workers: The number of processes building the figures
+        Returns:
+            A dictionary with the figure names as keys and the figures as values.
+    '''
+    times = figures.build_figures(workers=workers)
+    for name in figures.FIGURES:
+        print(f'{name}: {times[name] * 1000:.0f} ms' if name in times else f'{name}: cached')
+    return {name: figures.get_figure(name) for name in figures.FIGURES}
+
+
+def render_style(style):
+    '''
+        Converts a Dash style dictionary to a CSS declaration.
+
+        Args:
+            style: The style dictionary, with camelCase properties
+        Returns:
+            The CSS declaration.
+    '''
+    declarations = []
+    for key, value in style.items():
+        if isinstance(value, (int, float)) and key not in UNITLESS_STYLES:
+            value = f'{value}px'
+        declarations.append(f"{re.sub('([A-Z])', lambda match: '-' + match.group(1).lower(), key)}: {value}")
+    return '; '.join(declarations)
+
+
+def render_attributes(props, names):
+    '''
+        Renders the HTML attributes of a component.
+
+        Args:
+            props: The properties of the component
+            names: Dictionary with the property names as keys and the attribute names as values
+        Returns:
+            The attributes, each preceded by a space.
+    '''
+    attributes = ''
+    for prop, attribute in names.items():
+        if props.get(prop) is not None:
+            value = render_style(props[prop]) if prop == 'style' else props[prop]
+            attributes += f' {attribute}="{html.escape(str(value))}"'
+    return attributes
+
+
+def render_component(component, configs):
+    '''
+        Renders a component of the Dash layout to HTML.
+        The html components are rendered as their tag, the dcc components
+        as their closest HTML element.
+
+        Args:
+            component: The Dash component, a string or a list of them
+            configs: Dictionary filled with the plotly config of each graph, by id
+        Returns:
+            The HTML of the component.
+    '''
+    if component is None:
+        return ''
+    if isinstance(component, (list, tuple)):
+        return ''.join(render_component(child, configs) for child in component)
+    if not hasattr(component, 'to_plotly_json'):
+        return html.escape(str(component))
+
+    spec = component.to_plotly_json()
+    kind, props = spec['type'], spec['props']
+    attributes = render_attributes(props, {'id': 'id', 'className': 'class', 'style': 'style',
+                                           'src': 'src', 'href': 'href', 'alt': 'alt'})
+
+    if kind == 'Graph':
+        configs[props['id']] = dict(props.get('config', {}), responsive=True)
+        return f'<div{attributes}></div>'
+    if kind == 'Dropdown':
+        selected = props['value'] if props.get('multi') else [props['value']]
+        options = ''.join(f'<option value="{html.escape(str(option["value"]))}"'
+                          f'{" selected" if option["value"] in selected else ""}>'
+                          f'{html.escape(str(option["label"]))}</option>' for option in props['options'])
+        return f'<select{attributes}{" multiple" if props.get("multi") else ""}>{options}</select>'
+    if kind == 'Slider':
+        return (f'<input type="range"{attributes} min="{props["min"]}" max="{props["max"]}" '
+                f'step="{props.get("step", 1)}" value="{props["value"]}">'
+                f'<output id="{props["id"]}-value">{props["value"]}</output>')
+    if kind == 'Store' or 'lazy-figure-trigger' in props.get('className', ''):
+        return ''
+
+    tag = kind.lower()
+    if tag in VOID_TAGS:
+        return f'<{tag}{attributes}>'
+    return f'<{tag}{attributes}>{render_component(props.get("children"), configs)}</{tag}>'
+
+
+def get_heatmap_data(graph, squad_selector, top_n):
+    '''
+        Gets the arrays of every squad sliced by the heatmap in the browser.
+
+        Args:
+            graph: id of the heatmap graph
+            squad_selector: id of the squad dropdown
+            top_n: id of the slider of the number of players
+        Returns:
+            The dictionary of the heatmap interaction.
+    '''
+    import heatmap  # pylint: disable=import-outside-toplevel
+
+    squads = {squad: {key: tensor[key] for key in ['players', 'raw', 'hoverdata']}
+              for squad, tensor in heatmap.get_squad_tensors().items()}
+    return {'graph': graph, 'squad': squad_selector, 'top_n': top_n, 'squads': squads}
+
+
+def build(output, workers):
+    '''
+        Writes the static dashboard in a folder.
+
+        Args:
+            output: The folder to write the dashboard in
+            workers: The number of processes building the figures
+    '''
+    # The layout is rendered with empty graphs, filled with the figures built in the pool
+    config.LAZY_FIGURES = True
+    built = build_figures(workers)
+    import app  # pylint: disable=import-outside-toplevel
+    import bar_chart_player_rank  # pylint: disable=import-outside-toplevel
+
+    # The players are only listed by a callback of the dropdown in the app
+    app.app.layout['player-rank-player'].options = bar_chart_player_rank.get_player_options()
+    configs = {}
+    body = render_component(app.app.layout, configs)
+    graphs = {graph: built[name] for graph, name in app.LAZY_GRAPHS.items()}
+    graphs['barchart-shooting'] = built[app.SHOOTING_FIGURES['Overall']]
+    data = {
+        'graphs': graphs,
+        'configs': configs,
+        'views': {'dropdown': {'graph': 'barchart-shooting',
+                               'figures': {mask: built[name] for mask, name in app.SHOOTING_FIGURES.items()}},
+                  'player-rank-player': {'graph': 'player-rank',
+                                         'figures': {option['value']: payload.optimize(
+                                                         bar_chart_player_rank.get_figure(option['value']))
+                                                     for option in bar_chart_player_rank.get_player_options()}}},
+        'team_selectors': {'radar-teams_defense': 'radar-chart_defense',
+                           'radar-teams_possession': 'radar-chart_possession'},
+        'heatmap': get_heatmap_data('heatmap-performance', 'heatmap-squad', 'heatmap-top-n'),
+    }
+
+    os.makedirs(output, exist_ok=True)
+    assets = os.path.join(figures.SRC_DIR, 'assets')
+    stylesheets = []
+    for directory, _, files in os.walk(assets):
+        if os.path.relpath(directory, assets).startswith('data'):
+            continue
+        for file in sorted(files):
+            relative_path = os.path.relpath(os.path.join(directory, file), figures.SRC_DIR)
+            # The other scripts need the Dash renderer
+            if file.endswith('.js') and file != 'figure_payload.js':
+                continue
+            os.makedirs(os.path.join(output, os.path.dirname(relative_path)), exist_ok=True)
+            shutil.copyfile(os.path.join(directory, file), os.path.join(output, relative_path))
+            if file.endswith('.css'):
+                stylesheets.append(f'<link rel="stylesheet" href="{relative_path}">')
+    shutil.copyfile(os.path.join(os.path.dirname(plotly.__file__), 'package_data', 'plotly.min.js'),
+                    os.path.join(output, 'plotly.min.js'))
+    # Template of the figures optimized by payload.py, restored by assets/figure_payload.js
+    with open(os.path.join(output, 'figure_template.js'), 'w', encoding='utf-8') as file:
+        file.write(payload.get_template_script())
+
+    # The JSON is embedded in a script element, which must not be closed by its content
+    data_json = json.dumps(data, cls=plotly.utils.PlotlyJSONEncoder).replace('</', '<\\/')
+    page = PAGE.format(title=html.escape(app.app.title), stylesheets='\n'.join(stylesheets),
+                       body=body, data=data_json, script=SCRIPT)
+    with open(os.path.join(output, 'index.html'), 'w', encoding='utf-8') as file:
+        file.write(page)
+    print(f'{output}/index.html: {len(page) / 1024:.0f} kB')
+
+
+def main():
+    '''
+        Runs the static build.
+    '''
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=os.path.join(figures.SRC_DIR, 'build'),
+                        help='folder to write the dashboard in')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='number of processes building the figures')
+    args = parser.parse_args()
+    build(args.output, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,10 @@
 '''
     Contains the template to use in the data visualization.
 '''
-import plotly.graph_objects as go
-import plotly.io as pio
+import functools
+import json
+
+import plotly.utils
 
 
 THEME = {
@@ -22,6 +24,9 @@ def create_custom_theme():
     '''
         Adds a new layout template to pio's templates.
     '''
+    import plotly.graph_objects as go  # pylint: disable=import-outside-toplevel
+    import plotly.io as pio  # pylint: disable=import-outside-toplevel
+
     pio.templates['custom_theme'] = go.layout.Template(
         layout=go.Layout(
             font_color=THEME['dark_color'],
@@ -48,4 +53,32 @@ def set_default_theme():
         Sets the default theme to be a combination of the
         'plotly_white' theme and our custom theme.
     '''
-    pio.templates.default = 'plotly_white+custom_theme'
\ No newline at end of file
+    import plotly.io as pio  # pylint: disable=import-outside-toplevel
+
+    pio.templates.default = 'plotly_white+custom_theme'
+
+
+@functools.lru_cache(maxsize=None)
+def get_template_json():
+    '''
+        Serializes the default template once per process, without
+        building a figure, which would import plotly.offline.
+
+        Returns:
+            The JSON of the template, as found in the layout of the figures.
+    '''
+    import plotly.io as pio  # pylint: disable=import-outside-toplevel
+
+    create_custom_theme()
+    set_default_theme()
+    return json.dumps(pio.templates[pio.templates.default].to_plotly_json(), cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def get_template():
+    '''
+        Gets the default template, for the figures built as dictionaries.
+
+        Returns:
+            A new dictionary of the template.
+    '''
+    return json.loads(get_template_json())
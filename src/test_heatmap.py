@@ -0,0 +1,35 @@
+'''
+    Tests the heatmap of the players of a squad.
+'''
+import warnings
+
+import numpy as np
+
+import heatmap
+
+
+def test_squad_figure_matches_prep_data():
+    # Slicing the arrays of a squad draws the same cells as preprocessing the squad alone
+    for squad in heatmap.get_squad_tensors():
+        for n in [5, 10]:
+            _, raw_data, norm_data = heatmap.get_display_data(heatmap.prep_data(squad, n))
+            trace = heatmap.get_squad_figure(squad, n)['data'][0]
+            assert list(trace['y']) == list(raw_data.index)
+            np.testing.assert_allclose(np.array(trace['text'], dtype=float), raw_data.to_numpy(dtype=float))
+            np.testing.assert_allclose(np.array(trace['z'], dtype=float), norm_data.to_numpy(dtype=float))
+
+
+def test_normalize_zero_column():
+    raw = np.array([[2.0, 0.0, -1.0], [-4.0, 0.0, 0.5]])
+    np.testing.assert_array_equal(heatmap.normalize(raw), [[0.5, 0.0, -1.0], [-1.0, 0.0, 0.5]])
+
+
+def test_squad_figure_single_player():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        for squad in heatmap.get_squad_tensors():
+            figure = heatmap.get_squad_figure(squad, 1)
+            z = np.array(figure['data'][0]['z'], dtype=float)
+            assert z.shape[0] == 1
+            assert np.isfinite(z).all()
+            assert (np.abs(z) <= 1).all()
@@ -0,0 +1,88 @@
+'''
+    Tests the percentile rank engine.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_chart_player_rank
+import config
+import percentiles
+
+
+def test_per_90_positions_and_squads(monkeypatch):
+    monkeypatch.setattr(config, 'PERCENTILE_MIN_MINUTES', 90)
+    index = pd.MultiIndex.from_tuples([('A', 'a1'), ('A', 'a2'), ('B', 'b1'), ('B', 'b2'), ('B', 'b3')],
+                                      names=['Squad', 'Player'])
+    table = pd.DataFrame({
+        ('Roster', 'Pos'): ['DF', 'MF,DF', 'DF', 'MF', 'FW'],
+        ('StandardStats', 'Min'): [900, 450, 900, 900, 45],
+        ('StandardStats', '90s'): [10.0, 5.0, 10.0, 10.0, 0.5],
+        ('StandardStats', 'Gls'): [1, 3, 2, 5, 1],
+    }, index=index)
+    ranks = percentiles.compute_ranks(table)
+    goals = ranks['stats'][('StandardStats', 'Gls')]
+
+    # The goals are ranked per 90 minutes, and b3, under the minimum minutes, is not ranked
+    np.testing.assert_allclose(ranks['values'][:, goals], [0.1, 0.6, 0.2, 0.5, np.nan])
+    np.testing.assert_allclose(ranks['all'][:, goals], [25, 100, 50, 75, np.nan])
+    # a2 is ranked among the midfielders, MF being his first position
+    np.testing.assert_allclose(ranks['position'][:, goals], [50, 100, 100, 50, np.nan])
+    # The squads are ranked on their goals per 90 minutes of the team
+    assert list(ranks['squads']) == ['A', 'B']
+    np.testing.assert_allclose(ranks['squads_percentiles'][:, goals], [50, 100])
+
+
+def get_table():
+    '''
+        Builds a player table of five players with ten full matches each, but one
+        with 45 minutes, and their goals, the first three being tied at 0.
+    '''
+    index = pd.MultiIndex.from_tuples([('A', 'a1'), ('A', 'a2'), ('B', 'b1'), ('B', 'b2'), ('B', 'b3')],
+                                      names=['Squad', 'Player'])
+    return pd.DataFrame({
+        ('Roster', 'Pos'): ['DF', 'DF,MF', 'FW', 'FW', 'DF'],
+        ('StandardStats', 'Min'): [900, 900, 900, 900, 45],
+        ('StandardStats', '90s'): [10.0, 10.0, 10.0, 10.0, 0.5],
+        ('StandardStats', 'Gls'): [0, 0, 0, 3, 1],
+    }, index=index)
+
+
+def test_ties_and_minimum_minutes(monkeypatch):
+    monkeypatch.setattr(config, 'PERCENTILE_MIN_MINUTES', 90)
+    ranks = percentiles.compute_ranks(get_table())
+    goals = ranks['stats'][('StandardStats', 'Gls')]
+
+    # The three players tied at 0 share the middle of their ranks, not the top one,
+    # and b3, under the minimum minutes, is neither ranked nor counted
+    np.testing.assert_allclose(ranks['all'][:, goals], [50, 50, 50, 100, np.nan])
+    np.testing.assert_allclose(ranks['values'][:, goals], [0, 0, 0, 0.3, np.nan])
+    # a1 and a2 are ranked among the defenders, the first position of a2 being DF
+    np.testing.assert_allclose(ranks['position'][:, goals], [75, 75, 50, 100, np.nan])
+    assert list(ranks['player_positions'][:4]) == ['DF', 'DF', 'FW', 'FW']
+    assert pd.isna(ranks['player_positions'][4])
+
+
+def test_same_name_in_two_squads(monkeypatch):
+    index = pd.MultiIndex.from_tuples([('A', 'x'), ('B', 'x'), ('B', 'y')], names=['Squad', 'Player'])
+    table = pd.DataFrame({
+        ('Roster', 'Pos'): ['FW', 'DF', 'DF'],
+        ('StandardStats', 'Min'): [900, 900, 900],
+        ('StandardStats', '90s'): [10.0, 10.0, 10.0],
+        ('StandardStats', 'Gls'): [5, 0, 1],
+    }, index=index)
+    ranks = percentiles.compute_ranks(table)
+    monkeypatch.setattr(percentiles, 'get_ranks', lambda: ranks)
+    goals = [('StandardStats', 'Gls')]
+
+    assert percentiles.get_player_ranks(('A', 'x'), goals)['value'].tolist() == [0.5]
+    assert percentiles.get_player_ranks(('B', 'x'), goals)['value'].tolist() == [0]
+    assert percentiles.get_player(('B', 'x')) == ('B', 'DF')
+    assert percentiles.get_ranked_players() == [('A', 'x', 'FW'), ('B', 'x', 'DF'), ('B', 'y', 'DF')]
+
+    # The dropdown values carry the squad, an unknown player raises KeyError for the callback
+    monkeypatch.setattr(bar_chart_player_rank, 'STATS', [('Goals', goals[0])])
+    assert bar_chart_player_rank.get_figure('B/x')['layout']['title']['text'] == 'How does x (B) rank?'
+    for value in ['C/x', 'x']:
+        with pytest.raises(KeyError):
+            bar_chart_player_rank.get_figure(value)
@@ -0,0 +1,54 @@
+'''
+    Tests the static build of the dashboard.
+'''
+import json
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+from dash import dcc, html
+
+import heatmap
+import static_build
+
+
+def test_render_component():
+    configs = {}
+    layout = html.Div([
+        html.H1('Goals & assists', style={'fontWeight': 700, 'marginTop': 10}),
+        dcc.Dropdown(id='teams', options=[{'label': team, 'value': team} for team in ['Morocco', 'France']],
+                     value=['France'], multi=True),
+        dcc.Graph(id='graph', config={'displayModeBar': False}),
+        dcc.Store(id='store'),
+    ], className='page')
+
+    assert static_build.render_component(layout, configs) == (
+        '<div class="page"><h1 style="font-weight: 700; margin-top: 10px">Goals &amp; assists</h1>'
+        '<select id="teams" multiple><option value="Morocco">Morocco</option>'
+        '<option value="France" selected>France</option></select><div id="graph"></div></div>')
+    # The graphs are drawn by plotly.js in the browser, with the config of their dcc.Graph
+    assert configs == {'graph': {'displayModeBar': False, 'responsive': True}}
+
+
+def normalize_columns(raw):
+    '''
+        Runs the normalization of the heatmap of the static build with node.
+    '''
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    script = static_build.NORMALIZE_SCRIPT + f'console.log(JSON.stringify(normalizeColumns({json.dumps(raw)})));'
+    return json.loads(subprocess.run([node, '-e', script], check=True, capture_output=True, text=True).stdout)
+
+
+def test_heatmap_zero_column():
+    raw = [[2.0, 0.0, -1.0], [-4.0, 0.0, 0.5]]
+    assert normalize_columns(raw) == [[0.5, 0.0, -1.0], [-1.0, 0.0, 0.5]]
+
+
+def test_heatmap_single_player():
+    # With a single player, the columns where he has 0 are all zero
+    raws = [np.asarray(tensor['raw'][:1], dtype=float).tolist() for tensor in heatmap.get_squad_tensors().values()]
+    for raw, norm in zip(raws, [normalize_columns(raw) for raw in raws]):
+        np.testing.assert_allclose(norm, heatmap.normalize(np.array(raw)))
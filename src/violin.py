@@ -1,9 +1,27 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
+
+import data_catalog
+import config
+import template
+
+HOVER_TEMPLATE = ('<br><b>Player:</b> %{customdata[0]}<br><b>Age:</b> %{customdata[1]}'
+                  '<br><b>MP:</b> %{customdata[2]}<br><b>Mins:</b> %{customdata[3]}<extra></extra>')
+
+# Half of the width allotted to each violin on the x axis
+VIOLIN_HALF_WIDTH = 0.3
+# The points are drawn on the left of each violin, with some jitter
+POINTS_OFFSET = 0.38
+POINTS_JITTER = 0.05
+
 
 def draw_figure(df, column):
     '''
-        Draw a violin plot for a specific column in a dataframe
+        Draw a violin plot for a specific column in a dataframe.
+        The density is computed by the browser from every point, unless
+        the server-side KDE mode is enabled or there are too many points.
 
         Args:
             df: The dataframe to use for the figure
@@ -11,18 +29,147 @@ def draw_figure(df, column):
         Returns:
             figure based on the dataframe
     '''
-    # Add a new column 'HoverInfo' for hover data in the plot
-    df['HoverInfo'] = '<b>Player:</b> ' + df['Player'] + '<br>' + '<b>Age:</b> ' + df['Age'].astype(str) + '<br>' + '<b>MP:</b> ' + df['MP'].astype(str) + '<br>' + '<b>Mins:</b> ' + df['Min'].astype(str)
-    
-    # Create a violin plot with hover info and return the figure
+    if config.VIOLIN_MODE == 'kde' or (config.VIOLIN_MODE == 'auto' and len(df) > config.VIOLIN_POINT_THRESHOLD):
+        return draw_kde_figure(df, column)
+
+    # Create a violin plot with the hover info as customdata and return the figure
     fig = px.violin(df, color="Squad", x="Squad", y=column, box=True, points="all",
-                 title=f"Violin Plot - {column} per Squad", 
-                 hover_data={"HoverInfo": "|%{customdata[0]}"})
-    fig.update_traces(hovertemplate='<br>%{customdata[0]}<extra></extra>')
+                 title=f"Violin Plot - {column} per Squad",
+                 custom_data=["Player", "Age", "MP", "Min"])
+    fig.update_traces(hovertemplate=HOVER_TEMPLATE)
+    update_violin_layout(fig)
+    return fig
+
+
+def update_violin_layout(fig):
+    '''
+        Sets the layout shared by both modes of the violin plot
+
+        Args:
+            fig: The figure to update
+    '''
     fig.update_layout(height=600,
                       legend=dict(title='<span style="font-size: 18px"><b>Squad</b></span>',
                                   font_size=13)
     )
+
+
+def get_kde(values, grid_size=config.VIOLIN_KDE_POINTS, bins=config.VIOLIN_KDE_BINS):
+    '''
+        Computes the gaussian kernel density estimate of a distribution,
+        with the bandwidth rule used by plotly.js. Above the given number of values,
+        they are first binned, so the cost does not grow with the number of values.
+
+        Args:
+            values: NumPy array of the values, without NaN
+            grid_size: The number of points of the density curve
+            bins: The number of bins used for large distributions
+        Returns:
+            The grid and the density at each point of the grid.
+    '''
+    q1, q3 = np.percentile(values, [25, 75])
+    bandwidth = 1.059 * min(values.std(ddof=1), (q3 - q1) / 1.349) * len(values) ** -0.2
+    if not bandwidth > 0:
+        bandwidth = values.std(ddof=1) if values.std(ddof=1) > 0 else 1.0
+
+    # The curve spans two bandwidths beyond the extreme values, as plotly's 'soft' span mode
+    grid = np.linspace(values.min() - 2 * bandwidth, values.max() + 2 * bandwidth, grid_size)
+    if len(values) > bins:
+        weights, edges = np.histogram(values, bins=bins)
+        centers = (edges[:-1] + edges[1:]) / 2
+    else:
+        weights, centers = np.ones(len(values)), values
+
+    kernel = np.exp(-0.5 * ((grid[:, None] - centers[None, :]) / bandwidth) ** 2)
+    density = kernel @ weights / (len(values) * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
+
+
+def get_quartiles(values):
+    '''
+        Computes the statistics of a box plot, with the fences at 1.5 IQR.
+
+        Args:
+            values: NumPy array of the values, without NaN
+        Returns:
+            A dictionary with the q1, median, q3, lowerfence and upperfence.
+    '''
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    return {
+        'q1': q1, 'median': median, 'q3': q3,
+        'lowerfence': values[values >= q1 - 1.5 * iqr].min(),
+        'upperfence': values[values <= q3 + 1.5 * iqr].max()
+    }
+
+
+def sample_points(df, threshold):
+    '''
+        Keeps at most threshold rows, sampled deterministically.
+
+        Args:
+            df: The dataframe of the points
+            threshold: The maximum number of points
+        Returns:
+            The dataframe of the points to display.
+    '''
+    if len(df) <= threshold:
+        return df
+    return df.sample(n=threshold, random_state=0).sort_index()
+
+
+def draw_kde_figure(df, column):
+    '''
+        Draw a violin plot whose densities and quartiles are computed on the server.
+        Only the density curves, the box statistics and a bounded sample
+        of the points are sent to the browser.
+
+        Args:
+            df: The dataframe to use for the figure
+            column: The column used (Min or Age)
+        Returns:
+            figure based on the dataframe
+    '''
+    fig = go.Figure()
+    colorway = template.THEME['colorway']
+    rng = np.random.default_rng(0)
+    df = df.dropna(subset=[column])
+    squads = pd.unique(df['Squad'])
+    # The point budget is split evenly between the squads
+    threshold = max(config.VIOLIN_POINT_THRESHOLD // max(len(squads), 1), 1)
+
+    curves = {}
+    for squad in squads:
+        values = df.loc[df['Squad'] == squad, column].to_numpy(dtype=float)
+        curves[squad] = (values, *get_kde(values))
+    # Every violin has the same maximal width, as plotly's 'width' scale mode
+    for position, (squad, (values, grid, density)) in enumerate(curves.items()):
+        color = colorway[position % len(colorway)]
+        half_width = density / density.max() * VIOLIN_HALF_WIDTH
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([position + half_width, (position - half_width)[::-1]]).round(3),
+            y=np.concatenate([grid, grid[::-1]]).round(2),
+            fill='toself', mode='lines', line=dict(color=color, width=1),
+            name=squad, legendgroup=squad, hoverinfo='skip'
+        ))
+        quartiles = get_quartiles(values)
+        fig.add_trace(go.Box(
+            x=[position], **{key: [value] for key, value in quartiles.items()},
+            width=0.08, marker_color=color, name=squad, legendgroup=squad, showlegend=False
+        ))
+        points = sample_points(df[df['Squad'] == squad], threshold)
+        fig.add_trace(go.Scatter(
+            x=(position - POINTS_OFFSET + rng.uniform(-POINTS_JITTER, POINTS_JITTER, len(points))).round(3),
+            y=points[column],
+            mode='markers', marker=dict(color=color, size=4),
+            customdata=points[["Player", "Age", "MP", "Min"]].to_numpy(),
+            hovertemplate=HOVER_TEMPLATE, name=squad, legendgroup=squad, showlegend=False
+        ))
+
+    fig.update_layout(title=f"Violin Plot - {column} per Squad",
+                      xaxis=dict(title='Squad', tickvals=list(range(len(curves))), ticktext=list(curves)),
+                      yaxis_title=column)
+    update_violin_layout(fig)
     return fig
 
 
@@ -33,11 +180,8 @@ def prep_data_violin():
         Returns:
             A pandas dataframe containing the preprocessed data.
     '''
-    # Load the csv data
-    dataframe = pd.read_csv('./assets/data/StandardStats.csv')
-    
-    # Filter out needed columns
-    dataframe = dataframe[["Squad","Player","Age","Min", "MP"]]
-    
+    # Get only the needed columns of the shared table from the data catalog
+    dataframe = data_catalog.get_table('StandardStats', columns=["Squad","Player","Age","Min", "MP"])
+
     # Return the processed dataframe
-    return dataframe
\ No newline at end of file
+    return dataframe
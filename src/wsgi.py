@@ -0,0 +1,51 @@
+'''
+    Contains the production entry point of the application.
+
+    Everything the workers need (data catalog, figures, shooting views)
+    is built once here, in the gunicorn master process when the app is
+    preloaded, so the forked workers share it copy-on-write.
+'''
+import gc
+import time
+
+from flask import jsonify
+
+import figures
+import http_cache
+from app import app, warm_up_callbacks
+
+server = app.server
+
+_warmup = {'ready': False, 'seconds': None}
+
+
+def warm_up():
+    '''
+        Loads the data of the callbacks and builds every figure
+        a request could need, before any worker is forked.
+    '''
+    start = time.perf_counter()
+    # Only the columns and rows the callbacks read are loaded, not every table
+    warm_up_callbacks()
+    # In lazy mode the layout does not need them, but the first visitors would
+    figures.build_figures()
+    # Only writes the compressed assets missing after the build step
+    http_cache.precompress_assets(app)
+    _warmup['seconds'] = round(time.perf_counter() - start, 3)
+    _warmup['ready'] = True
+
+    # Moves the objects built so far out of the garbage collector's reach,
+    # so the collections in the workers do not write to (and copy) the shared pages
+    gc.freeze()
+
+
+@server.route('/ready')
+def ready():
+    '''
+        Readiness probe: succeeds only once the warmup is done.
+    '''
+    status = 200 if _warmup['ready'] else 503
+    return jsonify(_warmup), status
+
+
+warm_up()